@@ -0,0 +1 @@
+"""Performance benchmarks for DORIE. Run from `libs/` as modules, e.g. `python -m dorie.benchmarks.tokenization`."""
@@ -0,0 +1,77 @@
+"""
+CPU inference latency and throughput of the torch and ONNX Runtime backends by batch size.
+
+    python -m dorie.benchmarks.backends --model ./results --texts data.csv --batch-sizes 1 8 32
+"""
+from ..loader.backends import OnnxBackend, TorchBackend
+from ..loader.export import export_onnx, has_onnx
+from ..loader.registry import default_registry
+from .tokenization import scaled_frame
+
+from argparse import ArgumentParser
+from typing import List, Sequence
+
+import json
+import time
+
+import numpy as np
+
+
+def time_backend(backend, texts: List[str], batchSize: int, repeat: int = 3) -> dict:
+    """Per-batch latency percentiles and texts/sec of the fastest of `repeat` passes over `texts`"""
+    backend.predict_logits(texts[:batchSize], batchSize=batchSize)  # warm up
+    passes = []
+    for _ in range(repeat):
+        latencies = []
+        for start in range(0, len(texts), batchSize):
+            begin = time.perf_counter()
+            backend.predict_logits(texts[start:start + batchSize], batchSize=batchSize)
+            latencies.append(time.perf_counter() - begin)
+        passes.append(latencies)
+    latencies = np.asarray(min(passes, key=sum)) * 1000
+    return {
+        'batchSize': batchSize,
+        'p50Ms': float(np.percentile(latencies, 50)),
+        'p99Ms': float(np.percentile(latencies, 99)),
+        'textsPerSec': len(texts) / (latencies.sum() / 1000),
+    }
+
+
+def benchmark_backends(
+        modelDir: str,
+        texts: List[str],
+        batchSizes: Sequence[int] = (1, 8, 32),
+        graphOptimization: str = 'all',
+        intraOpThreads: int = 0,
+        repeat: int = 3,
+    ) -> list:
+    """Compare the backends on the same texts, exporting the ONNX graph first if needed"""
+    model = default_registry.get_model(modelDir)
+    tokenizer = default_registry.get_tokenizer(modelDir)
+    if not has_onnx(modelDir):
+        export_onnx(model, tokenizer, modelDir)
+
+    backends = {
+        'torch': TorchBackend(model=model, tokenizer=tokenizer),
+        'onnx': OnnxBackend(modelDir=modelDir, tokenizer=tokenizer, graphOptimization=graphOptimization, intraOpThreads=intraOpThreads),
+    }
+    results = []
+    for batchSize in batchSizes:
+        for name, backend in backends.items():
+            results.append({'backend': name, **time_backend(backend, texts, batchSize, repeat=repeat)})
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--model', required=True, help='Local model directory')
+    parser.add_argument('--texts', required=True, help='CSV file with a text column')
+    parser.add_argument('--rows', type=int, default=512, help='Repeat the texts up to this many rows')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--graph-optimization', default='all', choices=['disable', 'basic', 'extended', 'all'])
+    parser.add_argument('--intra-op-threads', type=int, default=0)
+    args = parser.parse_args()
+
+    texts = scaled_frame(args.texts, args.rows)['text'].tolist()
+    results = benchmark_backends(args.model, texts, args.batch_sizes, args.graph_optimization, args.intra_op_threads)
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,36 @@
+"""Offline fixtures shared by the benchmarks and the tests: the bundled example data and a tiny
+randomly initialized RoBERTa classifier, so neither needs to download a checkpoint."""
+
+from pathlib import Path
+
+_THIS_DIR = Path(__file__).parent
+
+_EXAMPLES_DIR = _THIS_DIR / "examples"
+
+# Labelled utterances (Positive, Negative, Neutral) in the MyDataset CSV layout
+SENTIMATE_CSV = _EXAMPLES_DIR / "sentimate-data.csv"
+
+
+def tiny_roberta(output_dir, num_labels: int = 3) -> str:
+    """Save a randomly initialized two-layer RoBERTa classifier and a BPE tokenizer trained on
+    the example data, so tests and benchmarks run offline without downloading a checkpoint."""
+    import pandas
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import RobertaConfig, RobertaForSequenceClassification, RobertaTokenizerFast
+
+    output_dir = str(output_dir)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    texts = pandas.read_csv(SENTIMATE_CSV)['text'].tolist()
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(texts, vocab_size=300, min_frequency=1, special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+    bpe.save_model(output_dir)
+    tokenizer = RobertaTokenizerFast(vocab_file=f"{output_dir}/vocab.json", merges_file=f"{output_dir}/merges.txt", model_max_length=128)
+    tokenizer.save_pretrained(output_dir)
+
+    config = RobertaConfig(
+        vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=130, num_labels=num_labels,
+    )
+    RobertaForSequenceClassification(config).save_pretrained(output_dir)
+    return output_dir
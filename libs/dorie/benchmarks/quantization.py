@@ -0,0 +1,51 @@
+"""
+Accuracy per intent, model size and latency of int8 quantized models against the fp32 model.
+
+    python -m dorie.benchmarks.quantization --model ./results --path data.csv --modes dynamic static --output ./int8
+"""
+from ..loader import MyDataset
+from ..loader.backends import OnnxBackend, TorchBackend
+from ..loader.export import ONNX_FILENAME, export_onnx, has_onnx
+from ..loader.quantization import quantization_report, quantize
+from ..loader.registry import default_registry
+
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Sequence
+
+import json
+
+
+def benchmark_quantization(modelDir: str, path: str, modes: Sequence[str] = ('dynamic',), outputDir: str = './int8', numSamples: int = 128, batchSize: int = 32) -> dict:
+    """Quantize `modelDir` once per mode and compare every variant on the test split of `path`"""
+    model = default_registry.get_model(modelDir)
+    tokenizer = default_registry.get_tokenizer(modelDir)
+    if not has_onnx(modelDir):
+        export_onnx(model, tokenizer, modelDir)
+
+    # Score against the model's own label ids, unless it only has the default LABEL_<i> names
+    labelMap = None if all(label.startswith('LABEL_') for label in model.config.label2id) else model.config.label2id
+    data = MyDataset(path=path, pretrained_model_name=modelDir, labelMap=labelMap, dynamicPadding=True).loader()
+    backends, sizes = {'fp32': TorchBackend(model=model, tokenizer=tokenizer)}, {'fp32': str(Path(modelDir) / ONNX_FILENAME)}
+    for mode in modes:
+        target = Path(outputDir) / mode
+        quantize(modelDir, target, mode=mode, calibration=data['train'], tokenizer=tokenizer, numSamples=numSamples)
+        backends[f'int8-{mode}'] = OnnxBackend(modelDir=str(target), tokenizer=tokenizer)
+        sizes[f'int8-{mode}'] = str(target)
+
+    test = data['test']
+    return quantization_report(backends, test['text'], test['label'], model.config.id2label, sizes=sizes, batchSize=batchSize)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--model', required=True, help='Local fp32 model directory')
+    parser.add_argument('--path', required=True, help='Labelled CSV; the test split is scored and the train split calibrates')
+    parser.add_argument('--modes', nargs='+', default=['dynamic'], choices=['dynamic', 'static'])
+    parser.add_argument('--output', default='./int8', help='Quantized models are saved under <output>/<mode>')
+    parser.add_argument('--calibration-samples', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    report = benchmark_quantization(args.model, args.path, args.modes, args.output, args.calibration_samples, args.batch_size)
+    print(json.dumps(report, indent=4))
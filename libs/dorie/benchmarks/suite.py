@@ -0,0 +1,167 @@
+"""
+Offline performance suite: loader rows/sec, tokenization throughput, training step time, predict
+latency by batch size and peak RSS per stage, on a tiny random RoBERTa and the bundled example
+data scaled up to each requested row count. Results are written as JSON, one file per run.
+
+    python -m dorie.benchmarks.suite --rows 1000 100000 --output ./benchmark-results
+    python -m dorie.benchmarks.suite --compare ./benchmark-results/<previous>.json
+"""
+from ..loader import MyDataset, ModelTrainer
+from ..loader.telemetry import peak_rss
+from .fixtures import SENTIMATE_CSV, tiny_roberta
+from .tokenization import benchmark_tokenization, scaled_frame
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Sequence
+
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+
+def _environment() -> dict:
+    import torch
+    import transformers
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=Path(__file__).parent, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'transformers': transformers.__version__,
+        'cpus': os.cpu_count(),
+        'torchThreads': torch.get_num_threads(),
+    }
+
+
+def bench_loader(path: str, modelDir: str) -> dict:
+    with peak_rss() as memory:
+        start = time.perf_counter()
+        dataset = MyDataset(path=path, pretrained_model_name=modelDir).loader()
+        elapsed = time.perf_counter() - start
+    rows = sum(split.num_rows for split in dataset.values())
+    return {'rows': rows, 'seconds': elapsed, 'rowsPerSec': rows / elapsed, **memory}
+
+
+def bench_tokenization(path: str, modelDir: str) -> dict:
+    with peak_rss() as memory:
+        result = benchmark_tokenization(path, modelDir, workers=(1,), repeat=1)[0]
+    return {'examples': result['examples'], 'examplesPerSec': result['examplesPerSec'], **memory}
+
+
+def bench_train(path: str, modelDir: str, outputDir: str, steps: int = 10, batchSize: int = 8) -> dict:
+    trainer = ModelTrainer(
+        baseModel=modelDir,
+        modelArgs={
+            'output_dir': outputDir, 'max_steps': steps, 'per_device_train_batch_size': batchSize,
+            'save_strategy': 'no', 'eval_strategy': 'no', 'report_to': 'none', 'disable_tqdm': True,
+        },
+        device='cpu',
+        dataClass=MyDataset(path=path, pretrained_model_name=modelDir, dynamicPadding=True),
+    )
+    with peak_rss() as memory:
+        output = trainer.train()
+    return {'steps': steps, 'batchSize': batchSize, 'stepMs': 1000 * output.metrics['train_runtime'] / steps, **memory}, trainer
+
+
+def bench_predict(trainer: ModelTrainer, texts: list, batchSizes: Sequence[int] = (1, 8, 32), repeat: int = 20) -> dict:
+    results = {}
+    with peak_rss() as memory:
+        for batchSize in batchSizes:
+            batch = (texts * (batchSize // len(texts) + 1))[:batchSize]
+            trainer.predict(batch)  # warm up
+            latencies = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                trainer.predict(batch)
+                latencies.append(time.perf_counter() - start)
+            latencies = np.asarray(latencies) * 1000
+            results[str(batchSize)] = {'p50Ms': float(np.percentile(latencies, 50)), 'p99Ms': float(np.percentile(latencies, 99)), 'textsPerSec': batchSize * repeat / (latencies.sum() / 1000)}
+    return {'batchSizes': results, **memory}
+
+
+def run_suite(
+        rows: Sequence[int] = (1000,),
+        batchSizes: Sequence[int] = (1, 8, 32),
+        steps: int = 10,
+        output: Optional[str] = None,
+    ) -> dict:
+    """Run every stage for each row count and return, and optionally save under `output`, the results"""
+    report = {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'environment': _environment(), 'results': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        modelDir = tiny_roberta(Path(tmp) / 'model')
+        texts = scaled_frame(SENTIMATE_CSV)['text'].tolist()
+        for count in rows:
+            path = Path(tmp) / f'data-{count}.csv'
+            scaled_frame(SENTIMATE_CSV, count).to_csv(path, index=False)
+            train, trainer = bench_train(path, modelDir, str(Path(tmp) / 'results'), steps=steps)
+            report['results'][str(count)] = {
+                'loader': bench_loader(path, modelDir),
+                'tokenization': bench_tokenization(path, modelDir),
+                'train': train,
+                'predict': bench_predict(trainer, texts, batchSizes),
+            }
+
+    if output:
+        Path(output).mkdir(parents=True, exist_ok=True)
+        name = f"{report['timestamp'].replace(':', '')}-{report['environment']['commit'] or 'local'}.json"
+        with open(Path(output) / name, 'w') as f:
+            json.dump(report, f, indent=4)
+        report['path'] = str(Path(output) / name)
+    return report
+
+
+# Metrics where higher is better; every other timing or memory metric is better lower
+_HIGHER_IS_BETTER = ('rowsPerSec', 'examplesPerSec', 'textsPerSec')
+
+
+def _flatten(tree: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(previous: dict, current: dict, tolerance: float = 0.1) -> dict:
+    """Relative change of every shared metric; `regressions` lists those worse by more than `tolerance`"""
+    before, after = _flatten(previous['results']), _flatten(current['results'])
+    changes, regressions = {}, []
+    for key in sorted(before.keys() & after.keys()):
+        if not before[key]:
+            continue
+        change = after[key] / before[key] - 1
+        changes[key] = change
+        worse = -change if key.endswith(_HIGHER_IS_BETTER) else change
+        if worse > tolerance and not key.endswith(('rows', 'examples', 'steps', 'batchSize')):
+            regressions.append(key)
+    return {'changes': changes, 'regressions': regressions}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000], help='Scale the example data to each of these row counts')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--steps', type=int, default=10, help='Training steps to time')
+    parser.add_argument('--output', default='./benchmark-results', help='Directory of JSON results, one file per run')
+    parser.add_argument('--compare', default=None, help='Previous JSON result to compare this run against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    report = run_suite(args.rows, args.batch_sizes, args.steps, args.output)
+    print(json.dumps(report, indent=4))
+    if args.compare:
+        with open(args.compare) as f:
+            print(json.dumps(compare(json.load(f), report, args.tolerance), indent=4))
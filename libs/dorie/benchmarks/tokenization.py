@@ -0,0 +1,58 @@
+"""
+Tokenization throughput of `MyDataset` by worker count.
+
+    python -m dorie.benchmarks.tokenization --path data.csv --model roberta-base --workers 1 2 4 8
+"""
+from ..loader import MyDataset
+
+from argparse import ArgumentParser
+from typing import Optional, Sequence
+
+import json
+import time
+
+import pandas as pd
+
+
+def scaled_frame(path: str, rows: Optional[int] = None) -> pd.DataFrame:
+    """Read a text/label CSV and repeat it up to `rows` rows"""
+    frame = pd.read_csv(path)
+    if rows and rows > len(frame):
+        frame = pd.concat([frame] * (rows // len(frame) + 1), ignore_index=True).iloc[:rows]
+    return frame
+
+
+def benchmark_tokenization(
+        path: str,
+        pretrained_model_name: str,
+        workers: Sequence[int] = (1, 2, 4),
+        batchSize: int = 1000,
+        rows: Optional[int] = None,
+        repeat: int = 3,
+    ) -> list:
+    """Return examples/sec per worker count; the best of `repeat` runs is reported"""
+    results = []
+    for numProc in workers:
+        dataClass = MyDataset(path=path, pretrained_model_name=pretrained_model_name, numProc=numProc, batchSize=batchSize)
+        dataset = dataClass._frameconverter(scaled_frame(path, rows))
+        examples = sum(split.num_rows for split in dataset.values())
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dataClass.tokenize(dataset, load_from_cache_file=False)
+            timings.append(time.perf_counter() - start)
+        results.append({'workers': numProc, 'batchSize': batchSize, 'examples': examples, 'examplesPerSec': examples / min(timings)})
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--path', required=True, help='CSV file with text and label columns')
+    parser.add_argument('--model', default='roberta-base', help='Tokenizer name or path')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--batchSize', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=None, help='Repeat the data up to this many rows')
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark_tokenization(args.path, args.model, args.workers, args.batchSize, args.rows), indent=4))
@@ -1,45 +1,53 @@
-import sys
 from pathlib import Path
 
 from pydantic import BaseModel
 
+from functools import lru_cache
+from typing import Optional
+
+import copy
 import json
 import os
 
 _THIS_DIR = Path(__file__).parent
 _PARENT_DIR = _THIS_DIR.parent
 
+DEFAULT_CONFIG = _THIS_DIR / "config" / "roberta-config.json"
+
 
 class Commons(BaseModel):
     fileDir: str = str(_THIS_DIR)
     parentDir: str = str(_PARENT_DIR)
 
-sys.path.insert(0, Commons().parentDir)
-sys.path.insert(0, Commons().fileDir)
+
+@lru_cache(maxsize=None)
+def _readconfig(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
 
 class Config(BaseModel):
     fileDir: str = str(Commons().fileDir)
-    
-    def _traverseloadconfig(self):
-
-        config_file = None
-        for root, dirs, files in os.walk(self.fileDir):
-            for file in files:
-                if file.endswith("config.json"):
-                    config_file = Path(root) / file
-                    break
-            if config_file:
-                break
-
-        if config_file:
-            with open(config_file, 'r') as f:
-                return json.load(f)
-        else:
-            raise FileNotFoundError("No config.json file found in the directory.")
+    # Explicit config file; DORIE_CONFIG overrides the bundled RoBERTa config
+    configPath: Optional[str] = None
+
+    def _resolvepath(self) -> Path:
+        if self.configPath:
+            return Path(self.configPath)
+        if os.environ.get('DORIE_CONFIG'):
+            return Path(os.environ['DORIE_CONFIG'])
+        return Path(self.fileDir) / DEFAULT_CONFIG.relative_to(_THIS_DIR)
+
+    def _loadconfig(self) -> dict:
+        """Load the config file once per process; callers receive their own copy to mutate"""
+        config_file = self._resolvepath()
+        if not config_file.is_file():
+            raise FileNotFoundError(f"No config file found at {config_file}.")
+        return copy.deepcopy(_readconfig(str(config_file.resolve())))
 
     def __call__(self):
-        return self._traverseloadconfig()
+        return self._loadconfig()
     
 def config():
     conf = Config()
-    return conf._traverseloadconfig()
\ No newline at end of file
+    return conf._loadconfig()
@@ -0,0 +1,83 @@
+#  ------------------------------------------------------------------------------------------
+#  Prediction cache for repeated utterances
+#  Results are keyed on normalized text (case, whitespace, punctuation) and the model version,
+#  evicted least-recently-used beyond `maxEntries` and expired after `ttlSeconds`
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel, PrivateAttr
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import re
+import threading
+import time
+import unicodedata
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    """Casefold, drop punctuation and collapse whitespace: "Pay my bill!" -> "pay my bill" """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+class PredictionCache(BaseModel):
+    """Thread-safe LRU/TTL cache of per-text predictions"""
+    maxEntries: int = 100000
+    # Entries older than this are recomputed; None keeps them until evicted
+    ttlSeconds: Optional[float] = 3600.0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(text: str, version: Hashable) -> Tuple[str, Hashable]:
+        return normalize(text), version
+
+    def get(self, text: str, version: Hashable) -> Optional[Any]:
+        key = self.key(text, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttlSeconds is not None and time.monotonic() - entry[1] > self.ttlSeconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, version: Hashable, value: Any) -> None:
+        key = self.key(text, version)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'hitRate': self.hit_rate,
+            'evictions': self.evictions, 'expirations': self.expirations,
+        }
@@ -1,16 +1,41 @@
 """
 This module provides functionality for fine-tuning an intent classification model using a custom dataset and configuration.
 """
-from intent import Commons, config
+from . import Commons, config
+from .cache import PredictionCache, normalize
 
-from loader import MyDataset, ModelTrainer, tokenizer
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
-import torch
+try:
+    from ..loader import MyDataset, ModelTrainer, tokenizer
+    from ..loader.registry import default_registry
+    from ..loader.inference import softmax, topk
+    from ..loader.backends import BACKENDS, TorchBackend, WindowedBackend
+    from ..loader.export import export_onnx, has_onnx
+    from ..loader.quantization import QUANTIZATION_FILENAME, quantize_trainer
+    from ..loader.adaptation import AdapterPool, is_adapter, load_adapter_model
+    from ..loader.distributed import DistributedLauncher, build_trainer
+    from ..loader.distillation import Distiller
+    from ..loader.cascade import CascadeBackend, EmbeddingStage, build_cascade, has_cascade
+except ImportError:
+    # Run as `python -m intent.finetune` from libs/dorie, where `loader` is a top-level package
+    from loader import MyDataset, ModelTrainer, tokenizer
+    from loader.registry import default_registry
+    from loader.inference import softmax, topk
+    from loader.backends import BACKENDS, TorchBackend, WindowedBackend
+    from loader.export import export_onnx, has_onnx
+    from loader.quantization import QUANTIZATION_FILENAME, quantize_trainer
+    from loader.adaptation import AdapterPool, is_adapter, load_adapter_model
+    from loader.distributed import DistributedLauncher, build_trainer
+    from loader.distillation import Distiller
+    from loader.cascade import CascadeBackend, EmbeddingStage, build_cascade, has_cascade
+import numpy as np
 
-from typing import Optional, Union, Any
-from pydantic import BaseModel
+from typing import Optional, Union, Any, Iterable, Literal, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
 
 import os.path as osp
+from functools import partial
+import shutil
+import tempfile
 
 import logging
 
@@ -31,16 +56,40 @@ logger = get_logger('__name__')
 
 class Intent(BaseModel):
     datapath: str 
-    config: dict = config()
+    config: dict = Field(default_factory=config)
     # Unable to place MyDataset here due to model valudation issues with Pydantic
     dataclass: Optional[Any] = None
     trainer: Optional[Union[ModelTrainer, str]] = None
     inference_text: Optional[str] = None
+    # Inference on eager PyTorch or, for a local model exported with `export_onnx`, ONNX Runtime
+    backend: Literal['torch', 'onnx'] = 'torch'
+    # Options of the onnx backend, e.g. {'graphOptimization': 'all', 'intraOpThreads': 4}
+    backend_options: dict = Field(default_factory=dict)
+
+    # Long-input mode: split texts over the window length into overlapping windows and aggregate
+    # their logits, e.g. {'windowLength': 128, 'stride': 32, 'aggregation': 'last'}
+    window_options: Optional[dict] = None
+
+    # A LoRA adapter directory is merged into its base weights unless this is False
+    merge_adapter: bool = True
+    # Opt-in cache of predictions for repeated utterances, cleared whenever a model is loaded
+    cache: Optional[PredictionCache] = None
+
+    # LoRA adapters served over one resident base model, by name, e.g. {'voice': './adapters/voice'};
+    # pick one per call with `predict_batch(texts, adapter='voice')`
+    adapters: dict = Field(default_factory=dict)
+    max_adapters: int = 8
+
+    _backend: Optional[Any] = PrivateAttr(default=None)
+    _modelversion: int = PrivateAttr(default=0)
+    _pool: Optional[AdapterPool] = PrivateAttr(default=None)
 
     def model_post_init(self, *args, **kwargs) -> None:
         """Override this method to perform additional initialization after `__init__` and `model_construct`.
         This is useful if you want to do some validation that requires the entire model to be initialized.
         """
+        for name, path in dict(self.adapters).items():
+            self.add_adapter(name, path)
         if isinstance(self.trainer, str):
             logger.info(f"Instance trainer is a string, loading model from path {self.trainer}")
             self._load_local_model(self.trainer)
@@ -49,38 +98,180 @@ class Intent(BaseModel):
             _, predicted_label = self._inference_call(self.inference_text)
             logger.info(f"Input: {self.inference_text}: \n Predicted label: {predicted_label}")
 
+    def _setbackend(self, backend) -> None:
+        """Switch the inference backend; cached predictions of the previous model are dropped"""
+        self._backend = self._windowed(backend)
+        self._modelversion += 1
+        if self.cache is not None:
+            self.cache.clear()
+
     def _load_local_model(self, model_path: str) -> None:
         """Load a model from a local path."""
-        # TODO: Add to the ModelTrianer class instead?
-        self.config['tokenizer'] = AutoTokenizer.from_pretrained(model_path)
-        self.config['model'] = tokenizer(model_path)
+        # Shared through the artifact registry, repeated construction does not reload from disk
+        self.config['tokenizer'] = tokenizer(model_path)
+        if self.backend == 'onnx':
+            if not has_onnx(model_path):
+                raise FileNotFoundError(f"No ONNX model in {model_path}, export one with `Intent.export_onnx` or `ModelTrainer.save(..., onnx=True)`")
+            self._setbackend(BACKENDS['onnx'](modelDir=model_path, tokenizer=self.config['tokenizer'], **self.backend_options))
+            if osp.isfile(osp.join(model_path, QUANTIZATION_FILENAME)):
+                logger.info(f"Loaded int8 quantized model from {model_path}")
+            return
+        if is_adapter(model_path):
+            self.config['model'] = load_adapter_model(model_path, merge=self.merge_adapter)
+        else:
+            self.config['model'] = default_registry.get_model(model_path)
+        backend = TorchBackend(model=self.config['model'], tokenizer=self.config['tokenizer'])
+        if has_cascade(model_path):
+            logger.info(f"Loaded the cascade first stage saved with the model in {model_path}")
+            stage = EmbeddingStage.load(model_path, self.config['model'], self.config['tokenizer'])
+            backend = CascadeBackend(stage=stage, backend=self._windowed(backend))
+        self._setbackend(backend)
+
+    def load(self, model_path: str) -> None:
+        """Replace the served model with the model or adapter saved at `model_path`"""
+        self.trainer = model_path
+        self._load_local_model(model_path)
         
+    def add_adapter(self, name: str, path: str) -> None:
+        """Serve the LoRA adapter saved at `path` under `name`, sharing one base model with the other
+        adapters. Re-adding a name with a new path replaces it; its cached predictions are not reused"""
+        if self._pool is None:
+            self._pool = AdapterPool(tokenizer=tokenizer(path), maxAdapters=self.max_adapters)
+        self._pool.register(name, path)
+        self.adapters[name] = str(path)
+
     def load_data(self):
-        self.dataclass = MyDataset(path=self.datapath)
+        self.dataclass = MyDataset(path=self.datapath, pretrained_model_name=self.config['baseModel'])
         return self.dataclass.loader()
 
-    def train(self):
-        data = None if not self.dataclass else self.load_data()
+    def train(self, nproc: int = 1, output_dir: Optional[str] = None):
+        """Train in this process, or data-parallel on `nproc` gloo workers (see loader.distributed),
+        in which case the model saved by rank 0 to `output_dir` is loaded for inference"""
+        if nproc > 1:
+            output_dir = output_dir or self.config['modelArgs']['output_dir']
+            build = partial(
+                build_trainer, baseModel=self.config['baseModel'], modelArgs=self.config['modelArgs'],
+                path=self.datapath, device=self.config.get('device', 'cpu'),
+            )
+            DistributedLauncher(nprocPerNode=nproc).launch(build, output_dir)
+            self.load(output_dir)
+            return
 
-        self.trainer = ModelTrainer(**self.config, dataClass=self.dataclass, data=data or self.dataclass.loader())
+        data = self.load_data() if self.dataclass is None else self.dataclass.loader()
+        self.trainer = ModelTrainer(**self.config, dataClass=self.dataclass, data=data)
+        self._setbackend(None)
         self.trainer.train()
 
-    def save(self, output_dir):
-        self.trainer.save(output_dir)
+    def save(self, output_dir, onnx: bool = False):
+        if isinstance(self.trainer, str):
+            # Loaded or trained out of process: the artifacts already exist on disk
+            shutil.copytree(self.trainer, output_dir, dirs_exist_ok=True)
+            if onnx:
+                self.export_onnx(output_dir)
+            return
+        self.trainer.save(output_dir, onnx=onnx)
+
+    def export_onnx(self, output_dir: str) -> str:
+        """Export the model, with LoRA adapters merged, for the onnx backend"""
+        model, tokenizer_ = (self.trainer.model, self.trainer.tokenizer) if isinstance(self.trainer, ModelTrainer) else (self.config['model'], self.config['tokenizer'])
+        return export_onnx(model, tokenizer_, output_dir)
 
     def push_to_hub(self, model_name: str = 'stevenloaiza/dorie-intent-classifier'):
         model_object = self.config['model'] if isinstance(self.trainer, str) else self.trainer.model
         model_object.push_to_hub(model_name)
         logger.info(f"Model saved to Hugging Face Hub as {model_name}")
 
-    def _inference_call(self, text: str):
-        inputs = self.config['tokenizer'](text, return_tensors='pt')
-        with torch.no_grad():
-            logits = self.config['model'](**inputs).logits
+    def quantize(self, output_dir: str, mode: str = 'dynamic', numSamples: int = 128) -> str:
+        """Save an int8 ONNX copy of the trained model, loadable with `Intent(trainer=output_dir, backend='onnx')`.
+        Static mode calibrates on `numSamples` rows of the training split"""
+        assert isinstance(self.trainer, ModelTrainer), "Quantize after training, or use loader.quantization.quantize on an exported model"
+        return quantize_trainer(self.trainer, output_dir, mode=mode, numSamples=numSamples)
 
-        predicted_class = torch.argmax(logits)
-        predicted_label = self.config['model'].config.id2label.get(predicted_class.item())
-        return text, predicted_label
+    def distill(self, output_dir: str, numLayers: int = 2, modelArgs: Optional[dict] = None, **kwargs) -> str:
+        """Distill this model into a `numLayers`-layer student saved to `output_dir`, loadable with
+        `Intent(trainer=output_dir)`. Keyword arguments configure the `Distiller`, e.g. temperature"""
+        with tempfile.TemporaryDirectory() as tmp:
+            teacher = self.trainer if isinstance(self.trainer, str) else tmp
+            if not isinstance(self.trainer, str):
+                self.trainer.save(tmp)
+            Distiller(
+                teacher=teacher, dataClass=MyDataset(path=self.datapath), modelArgs=modelArgs or self.config['modelArgs'],
+                numLayers=numLayers, device=self.config.get('device', 'cpu'), **kwargs,
+            ).distill(output_dir)
+        return output_dir
+
+    def build_cascade(
+            self, numLayers: int = 2, head: str = 'centroid', maxAccuracyDrop: float = 0.01, output_dir: Optional[str] = None,
+        ) -> dict:
+        """Serve through a cascade: a `numLayers`-layer embedding classifier fitted on the training
+        split answers confident inputs, the rest go to the full model. The threshold is calibrated
+        on the test split; the report has the escalation rate and the latency/accuracy curve.
+        With `output_dir` (where the model is saved) the first stage is saved for `Intent` to load"""
+        assert isinstance(self.trainer, ModelTrainer), "Build the cascade after training, it needs the training and eval splits"
+        train, test = (self.trainer.data[name].with_format(None) for name in ('train', 'test'))
+        backend = self._windowed(TorchBackend(model=self.trainer.model, tokenizer=self.trainer.tokenizer))
+        cascade, report = build_cascade(
+            self.trainer.model, self.trainer.tokenizer, backend, (train['text'], train['label']), (test['text'], test['label']),
+            numLayers=numLayers, head=head, maxAccuracyDrop=maxAccuracyDrop,
+        )
+        if output_dir is not None:
+            cascade.stage.save(output_dir)
+        self._setbackend(cascade)
+        return report
+
+    def _windowed(self, backend):
+        # Backends that score token ids can be windowed; a cascade windows its full model instead
+        if self.window_options is None or not hasattr(backend, 'score_ids'):
+            return backend
+        return WindowedBackend(backend=backend, **self.window_options)
+
+    def _inferencebackend(self, adapter: Optional[str] = None):
+        """Return the backend used for inference, a torch backend over the trainer's model once trained,
+        or the adapter pool with `adapter` active"""
+        if adapter is not None:
+            if adapter not in self.adapters:
+                raise KeyError(f"Adapter {adapter} is not registered, add it with `Intent.add_adapter`")
+            return self._pool.backend(adapter)
+        if self._backend is None and isinstance(self.trainer, ModelTrainer):
+            self._backend = self._windowed(TorchBackend(model=self.trainer.model, tokenizer=self.trainer.tokenizer))
+        return self._backend
+
+    def _cacheversion(self, adapter: Optional[str] = None):
+        """Cache key component of the model that answers: the served model, or the adapter as of the
+        pool version it was loaded at, so a replaced or reloaded adapter never hits older entries"""
+        if adapter is None:
+            return self._modelversion
+        return (self._modelversion, adapter, self._pool.adapter_version(adapter))
+
+    def predict_proba(self, texts: Iterable[str], batchSize: int = 32, adapter: Optional[str] = None) -> np.ndarray:
+        """Return class probabilities of shape (n, num_labels) for a list or iterator of texts"""
+        backend = self._inferencebackend(adapter)
+        if self.cache is None:
+            return softmax(backend.predict_logits(texts, batchSize=batchSize))
+
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        version = self._cacheversion(adapter)
+        probs = [self.cache.get(text, version) for text in texts]
+        # Each distinct normalized text that missed is scored once
+        missing = {}
+        for i, (text, prob) in enumerate(zip(texts, probs)):
+            if prob is None:
+                missing.setdefault(normalize(text), []).append(i)
+        if missing:
+            scored = softmax(backend.predict_logits([texts[rows[0]] for rows in missing.values()], batchSize=batchSize))
+            for rows, prob in zip(missing.values(), scored):
+                self.cache.put(texts[rows[0]], version, prob)
+                for i in rows:
+                    probs[i] = prob
+        return np.stack(probs) if probs else np.zeros((0, len(backend.id2label)), dtype=np.float32)
+
+    def predict_batch(self, texts: Iterable[str], k: int = 1, batchSize: int = 32, adapter: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the top-k (labels, probabilities) per text, each of shape (n, k)"""
+        return topk(self.predict_proba(texts, batchSize=batchSize, adapter=adapter), self._inferencebackend(adapter).id2label, k=k)
+
+    def _inference_call(self, text: str):
+        labels, _ = self.predict_batch([text])
+        return text, labels[0, 0]
 
 
 if __name__ == '__main__':
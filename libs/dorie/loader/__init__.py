@@ -1,11 +1,31 @@
-import os
-from .datatokenizer import MyDataset, tokenizer
-from .transformer import ModelTrainer
+# Public names are resolved on first access (PEP 562): importing the package does not pull in
+# datasets, transformers, peft or torch until the class that needs them is used
+from importlib import import_module
 
-os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+_LAZY_ATTRIBUTES = {
+    'MyDataset': '.datatokenizer',
+    'tokenizer': '.datatokenizer',
+    'ArtifactRegistry': '.registry',
+    'default_registry': '.registry',
+    'ModelTrainer': '.transformer',
+}
 
 __all__ = [
     'MyDataset', 
     'ModelTrainer',
-    'tokenizer'
+    'tokenizer',
+    'ArtifactRegistry',
+    'default_registry'
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,11 +1,30 @@
 #  ------------------------------------------------------------------------------------------
 #  Leverage huggingface Parameter-Efficient Fine Tuning Library
 #  Default behavior utilizes LORA: Low Rank Adaptation Method for fine tuning
+#  Trained adapters are served merged into the base weights (single tenant) or swapped per
+#  request batch on one resident base model (AdapterPool, one adapter per channel)
 #  ------------------------------------------------------------------------------------------
-from peft import get_peft_config, get_peft_model, LoraConfig, TaskType
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments
+from peft import get_peft_config, get_peft_model, LoraConfig, PeftConfig, PeftModel, TaskType
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments
+from pydantic import BaseModel, PrivateAttr
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
 
 import logging
+import threading
+
+import numpy as np
+
+try:
+    # peft checks LoRA targets for DTensor weights without importing the submodule itself
+    import torch.distributed.tensor  # noqa: F401
+except ImportError:
+    pass
+
+from .inference import predict_logits
 
 logger = logging.getLogger(__name__)
 
@@ -32,5 +51,138 @@ def return_peft_model(
     return model
 
 
+def is_adapter(path: str) -> bool:
+    return (Path(path) / 'adapter_config.json').is_file()
+
+
+def _basemodel(adapter_path: str, base_model: Optional[str] = None):
+    """Load a fresh base model for an adapter; PEFT injects its layers in place, so the
+    registry's shared models are never used as a base"""
+    base_model = base_model or PeftConfig.from_pretrained(adapter_path).base_model_name_or_path
+    # A config saved next to the adapter carries the label names of the fine-tuned head
+    config = AutoConfig.from_pretrained(adapter_path if (Path(adapter_path) / 'config.json').is_file() else base_model)
+    return AutoModelForSequenceClassification.from_pretrained(base_model, config=config)
+
+
+def load_adapter_model(adapter_path: str, base_model: Optional[str] = None, merge: bool = True):
+    """Load a trained adapter for inference. With `merge`, the LoRA weights are folded into the
+    base weights and a plain transformers model is returned, so inference has no adapter matmuls"""
+    model = PeftModel.from_pretrained(_basemodel(adapter_path, base_model), adapter_path, is_trainable=False)
+    if merge:
+        model = model.merge_and_unload()
+        logger.info(f"Merged adapter {adapter_path} into its base model")
+    return model.eval()
+
+
+class AdapterBackend(BaseModel):
+    """Inference backend view of one adapter in an `AdapterPool`"""
+    pool: Any
+    adapter: str
+
+    @property
+    def id2label(self) -> Dict[int, str]:
+        return self.pool.id2label(self.adapter)
+
+    def predict_logits(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        return self.pool.predict_logits(self.adapter, texts, batchSize=batchSize, maxLength=maxLength)
+
+
+class AdapterPool(BaseModel):
+    """One resident base model serving many LoRA adapters, e.g. one per channel. Adapters are
+    registered by name, loaded on first use and evicted least-recently-used beyond
+    `maxAdapters`; each batch runs under a lock with its adapter active."""
+    # Defaults to the base model recorded in the first adapter's config
+    baseModel: Optional[str] = None
+    tokenizer: Any
+    maxAdapters: int = 8
+    # Incremented whenever an adapter is (re)loaded, so result caches can key on it
+    version: int = 0
+
+    _paths: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _loaded: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _labels: Dict[str, dict] = PrivateAttr(default_factory=dict)
+    # Pool version at which each resident adapter was loaded
+    _versions: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _model: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+
+    def register(self, name: str, path: str) -> None:
+        """Register (or replace) the adapter served under `name`"""
+        with self._lock:
+            if name in self._loaded and self._paths.get(name) != str(path):
+                if len(self._loaded) > 1:
+                    self._unload(name)
+                else:
+                    # PEFT cannot delete a model's last adapter, the base model is reloaded instead
+                    self._loaded.clear()
+                    self._labels.clear()
+                    self._versions.clear()
+                    self._model = None
+            self._paths[name] = str(path)
+
+    @property
+    def adapters(self) -> list:
+        return list(self._paths)
+
+    @property
+    def loaded(self) -> list:
+        return list(self._loaded)
+
+    def _unload(self, name: str) -> None:
+        self._loaded.pop(name)
+        self._labels.pop(name, None)
+        self._versions.pop(name, None)
+        self._model.delete_adapter(name)
+        logger.info(f"Unloaded adapter {name}")
+
+    def _load(self, name: str) -> None:
+        if name in self._loaded:
+            self._loaded.move_to_end(name)
+            return
+        if name not in self._paths:
+            raise KeyError(f"Adapter {name} is not registered")
+        path = self._paths[name]
+        if self._model is None:
+            self._model = PeftModel.from_pretrained(_basemodel(path, self.baseModel), path, adapter_name=name, is_trainable=False).eval()
+        else:
+            self._model.load_adapter(path, adapter_name=name, is_trainable=False)
+        config_path = Path(path) / 'config.json'
+        self._labels[name] = AutoConfig.from_pretrained(path).id2label if config_path.is_file() else self._model.config.id2label
+        self._loaded[name] = path
+        # Evict after loading, so the model always keeps at least one adapter
+        while len(self._loaded) > self.maxAdapters:
+            self._unload(next(iter(self._loaded)))
+        self.version += 1
+        self._versions[name] = self.version
+        logger.info(f"Loaded adapter {name} from {path}")
+
+    @contextmanager
+    def activate(self, name: str):
+        """Hold the pool with adapter `name` active"""
+        with self._lock:
+            self._load(name)
+            self._model.set_adapter(name)
+            yield self._model
+
+    def id2label(self, name: str) -> Dict[int, str]:
+        with self._lock:
+            self._load(name)
+            return self._labels[name]
+
+    def adapter_version(self, name: str) -> int:
+        """Pool version at which adapter `name` was loaded, loading it if needed; a replaced or
+        reloaded adapter gets a new one"""
+        with self._lock:
+            self._load(name)
+            return self._versions[name]
+
+    def predict_logits(self, name: str, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        with self.activate(name) as model:
+            return predict_logits(model, self.tokenizer, texts, batchSize=batchSize, maxLength=maxLength)
+
+    def backend(self, name: str) -> AdapterBackend:
+        return AdapterBackend(pool=self, adapter=name)
+
+
 if __name__ == "__main__":
     return_peft_model("bert-base-uncased", "bert-base-uncased")
\ No newline at end of file
@@ -0,0 +1,130 @@
+#  ------------------------------------------------------------------------------------------
+#  Pluggable inference backends: eager PyTorch or ONNX Runtime on CPU
+#  Both return float32 logits of shape (n, num_labels) for a list or iterator of texts
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel, PrivateAttr
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Literal, Optional
+
+import logging
+
+import numpy as np
+
+from .export import ONNX_FILENAME
+from .inference import aggregate_windows, iter_chunks, pad_ids, predict_logits, score_ids, window_ids
+
+logger = logging.getLogger(__name__)
+
+
+class TorchBackend(BaseModel):
+    """Eager PyTorch inference on the model's device"""
+    model: Any
+    tokenizer: Any
+
+    @property
+    def id2label(self) -> Dict[int, str]:
+        return self.model.config.id2label
+
+    def predict_logits(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        return predict_logits(self.model, self.tokenizer, texts, batchSize=batchSize, maxLength=maxLength)
+
+    def score_ids(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        return score_ids(self.model, inputs)
+
+
+class OnnxBackend(BaseModel):
+    """ONNX Runtime CPU inference of a graph exported by `export_onnx`"""
+    modelDir: str
+    tokenizer: Any
+    filename: str = ONNX_FILENAME
+    # ORT_DISABLE_ALL, ORT_ENABLE_BASIC, ORT_ENABLE_EXTENDED or ORT_ENABLE_ALL
+    graphOptimization: Literal['disable', 'basic', 'extended', 'all'] = 'all'
+    intraOpThreads: int = 0  # 0 lets ONNX Runtime use one thread per physical core
+    interOpThreads: int = 0
+    providers: list = ['CPUExecutionProvider']
+
+    _session: Any = PrivateAttr(default=None)
+    _id2label: Dict[int, str] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The ONNX backend requires onnxruntime, install it with `pip install onnxruntime`") from e
+        from transformers import AutoConfig
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = {
+            'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[self.graphOptimization]
+        options.intra_op_num_threads = self.intraOpThreads
+        options.inter_op_num_threads = self.interOpThreads
+        self._session = ort.InferenceSession(str(Path(self.modelDir) / self.filename), sess_options=options, providers=self.providers)
+        self._id2label = AutoConfig.from_pretrained(self.modelDir).id2label
+        logger.info(f"Loaded ONNX model from {self.modelDir} with {self._session.get_providers()}")
+
+    @property
+    def id2label(self) -> Dict[int, str]:
+        return self._id2label
+
+    def predict_logits(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        outputs = []
+        for chunk in iter_chunks(texts, batchSize):
+            inputs = self.tokenizer(chunk, padding=True, truncation=True, max_length=maxLength, return_tensors='np')
+            feed = {name: inputs[name].astype(np.int64) for name in ('input_ids', 'attention_mask')}
+            outputs.append(self._session.run(['logits'], feed)[0].astype(np.float32))
+
+        if not outputs:
+            return np.zeros((0, len(self._id2label)), dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def score_ids(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {name: inputs[name].astype(np.int64) for name in ('input_ids', 'attention_mask')}
+        return self._session.run(['logits'], feed)[0].astype(np.float32)
+
+
+class WindowedBackend(BaseModel):
+    """Long-input inference over a torch or onnx backend. Texts longer than `windowLength` tokens
+    are split into windows overlapping by `stride` tokens; the windows of a batch of texts are
+    sorted by length and scored in padded batches, so short texts pay only for their own tokens,
+    and the window logits are aggregated per text (see `aggregate_windows`)"""
+    backend: Any
+    windowLength: int = 128
+    stride: int = 32
+    aggregation: Literal['max', 'mean', 'last'] = 'mean'
+    # Weight decay per window back from the last one, for `last`
+    decay: float = 0.5
+
+    @property
+    def tokenizer(self):
+        return self.backend.tokenizer
+
+    @property
+    def id2label(self) -> Dict[int, str]:
+        return self.backend.id2label
+
+    def predict_logits(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        """Return float32 logits of shape (n, num_labels); `maxLength` overrides the window length"""
+        if isinstance(texts, str):
+            texts = [texts]
+        outputs = []
+        for chunk in iter_chunks(texts, batchSize):
+            ids, mapping = window_ids(self.tokenizer, chunk, maxLength or self.windowLength, self.stride)
+            order = np.argsort([len(row) for row in ids], kind='stable')
+            logits = np.empty((len(ids), len(self.id2label)), dtype=np.float32)
+            for batch in iter_chunks(order, batchSize):
+                logits[batch] = self.backend.score_ids(pad_ids([ids[i] for i in batch], self.tokenizer.pad_token_id, self.tokenizer.padding_side))
+            outputs.append(aggregate_windows(logits, mapping, len(chunk), self.aggregation, self.decay))
+
+        if not outputs:
+            return np.zeros((0, len(self.id2label)), dtype=np.float32)
+        return np.concatenate(outputs)
+
+
+BACKENDS = {'torch': TorchBackend, 'onnx': OnnxBackend}
@@ -0,0 +1,147 @@
+#  ------------------------------------------------------------------------------------------
+#  Persistent, content-addressed cache of tokenized datasets
+#  Entries are Arrow tables written with `save_to_disk`; a hit reopens them memory-mapped
+#  ------------------------------------------------------------------------------------------
+from datasets import DatasetDict
+from pydantic import BaseModel
+
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1 << 20
+_META_FILE = 'meta.json'
+_DATA_DIR = 'data'
+
+# (abspath, size, mtime_ns) -> digest, so an unchanged file is hashed once per process
+_FILE_DIGESTS: dict = {}
+
+
+def file_fingerprint(path: str) -> str:
+    """Return the blake2b digest of a file's content"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo = (path, stat.st_size, stat.st_mtime_ns)
+    if memo not in _FILE_DIGESTS:
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        _FILE_DIGESTS[memo] = digest.hexdigest()
+    return _FILE_DIGESTS[memo]
+
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """Return a digest identifying the tokenizer's vocabulary, normalization and padding behavior"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(type(tokenizer).__name__.encode())
+    digest.update(str(getattr(tokenizer, 'padding_side', '')).encode())
+    digest.update(str(getattr(tokenizer, 'pad_token_id', '')).encode())
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None:
+        # Truncation and padding are per-call state of the backend, not part of its identity
+        state = json.loads(backend.to_str())
+        state.pop('truncation', None)
+        state.pop('padding', None)
+        digest.update(json.dumps(state, sort_keys=True).encode())
+    else:
+        digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _dirsize(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+class DatasetCache(BaseModel):
+    """On-disk cache of tokenized DatasetDicts, evicted least-recently-used under `maxBytes`"""
+    cacheDir: str = os.environ.get('DORIE_DATASET_CACHE', str(Path.home() / '.cache' / 'dorie' / 'datasets'))
+    maxBytes: int = int(os.environ.get('DORIE_DATASET_CACHE_MAX_BYTES', 20 * 1024 ** 3))
+
+    @staticmethod
+    def key(**parts) -> str:
+        """Derive the cache key from the parts that determine the tokenized output"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return Path(self.cacheDir) / key
+
+    def load(self, key: str) -> Optional[Tuple[DatasetDict, dict]]:
+        """Reopen a cached entry, or return None on a miss"""
+        entry = self._entry(key)
+        meta_file = entry / _META_FILE
+        if not meta_file.exists():
+            return None
+        try:
+            dataset = DatasetDict.load_from_disk(str(entry / _DATA_DIR))
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError, OSError) as e:
+            logger.warning(f"Discarding unreadable dataset cache entry {key}: {e}")
+            self.invalidate(key)
+            return None
+
+        # Access time drives eviction; atime is unreliable on noatime mounts
+        os.utime(meta_file)
+        logger.info(f"Dataset cache hit {key}")
+        return dataset, meta
+
+    def save(self, key: str, dataset: DatasetDict, meta: Optional[dict] = None) -> None:
+        """Write an entry atomically, then evict down to the size budget"""
+        entry = self._entry(key)
+        staging = Path(self.cacheDir) / f".{key}.{uuid.uuid4().hex}"
+        try:
+            dataset.save_to_disk(str(staging / _DATA_DIR))
+            with open(staging / _META_FILE, 'w') as f:
+                json.dump({**(meta or {}), 'key': key, 'created': time.time()}, f)
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Dataset cache stored {key}")
+        self.evict(keep=key)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Remove one entry, or the whole cache when no key is given"""
+        if key is None:
+            shutil.rmtree(self.cacheDir, ignore_errors=True)
+        else:
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def entries(self) -> list:
+        """Return (last access, size in bytes, path) per entry, least recently used first"""
+        root = Path(self.cacheDir)
+        if not root.exists():
+            return []
+        entries = [
+            (entry.joinpath(_META_FILE).stat().st_mtime, _dirsize(entry), entry)
+            for entry in root.iterdir()
+            if entry.joinpath(_META_FILE).exists()
+        ]
+        return sorted(entries, key=lambda e: e[0])
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Drop least recently used entries until the cache fits in `maxBytes`"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.maxBytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Dataset cache evicted {entry.name}")
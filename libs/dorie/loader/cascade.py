@@ -0,0 +1,229 @@
+#  ------------------------------------------------------------------------------------------
+#  Confidence-gated cascade inference
+#  A cheap first stage runs only the first layers of the fine-tuned encoder, mean-pools them
+#  and classifies with a nearest-centroid (or linear) head fitted on the training split. It
+#  answers when its confidence clears a threshold calibrated on the eval split and escalates
+#  the rest to the full model
+#  ------------------------------------------------------------------------------------------
+from transformers import AutoModel
+from pydantic import BaseModel, PrivateAttr
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple
+
+import copy
+import json
+import logging
+import math
+import time
+
+import numpy as np
+import torch
+
+from .export import merged_model
+from .inference import iter_chunks, softmax
+
+logger = logging.getLogger(__name__)
+
+CASCADE_FILENAME = 'cascade.json'
+_CASCADE_WEIGHTS = 'cascade.npz'
+
+
+def has_cascade(path: str) -> bool:
+    return (Path(path) / CASCADE_FILENAME).is_file()
+
+
+def early_encoder(model, numLayers: int):
+    """A copy of the first `numLayers` layers of a classifier's encoder (adapters merged)"""
+    model = merged_model(model)
+    base = getattr(model, model.base_model_prefix)
+    config = copy.deepcopy(base.config)
+    config.num_hidden_layers = min(numLayers, config.num_hidden_layers)
+    encoder = AutoModel.from_config(config)
+    # Later layers of the full encoder are ignored; a pooler absent from classifiers is unused
+    encoder.load_state_dict(base.state_dict(), strict=False)
+    return encoder.to(next(model.parameters()).device).eval()
+
+
+class EmbeddingStage(BaseModel):
+    """First cascade stage over the mean-pooled, L2-normalized output of an early encoder layer.
+    The `centroid` head scores cosine similarity to each intent's mean embedding, the `linear`
+    head is a logistic regression; either answers when its top probability is >= `threshold`"""
+    numLayers: int = 2
+    head: Literal['centroid', 'linear'] = 'centroid'
+    # Softmax temperature of the centroid cosine similarities
+    temperature: float = 0.05
+    threshold: float = math.inf
+    maxLength: Optional[int] = None
+
+    _encoder: Any = PrivateAttr(default=None)
+    _tokenizer: Any = PrivateAttr(default=None)
+    _weight: Optional[np.ndarray] = PrivateAttr(default=None)
+    _bias: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def attach(self, model, tokenizer) -> 'EmbeddingStage':
+        """Build the early encoder from the fine-tuned `model`"""
+        self._encoder = early_encoder(model, self.numLayers)
+        self._tokenizer = tokenizer
+        return self
+
+    def embed(self, texts: Iterable[str], batchSize: int = 64) -> np.ndarray:
+        device = next(self._encoder.parameters()).device
+        embeddings = []
+        with torch.inference_mode():
+            for chunk in iter_chunks(texts, batchSize):
+                inputs = self._tokenizer(chunk, padding=True, truncation=True, max_length=self.maxLength, return_tensors='pt').to(device)
+                hidden = self._encoder(**inputs).last_hidden_state
+                mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1)
+                embeddings.append(torch.nn.functional.normalize(pooled, dim=-1).float().cpu().numpy())
+        return np.concatenate(embeddings) if embeddings else np.zeros((0, self._encoder.config.hidden_size), dtype=np.float32)
+
+    def fit(self, texts: List[str], labels: Iterable[int], numLabels: int, batchSize: int = 64) -> 'EmbeddingStage':
+        """Fit the head on labelled (training) texts"""
+        embeddings, labels = self.embed(texts, batchSize), np.asarray(list(labels), dtype=np.int64)
+        if self.head == 'centroid':
+            centroids = np.zeros((numLabels, embeddings.shape[1]), dtype=np.float32)
+            np.add.at(centroids, labels, embeddings)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            self._weight, self._bias = centroids.T / self.temperature, np.zeros(numLabels, dtype=np.float32)
+        else:
+            linear = torch.nn.Linear(embeddings.shape[1], numLabels)
+            x, y = torch.from_numpy(embeddings), torch.from_numpy(labels)
+            optimizer = torch.optim.LBFGS(linear.parameters(), max_iter=100)
+
+            def closure():
+                optimizer.zero_grad()
+                loss = torch.nn.functional.cross_entropy(linear(x), y) + 1e-4 * linear.weight.pow(2).sum()
+                loss.backward()
+                return loss
+
+            optimizer.step(closure)
+            self._weight, self._bias = linear.weight.detach().numpy().T.copy(), linear.bias.detach().numpy().copy()
+        return self
+
+    def predict_proba(self, texts: Iterable[str], batchSize: int = 64) -> np.ndarray:
+        return softmax(self.embed(texts, batchSize) @ self._weight + self._bias)
+
+    def save(self, output_dir: str) -> None:
+        """Write the head and settings next to the model; `Intent` loads them with the model"""
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        np.savez(Path(output_dir) / _CASCADE_WEIGHTS, weight=self._weight, bias=self._bias)
+        with open(Path(output_dir) / CASCADE_FILENAME, 'w') as f:
+            json.dump(self.model_dump(), f, indent=4)
+
+    @classmethod
+    def load(cls, path: str, model, tokenizer) -> 'EmbeddingStage':
+        with open(Path(path) / CASCADE_FILENAME) as f:
+            stage = cls(**json.load(f)).attach(model, tokenizer)
+        weights = np.load(Path(path) / _CASCADE_WEIGHTS)
+        stage._weight, stage._bias = weights['weight'], weights['bias']
+        return stage
+
+
+class CascadeBackend(BaseModel):
+    """Inference backend answering from `stage` when confident and from `backend` otherwise.
+    Answers of the first stage are returned as log-probabilities"""
+    stage: EmbeddingStage
+    backend: Any
+    texts: int = 0
+    escalated: int = 0
+
+    @property
+    def tokenizer(self):
+        return self.backend.tokenizer
+
+    @property
+    def id2label(self) -> Dict[int, str]:
+        return self.backend.id2label
+
+    @property
+    def escalationRate(self) -> Optional[float]:
+        return self.escalated / self.texts if self.texts else None
+
+    def predict_logits(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        probs = self.stage.predict_proba(texts, batchSize=batchSize)
+        logits = np.log(np.clip(probs, 1e-12, None)).astype(np.float32)
+        escalate = np.flatnonzero(probs.max(-1) < self.stage.threshold) if len(texts) else np.zeros(0, dtype=np.int64)
+        if len(escalate):
+            logits[escalate] = self.backend.predict_logits([texts[i] for i in escalate], batchSize=batchSize, maxLength=maxLength)
+        self.texts += len(texts)
+        self.escalated += len(escalate)
+        return logits
+
+
+def _msper(run, texts: List[str]) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    result = run(texts)
+    return result, (time.perf_counter() - start) * 1000 / max(len(texts), 1)
+
+
+def calibrate(
+        stageProbs: np.ndarray,
+        fullPredictions: np.ndarray,
+        labels: np.ndarray,
+        stageMs: float,
+        fullMs: float,
+        maxAccuracyDrop: float = 0.01,
+        points: int = 101,
+    ) -> Tuple[float, List[dict]]:
+    """Pick the threshold that escalates the fewest inputs while keeping cascade accuracy within
+    `maxAccuracyDrop` of the full model, and return it with the threshold/escalation/accuracy/latency curve"""
+    confidence, stagePredictions = stageProbs.max(-1), stageProbs.argmax(-1)
+    fullAccuracy = float((fullPredictions == labels).mean())
+    thresholds = np.unique(np.concatenate([np.quantile(confidence, np.linspace(0, 1, points)), [math.inf]]))
+    curve = []
+    for threshold in thresholds:
+        answered = confidence >= threshold
+        predictions = np.where(answered, stagePredictions, fullPredictions)
+        escalation = float(1 - answered.mean())
+        curve.append({
+            'threshold': float(threshold),
+            'escalationRate': escalation,
+            'accuracy': float((predictions == labels).mean()),
+            'latencyMsPerText': stageMs + escalation * fullMs,
+        })
+    eligible = [point for point in curve if point['accuracy'] >= fullAccuracy - maxAccuracyDrop]
+    best = min(eligible, key=lambda point: (point['escalationRate'], point['threshold']))
+    return best['threshold'], curve
+
+
+def build_cascade(
+        model,
+        tokenizer,
+        backend,
+        train: Tuple[List[str], Iterable[int]],
+        evaluation: Tuple[List[str], Iterable[int]],
+        numLayers: int = 2,
+        head: Literal['centroid', 'linear'] = 'centroid',
+        maxAccuracyDrop: float = 0.01,
+        batchSize: int = 64,
+    ) -> Tuple[CascadeBackend, dict]:
+    """Fit the first stage on (texts, labels) of the training split, calibrate its threshold on the
+    eval split against `backend` (the full model) and return the cascade with a report of the
+    escalation rate and the end-to-end latency/accuracy curve"""
+    numLabels = len(backend.id2label)
+    stage = EmbeddingStage(numLayers=numLayers, head=head).attach(model, tokenizer).fit(list(train[0]), train[1], numLabels, batchSize=batchSize)
+
+    texts, labels = list(evaluation[0]), np.asarray(list(evaluation[1]), dtype=np.int64)
+    stageProbs, stageMs = _msper(lambda t: stage.predict_proba(t, batchSize=batchSize), texts)
+    fullLogits, fullMs = _msper(lambda t: backend.predict_logits(t, batchSize=batchSize), texts)
+    fullPredictions = fullLogits.argmax(-1)
+    stage.threshold, curve = calibrate(stageProbs, fullPredictions, labels, stageMs, fullMs, maxAccuracyDrop=maxAccuracyDrop)
+
+    chosen = next(point for point in curve if point['threshold'] == stage.threshold)
+    report = {
+        **chosen,
+        'fullAccuracy': float((fullPredictions == labels).mean()),
+        'stageAccuracy': float((stageProbs.argmax(-1) == labels).mean()),
+        'stageMsPerText': stageMs,
+        'fullMsPerText': fullMs,
+        'speedup': fullMs / chosen['latencyMsPerText'] if chosen['latencyMsPerText'] else None,
+        'curve': curve,
+    }
+    logger.info(
+        f"Cascade threshold {stage.threshold:.3f}: escalation {report['escalationRate']:.1%}, accuracy {report['accuracy']:.4f} "
+        f"(full {report['fullAccuracy']:.4f}), {report['speedup']:.2f}x"
+    )
+    return CascadeBackend(stage=stage, backend=backend), report
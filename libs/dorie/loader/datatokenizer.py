@@ -1,99 +1,219 @@
 # Preprcess the dataset and tokenize the input sentence
-from datasets import Dataset, DatasetDict, load_dataset
+from datasets import Dataset, DatasetDict, IterableDatasetDict, load_dataset
 from datasets.formatting.formatting import LazyBatch
-from transformers import AutoTokenizer
-import datasets.exceptions as dataset_exceptions
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
 
 import logging
 
 import os
-import sys
+from contextlib import contextmanager
 from typing import Optional, Union
 from pathlib import Path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  
+from .registry import default_registry
+from .cache import DatasetCache, file_fingerprint, tokenizer_fingerprint
+from .sources import DataSource, resolve_source
+from .splits import encode_labels, split_indices
+from .streaming import DEFAULT_BLOCK_SIZE, READERS, scan, streaming_datasetdict
 
 logger = logging.getLogger(__name__)
 
-def tokenizer(pretrained_model_name):
-    """Load the tokenizer"""
-    if any(k in pretrained_model_name for k in ("gpt", "opt", "bloom")):
+def tokenizer(pretrained_model_name, revision: Optional[str] = None):
+    """Load the tokenizer, shared process-wide through the artifact registry"""
+    if any(k in str(pretrained_model_name) for k in ("gpt", "opt", "bloom")):
         padding_side = "left"
     else:
         padding_side = "right"
 
-    tokenizer = AutoTokenizer.from_pretrained(pretrained_model_name, padding_side=padding_side)
-    if getattr(tokenizer, "pad_token_id") is None:
-        tokenizer.pad_token_id = tokenizer.eos_token_id
-        
-    return tokenizer
+    return default_registry.get_tokenizer(pretrained_model_name, padding_side=padding_side, revision=revision)
 
 
 class MyDataset(BaseModel):
     path: Union[str, Path]
     split: float = 0.8
+    validationSplit: float = 0.0
+    # Seeded per-class split; `stratify=False` keeps the contiguous head/tail split
+    stratify: bool = True
+    seed: int = 42
     pretrained_model_name: str = 'roberta-base'
     numLabels: Optional[int] = None
     labelMap: Optional[dict] = None
-
-    def _setnumlabels(self, dataset: Dataset):
-        """Set the number of labels in the dataset"""
-        self.numLabels = len(dataset['label'].unique())
+    maxLength: int = 128
+    # Store unpadded ids and their length; batches are padded by the collator instead
+    dynamicPadding: bool = False
+    revision: Optional[str] = None
+    # Directory of the tokenized dataset cache; caching is disabled when unset
+    cacheDir: Optional[str] = None
+    # Set by `loader` to report where the data was read from
+    source: Optional[DataSource] = None
+    # Read local CSV/JSONL files in blocks and return an IterableDatasetDict
+    streaming: bool = False
+    blockSize: int = DEFAULT_BLOCK_SIZE
+    # Tokenization: `numProc` > 1 shards batches over a process pool, otherwise the fast
+    # tokenizer's native threads parallelize within each batch of `batchSize` examples
+    numProc: Optional[int] = None
+    batchSize: int = 1000
+
+    # A label map derived from the data is a function of the source, so it is not part of the cache key
+    _labelmapderived: bool = PrivateAttr(default=False)
 
     def _fileformat(self):
         """Return the file format of the dataset"""
         return self.path.split('.')[-1] if isinstance(self.path, str) else self.path.suffix[1:]
-    
-    def _setlabelmap(self, dataset: Dataset) -> None:
-        """Set the label map"""
-        self.labelMap = self.labelMap or {str(label): i for i, label in enumerate(dataset['label'].unique())}
+
+    def _encodelabels(self, labels) -> np.ndarray:
+        """Encode a whole label column as integer codes, deriving the label map on first use"""
+        codes, labelMap = encode_labels(labels, self.labelMap)
+        if not self.labelMap:
+            self._labelmapderived = True
+        self.labelMap = labelMap
+        self.numLabels = len(labelMap)
+        return codes
 
     def _csvconverter(self, path: str):
         """Convert CSV dataset to DatasetDict"""
-        dataset = pd.read_csv(path)
-        self._setnumlabels(dataset)
-        self._setlabelmap(dataset=dataset)
+        return self._tableconverter(pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(include_columns=['text', 'label'])))
 
-        # TODO: Add support for dumping label map to a file/instance
-        # dataset['label'] = dataset['label'].map(self.labelMap)
+    def _frameconverter(self, dataset: pd.DataFrame):
+        """Convert a DataFrame with text and label columns to DatasetDict"""
+        return self._tableconverter(pa.Table.from_pandas(dataset[['text', 'label']], preserve_index=False))
 
-        data_dict = {'text': dataset['text'].tolist(), 'label': dataset['label'].tolist()}
-        split_idx = int(self.split * len(data_dict['text']))
+    def _tableconverter(self, table: pa.Table):
+        """Encode labels over the whole column, then split rows (stratified and seeded by default)"""
+        table = table.select(['text', 'label'])
+        codes = self._encodelabels(table.column('label'))
+        table = table.set_column(table.schema.get_field_index('label'), 'label', pa.array(codes))
+        indices = split_indices(codes, train=self.split, validation=self.validationSplit, seed=self.seed, stratify=self.stratify)
 
-        return DatasetDict({
-            'train': Dataset.from_dict({'text': data_dict['text'][:split_idx], 'label': data_dict['label'][:split_idx]}),
-            'test': Dataset.from_dict({'text': data_dict['text'][split_idx:], 'label': data_dict['label'][split_idx:]})
-        })
+        return DatasetDict({name: Dataset(table.take(idx)) for name, idx in indices.items()})
 
     def _jsonlconverter(self, path:str):
         """Convert JSONL dataset to DatasetDict"""
-        pass
-
-    def _hfhub(self):
-        """Load the dataset from HuggingFace Hub"""
-        train, test = load_dataset(self.path, split=['train', 'test'])
-        self._setnumlabels(train.data)
-        self._setlabelmap(dataset=train.data)
-
-        return DatasetDict({
+        return self._tableconverter(pa_json.read_json(path))
+
+    def _streamingconverter(self, path: str):
+        """Stream a local CSV/JSONL file; the label map is computed in a first streaming pass"""
+        format = self._fileformat()
+        assert format in READERS, f"File format {format} not supported for streaming"
+        numRows, labels = scan(path, format, blockSize=self.blockSize)
+        self._encodelabels(labels)
+
+        return streaming_datasetdict(
+            path, format, numRows, self.labelMap, split=self.split, validationSplit=self.validationSplit,
+            stratify=self.stratify, seed=self.seed, blockSize=self.blockSize,
+        )
+
+    def _hfhub(self, location: Optional[str] = None):
+        """Load the dataset from HuggingFace Hub, a cached Hub snapshot or a local dataset directory"""
+        remote = self.source is None or self.source.kind == 'hub'
+        train, test = load_dataset(location or str(self.path), split=['train', 'test'], revision=self.revision if remote else None)
+        # The train split defines the label map, the test split is encoded with it
+        dataset = DatasetDict({
             "train": train,
             "test": test
         })
+        for name, split in dataset.items():
+            codes = self._encodelabels(split.data.column('label'))
+            dataset[name] = split.remove_columns('label').add_column('label', codes)
+
+        return dataset
+
+    def _sourcefingerprint(self) -> Optional[str]:
+        """Identify the source data: a content hash for local files, the commit sha for Hub datasets"""
+        source = resolve_source(self.path, self.revision)
+        if source.kind == 'local':
+            return f"file:{file_fingerprint(source.location)}" if os.path.isfile(source.location) else None
+        if source.kind == 'hub-cache' or self.revision:
+            return f"hub:{self.path}@{source.revision}"
+        try:
+            from huggingface_hub import HfApi
+
+            return f"hub:{self.path}@{HfApi().dataset_info(str(self.path)).sha}"
+        except Exception as e:
+            logger.debug(f"Unable to resolve a revision for {self.path}, skipping the dataset cache: {e}")
+            return None
+
+    def _cachekey(self) -> Optional[str]:
+        """Return the dataset cache key, or None when caching is disabled or the source is unidentifiable"""
+        if not self.cacheDir:
+            return None
+        source = self._sourcefingerprint()
+        if source is None:
+            return None
+        return DatasetCache.key(
+            source=source,
+            tokenizer=tokenizer_fingerprint(tokenizer(self.pretrained_model_name)),
+            maxLength=self.maxLength,
+            dynamicPadding=self.dynamicPadding,
+            split=self.split,
+            validationSplit=self.validationSplit,
+            stratify=self.stratify,
+            seed=self.seed,
+            labelMap=None if self._labelmapderived else self.labelMap,
+        )
 
     def loader(self, format:str = 'torch'):
         """Load the dataset"""
-        try: 
-            dataset = self._hfhub()
-        except (dataset_exceptions.DatasetNotFoundError, FileNotFoundError, TypeError) as e:
-            logger.debug(f"Encountered a {e}. Dataset not found in HuggingFace Hub. Loading from local path")
+        if self.streaming and os.path.isfile(self.path):
+            dataset = self._streamingconverter(self.path).map(self.preprocess, batched=True, batch_size=self.batchSize)
+            return self._setformat(dataset, format)
+
+        # Resolved before the cache lookup so the source is reported on cache hits too
+        self.source = resolve_source(self.path, self.revision)
+        cache = DatasetCache(cacheDir=self.cacheDir) if self.cacheDir else None
+        key = self._cachekey()
+        cached = cache.load(key) if key else None
+        if cached:
+            dataset, meta = cached
+            self._labelmapderived = self._labelmapderived or not self.labelMap
+            self.numLabels, self.labelMap = meta['numLabels'], meta['labelMap']
+            logger.info(f"Loading {self.path} from the dataset cache ({self.source.kind} source {self.source.location})")
+            return self._setformat(dataset, format)
+
+        logger.info(f"Loading {self.path} from {self.source.kind} source {self.source.location}")
+        if self.source.kind == 'local' and os.path.isfile(self.source.location):
             mapping = {'csv': self._csvconverter, 'jsonl': self._jsonlconverter}
-            converter = mapping.get(self._fileformat(), self._hfhub)
+            converter = mapping.get(self._fileformat())
             assert converter, f"File format {self._fileformat()} not supported"
 
-            dataset = converter(self.path)
-        dataset = dataset.map(self.preprocess, batched=True)
+            dataset = converter(self.source.location)
+        else:
+            dataset = self._hfhub(self.source.location)
+        dataset = self.tokenize(dataset)
+        if key:
+            cache.save(key, dataset, meta={'numLabels': self.numLabels, 'labelMap': self.labelMap, 'path': str(self.path)})
+
+        return self._setformat(dataset, format)
+
+    @contextmanager
+    def _parallelism(self):
+        """Forked workers must not share the tokenizer's Rust thread pool, so TOKENIZERS_PARALLELISM
+        is 'false' while `numProc` > 1 workers tokenize and restored afterwards; later serial
+        tokenization keeps its threads. An explicit value from the environment always wins"""
+        previous = os.environ.get('TOKENIZERS_PARALLELISM')
+        if previous is not None or (self.numProc or 1) <= 1:
+            yield
+            return
+        os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+        try:
+            yield
+        finally:
+            os.environ.pop('TOKENIZERS_PARALLELISM', None)
+
+    def tokenize(self, dataset: DatasetDict, **kwargs) -> DatasetDict:
+        """Tokenize every split; output order and content do not depend on `numProc` or `batchSize`"""
+        num_proc = self.numProc if (self.numProc or 1) > 1 else None
+        with self._parallelism():
+            return dataset.map(self.preprocess, batched=True, batch_size=self.batchSize, num_proc=num_proc, **kwargs)
+
+    def _setformat(self, dataset: DatasetDict, format: str) -> DatasetDict:
+        if isinstance(dataset, IterableDatasetDict):
+            return dataset.with_format(format)
         try:
             dataset.set_format(format)
         except:
@@ -102,12 +222,14 @@ class MyDataset(BaseModel):
 
         return dataset
     
-    def preprocess(self, examples: LazyBatch,  max_length: int = 128):
+    def preprocess(self, examples: LazyBatch,  max_length: Optional[int] = None):
         """Preprocess the input sentence"""
         tokenizer_ = tokenizer(self.pretrained_model_name)
 
-        tokenized_examples = tokenizer_(examples['text'], truncation=True, padding='max_length', max_length=max_length)
-        tokenized_examples['label'] = [self.labelMap[label] for label in examples['label']]
+        padding = False if self.dynamicPadding else 'max_length'
+        tokenized_examples = tokenizer_(examples['text'], truncation=True, padding=padding, max_length=max_length or self.maxLength)
+        if self.dynamicPadding:
+            tokenized_examples['length'] = [len(ids) for ids in tokenized_examples['input_ids']]
         return tokenized_examples
 
     def __call__(self, *args, **kwds):
@@ -0,0 +1,197 @@
+#  ------------------------------------------------------------------------------------------
+#  Knowledge distillation of a trained classifier into a small student
+#  The teacher's logits are computed once per split and cached next to the tokenized data;
+#  the student, a few-layer copy of the teacher's architecture initialized from its embeddings
+#  and evenly spaced layers, trains on cross-entropy plus temperature-scaled KL to the teacher
+#  ------------------------------------------------------------------------------------------
+from transformers import AutoModelForSequenceClassification
+from datasets import DatasetDict
+from pydantic import BaseModel
+
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Optional
+
+import copy
+import hashlib
+import logging
+import re
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .adaptation import is_adapter, load_adapter_model
+from .backends import TorchBackend
+from .cache import DatasetCache, file_fingerprint
+from .datatokenizer import MyDataset, tokenizer as datatokenizer
+from .evaluation import iter_tokenized_batches
+from .quantization import quantization_report
+from .registry import default_registry
+from .transformer import LengthGroupedTrainer, ModelTrainer
+
+logger = logging.getLogger(__name__)
+
+TEACHER_COLUMN = 'teacher_logits'
+_LAYER = re.compile(r'\.layer\.(\d+)\.')
+
+
+def teacher_logits(model, tokenizer, dataset, batchSize: int = 64) -> np.ndarray:
+    """Logits of `model` over a tokenized split, shape (rows, num_labels), in dataset order"""
+    device = next(model.parameters()).device
+    training = model.training
+    model.eval()
+    logits = []
+    try:
+        with torch.inference_mode():
+            for inputs, _ in iter_tokenized_batches(dataset, batchSize, tokenizer.pad_token_id, tokenizer.padding_side):
+                logits.append(model(**{name: torch.from_numpy(array).to(device) for name, array in inputs.items()}).logits.float().cpu().numpy())
+    finally:
+        model.train(training)
+    return np.concatenate(logits) if logits else np.zeros((0, model.config.num_labels), dtype=np.float32)
+
+
+def _splitfingerprint(split) -> str:
+    """Digest of a tokenized split's input ids"""
+    digest = hashlib.blake2b(digest_size=20)
+    for chunk in split.data.column('input_ids').chunks:
+        for buffer in chunk.buffers():
+            if buffer is not None:
+                digest.update(buffer)
+    return digest.hexdigest()
+
+
+def _teacherfingerprint(teacher: str) -> str:
+    weights = sorted(p for p in Path(teacher).glob('*') if p.suffix in ('.safetensors', '.bin')) if Path(teacher).is_dir() else []
+    return ','.join(file_fingerprint(str(p)) for p in weights) or str(teacher)
+
+
+def soft_labels(dataset: DatasetDict, model, tokenizer, teacher: str, cacheDir: Optional[str] = None, batchSize: int = 64) -> DatasetDict:
+    """Add the teacher's logits to every split as a `teacher_logits` column. With `cacheDir`,
+    the labelled splits are cached on the teacher's weights and the tokenized inputs"""
+    cache = DatasetCache(cacheDir=cacheDir) if cacheDir else None
+    key = DatasetCache.key(
+        teacher=_teacherfingerprint(teacher), splits={name: _splitfingerprint(split) for name, split in dataset.items()}
+    ) if cache else None
+    cached = cache.load(key) if cache else None
+    if cached:
+        labelled = cached[0]
+    else:
+        labelled = DatasetDict({
+            name: split.add_column(TEACHER_COLUMN, list(teacher_logits(model, tokenizer, split, batchSize)))
+            for name, split in dataset.with_format(None).items()
+        })
+        if cache:
+            cache.save(key, labelled, meta={'teacher': str(teacher)})
+    labelled.set_format(dataset['train'].format['type'])
+    return labelled
+
+
+def student_model(teacher, numLayers: int = 2, **config):
+    """A `numLayers`-layer model of the teacher's architecture and labels. Embeddings, the
+    classification head and evenly spaced encoder layers are copied from the teacher wherever
+    the shapes match; `config` overrides the student's config, e.g. intermediate_size"""
+    studentConfig = copy.deepcopy(teacher.config)
+    teacherLayers = studentConfig.num_hidden_layers
+    studentConfig.update({'num_hidden_layers': numLayers, **config})
+    student = AutoModelForSequenceClassification.from_config(studentConfig)
+
+    layerMap = np.linspace(0, teacherLayers - 1, numLayers).round().astype(int) if numLayers > 1 else np.asarray([teacherLayers - 1])
+    teacherState = teacher.state_dict()
+    state, copied = student.state_dict(), 0
+    for name, value in state.items():
+        source = _LAYER.sub(lambda m: f'.layer.{layerMap[int(m.group(1))]}.', name)
+        if source in teacherState and teacherState[source].shape == value.shape:
+            state[name] = teacherState[source].clone()
+            copied += 1
+    student.load_state_dict(state)
+    logger.info(f"Student with {numLayers} of {teacherLayers} layers (teacher layers {layerMap.tolist()}), {copied}/{len(state)} tensors from the teacher")
+    return student
+
+
+class DistillationTrainer(LengthGroupedTrainer):
+    """Trainer whose loss is `alpha` * cross-entropy on the labels plus (1 - `alpha`) * T^2 * KL
+    between the temperature-softened teacher and student distributions"""
+
+    def __init__(self, *args, temperature: float = 2.0, alpha: float = 0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def _set_signature_columns_if_needed(self):
+        super()._set_signature_columns_if_needed()
+        # The teacher column is not a model input but must survive unused-column removal
+        if TEACHER_COLUMN not in self._signature_columns:
+            self._signature_columns = [*self._signature_columns, TEACHER_COLUMN]
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher = inputs.pop(TEACHER_COLUMN, None)
+        if teacher is None:
+            return super().compute_loss(model, inputs, return_outputs=return_outputs, **kwargs)
+        outputs = model(**inputs)
+        logits = outputs.logits
+        hard = F.cross_entropy(logits, inputs['labels'])
+        T = self.temperature
+        soft = F.kl_div(
+            F.log_softmax(logits / T, dim=-1), F.log_softmax(teacher.to(logits) / T, dim=-1), reduction='batchmean', log_target=True
+        ) * T * T
+        loss = self.alpha * hard + (1 - self.alpha) * soft
+        return (loss, outputs) if return_outputs else loss
+
+
+class Distiller(BaseModel):
+    """Distill the model saved at `teacher` (a trained `Intent`/`ModelTrainer` directory or a
+    LoRA adapter) into a `numLayers`-layer student trained with `modelArgs` on `dataClass`"""
+    teacher: str
+    dataClass: MyDataset
+    modelArgs: dict
+    numLayers: int = 2
+    # Overrides of the student config, e.g. {'intermediate_size': 1024}
+    studentConfig: dict = {}
+    temperature: float = 2.0
+    # Weight of the hard-label cross-entropy; the rest goes to the teacher's soft labels
+    alpha: float = 0.5
+    device: str = 'cpu'
+    # Cache of the teacher-labelled splits; disabled when unset
+    cacheDir: Optional[str] = None
+    batchSize: int = 64
+
+    def _teachermodel(self):
+        if is_adapter(self.teacher):
+            return load_adapter_model(self.teacher, merge=True)
+        return default_registry.get_model(self.teacher)
+
+    def distill(self, outputDir: str) -> ModelTrainer:
+        """Train the student and save it to `outputDir`, loadable with `Intent(trainer=outputDir)`"""
+        teacher = self._teachermodel()
+        tokenizer = datatokenizer(self.teacher)
+        # The student shares the teacher's tokenizer and label ids, unless it only has the default LABEL_<i> names
+        labelMap = None if all(label.startswith('LABEL_') for label in teacher.config.label2id) else dict(teacher.config.label2id)
+        dataClass = self.dataClass.model_copy(update={'pretrained_model_name': self.teacher, 'labelMap': labelMap or self.dataClass.labelMap})
+        data = soft_labels(dataClass.loader(), teacher, tokenizer, self.teacher, cacheDir=self.cacheDir, batchSize=self.batchSize)
+
+        trainer = ModelTrainer(
+            baseModel=self.teacher, modelArgs=self.modelArgs, device=self.device, dataClass=dataClass, data=data,
+            model=student_model(teacher, self.numLayers, **self.studentConfig),
+        )
+        trainer.train(trainerClass=partial(DistillationTrainer, temperature=self.temperature, alpha=self.alpha))
+        trainer.save(outputDir)
+        return trainer
+
+
+def distillation_report(teacher: str, student: str, texts: Iterable[str], labels: Iterable[int], batchSize: int = 32) -> dict:
+    """Accuracy and latency of the teacher and student models saved at those paths on labelled
+    texts, with the student's speedup and accuracy delta, overall and per intent"""
+    backends = {
+        name: TorchBackend(model=load_adapter_model(path) if is_adapter(path) else default_registry.get_model(path), tokenizer=datatokenizer(path))
+        for name, path in (('teacher', teacher), ('student', student))
+    }
+    report = quantization_report(backends, texts, labels, backends['teacher'].id2label, sizes={'teacher': teacher, 'student': student}, batchSize=batchSize)
+    report['speedup'] = report['student']['textsPerSec'] / report['teacher']['textsPerSec']
+    report['accuracyDelta'] = report['student']['accuracy'] - report['teacher']['accuracy']
+    report['perIntentDelta'] = {
+        intent: metrics['accuracy'] - report['teacher']['perIntent'][intent]['accuracy'] for intent, metrics in report['student']['perIntent'].items()
+    }
+    logger.info(f"Student speedup {report['speedup']:.2f}x, accuracy delta {report['accuracyDelta']:+.4f}")
+    return report
+
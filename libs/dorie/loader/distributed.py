@@ -0,0 +1,119 @@
+#  ------------------------------------------------------------------------------------------
+#  Multi-process data-parallel training on CPU nodes with the gloo backend
+#  Workers rendezvous through MASTER_ADDR/MASTER_PORT/RANK/WORLD_SIZE (set here for local
+#  workers, or by torchrun), every rank builds the same seeded splits, the Trainer shards
+#  batches across ranks, and only rank 0 writes the model artifacts
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel, Field
+
+from argparse import ArgumentParser
+from functools import partial
+from typing import Callable, Optional
+
+import json
+import logging
+import os
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+logger = logging.getLogger(__name__)
+
+
+def is_main_process() -> bool:
+    """True outside distributed training and on global rank 0"""
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank() == 0
+    return int(os.environ.get('RANK', 0)) == 0
+
+
+def build_trainer(baseModel: str, modelArgs: dict, path: str, device: str = 'cpu', datasetArgs: Optional[dict] = None):
+    """Picklable trainer factory for worker processes: each rank loads and splits the data itself"""
+    from .datatokenizer import MyDataset
+    from .transformer import ModelTrainer
+
+    dataClass = MyDataset(path=path, pretrained_model_name=baseModel, **(datasetArgs or {}))
+    return ModelTrainer(baseModel=baseModel, modelArgs=modelArgs, device=device, dataClass=dataClass)
+
+
+def _worker(localRank: int, launcher: 'DistributedLauncher', build: Callable, outputDir: str) -> None:
+    rank = launcher.nodeRank * launcher.nprocPerNode + localRank
+    os.environ.update({
+        'MASTER_ADDR': launcher.masterAddr,
+        'MASTER_PORT': str(launcher.masterPort),
+        'WORLD_SIZE': str(launcher.worldSize),
+        'RANK': str(rank),
+        'LOCAL_RANK': str(localRank),
+        'LOCAL_WORLD_SIZE': str(launcher.nprocPerNode),
+    })
+    run_worker(build, outputDir, threads=launcher.threads())
+
+
+def run_worker(build: Callable, outputDir: str, threads: Optional[int] = None) -> None:
+    """Train one rank; the process group is created by the Trainer from the environment"""
+    if threads:
+        torch.set_num_threads(threads)
+    trainer = build()
+    trainer.modelArgs = {**trainer.modelArgs, 'ddp_backend': 'gloo', 'use_cpu': trainer.device == 'cpu'}
+    output = trainer.train()
+    trainer.save(outputDir)
+    if is_main_process():
+        with open(os.path.join(outputDir, 'train_metrics.json'), 'w') as f:
+            json.dump({**output.metrics, 'world_size': dist.get_world_size() if dist.is_initialized() else 1}, f, indent=4)
+    if dist.is_initialized():
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+class DistributedLauncher(BaseModel):
+    """Spawn `nprocPerNode` gloo workers on this node. For several nodes run the launcher on each
+    with the same masterAddr/masterPort/nnodes and its own nodeRank (defaults come from the
+    MASTER_ADDR, MASTER_PORT, NNODES and NODE_RANK environment variables)"""
+    nprocPerNode: int = 2
+    nnodes: int = Field(default_factory=lambda: int(os.environ.get('NNODES', 1)))
+    nodeRank: int = Field(default_factory=lambda: int(os.environ.get('NODE_RANK', 0)))
+    masterAddr: str = Field(default_factory=lambda: os.environ.get('MASTER_ADDR', '127.0.0.1'))
+    masterPort: int = Field(default_factory=lambda: int(os.environ.get('MASTER_PORT', 29500)))
+    # Intra-op threads per worker; defaults to an even share of this node's cores
+    threadsPerProcess: Optional[int] = None
+
+    @property
+    def worldSize(self) -> int:
+        return self.nnodes * self.nprocPerNode
+
+    def threads(self) -> int:
+        return self.threadsPerProcess or max(1, (os.cpu_count() or 1) // self.nprocPerNode)
+
+    def launch(self, build: Callable, outputDir: str) -> str:
+        """Train with `build()` (a picklable factory returning a ModelTrainer) on every local
+        worker and return `outputDir`, where rank 0 saved the model"""
+        os.makedirs(outputDir, exist_ok=True)
+        logger.info(f"Launching {self.nprocPerNode} workers on node {self.nodeRank} of {self.nnodes} ({self.masterAddr}:{self.masterPort})")
+        mp.spawn(_worker, args=(self, build, outputDir), nprocs=self.nprocPerNode, join=True)
+        return outputDir
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Data-parallel training on CPU workers with gloo. Under torchrun, each process trains one rank.')
+    parser.add_argument('--model', required=True, help='Base model name or path')
+    parser.add_argument('--path', required=True, help='Training data')
+    parser.add_argument('--output', required=True, help='Directory of the trained model')
+    parser.add_argument('--model-args', default='{}', help='JSON TrainingArguments')
+    parser.add_argument('--nproc-per-node', type=int, default=2)
+    parser.add_argument('--nnodes', type=int, default=int(os.environ.get('NNODES', 1)))
+    parser.add_argument('--node-rank', type=int, default=int(os.environ.get('NODE_RANK', 0)))
+    parser.add_argument('--master-addr', default=os.environ.get('MASTER_ADDR', '127.0.0.1'))
+    parser.add_argument('--master-port', type=int, default=int(os.environ.get('MASTER_PORT', 29500)))
+    args = parser.parse_args()
+
+    modelArgs = {'output_dir': args.output, **json.loads(args.model_args)}
+    build = partial(build_trainer, baseModel=args.model, modelArgs=modelArgs, path=args.path)
+    if 'LOCAL_RANK' in os.environ and 'WORLD_SIZE' in os.environ:
+        # Launched by torchrun, which already set up the rendezvous environment
+        run_worker(build, args.output)
+    else:
+        DistributedLauncher(
+            nprocPerNode=args.nproc_per_node, nnodes=args.nnodes, nodeRank=args.node_rank,
+            masterAddr=args.master_addr, masterPort=args.master_port,
+        ).launch(build, args.output)
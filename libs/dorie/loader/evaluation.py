@@ -0,0 +1,190 @@
+#  ------------------------------------------------------------------------------------------
+#  Streaming, single-pass evaluation
+#  Batches of logits are folded into a confusion matrix, a running loss and top-2 margin
+#  statistics, so memory is bounded by the number of intents, not the number of utterances
+#  ------------------------------------------------------------------------------------------
+from datasets import Dataset
+from pydantic import BaseModel, PrivateAttr
+
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import heapq
+import logging
+
+import numpy as np
+
+from .inference import iter_chunks, pad_ids, softmax
+from .sampler import LengthGroupedBatchSampler
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingEvaluator(BaseModel):
+    """Accumulate classification metrics over batches of (logits, labels).
+    A prediction whose top-2 probability margin is below `marginThreshold` is counted as a
+    confused intent; the `maxExamples` most confused texts are kept for review."""
+    numLabels: int
+    id2label: Dict[int, str] = {}
+    marginThreshold: float = 0.1
+    marginBins: int = 100
+    maxExamples: int = 50
+
+    _confusion: np.ndarray = PrivateAttr()
+    _marginhist: np.ndarray = PrivateAttr()
+    _losssum: float = PrivateAttr(default=0.0)
+    _confusedbyintent: np.ndarray = PrivateAttr()
+    _confusedpairs: Counter = PrivateAttr(default_factory=Counter)
+    # Min-heap on -margin keeps the lowest-margin examples
+    _examples: list = PrivateAttr(default_factory=list)
+    _seen: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._confusion = np.zeros((self.numLabels, self.numLabels), dtype=np.int64)
+        self._marginhist = np.zeros(self.marginBins, dtype=np.int64)
+        self._confusedbyintent = np.zeros(self.numLabels, dtype=np.int64)
+        self._losssum = 0.0
+        self._confusedpairs = Counter()
+        self._examples = []
+        self._seen = 0
+
+    @property
+    def count(self) -> int:
+        return int(self._confusion.sum())
+
+    def _label(self, code: int) -> str:
+        return self.id2label.get(int(code), str(int(code)))
+
+    def update(self, logits: np.ndarray, labels: Iterable[int], texts: Optional[List[str]] = None) -> None:
+        """Fold one batch of logits, shape (n, numLabels), and true label ids into the metrics"""
+        logits = np.asarray(logits, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.int64)
+        probs = softmax(logits)
+        predictions = probs.argmax(-1)
+        np.add.at(self._confusion, (labels, predictions), 1)
+
+        # Cross-entropy from log-softmax, stable for large logits
+        shifted = logits - logits.max(-1, keepdims=True)
+        logprobs = shifted - np.log(np.exp(shifted).sum(-1, keepdims=True))
+        self._losssum += float(-logprobs[np.arange(len(labels)), labels].sum())
+
+        top2 = np.argsort(-probs, axis=-1, kind='stable')[:, :2]
+        margins = probs[np.arange(len(probs)), top2[:, 0]] - (probs[np.arange(len(probs)), top2[:, 1]] if self.numLabels > 1 else 0.0)
+        self._marginhist += np.histogram(margins, bins=self.marginBins, range=(0.0, 1.0))[0]
+
+        confused = margins < self.marginThreshold
+        np.add.at(self._confusedbyintent, labels[confused], 1)
+        self._confusedpairs.update(zip(top2[confused, 0].tolist(), top2[confused, 1].tolist()))
+
+        for i in np.flatnonzero(confused):
+            entry = (-float(margins[i]), self._seen + int(i), {
+                'text': texts[i] if texts is not None else None, 'label': self._label(labels[i]),
+                'top1': self._label(top2[i, 0]), 'top2': self._label(top2[i, 1]), 'margin': float(margins[i]),
+            })
+            if len(self._examples) < self.maxExamples:
+                heapq.heappush(self._examples, entry)
+            elif entry[0] > self._examples[0][0]:
+                heapq.heapreplace(self._examples, entry)
+        self._seen += len(labels)
+
+    def _marginquantile(self, q: float) -> Optional[float]:
+        total = self._marginhist.sum()
+        if not total:
+            return None
+        index = int(np.searchsorted(np.cumsum(self._marginhist), q * total))
+        return (min(index, self.marginBins - 1) + 0.5) / self.marginBins
+
+    def compute(self) -> dict:
+        confusion = self._confusion
+        support = confusion.sum(1)
+        predicted = confusion.sum(0)
+        correct = np.diag(confusion)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, correct / predicted, 0.0)
+            recall = np.where(support > 0, correct / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        total = int(support.sum())
+        present = support > 0
+        confused = int(self._confusedbyintent.sum())
+
+        return {
+            'count': total,
+            'loss': self._losssum / total if total else None,
+            'accuracy': float(correct.sum() / total) if total else None,
+            'macroF1': float(f1[present].mean()) if present.any() else None,
+            'weightedF1': float((f1 * support).sum() / total) if total else None,
+            'perIntent': {
+                self._label(i): {
+                    'precision': float(precision[i]), 'recall': float(recall[i]), 'f1': float(f1[i]), 'support': int(support[i]),
+                    'confused': int(self._confusedbyintent[i]),
+                }
+                for i in range(self.numLabels)
+            },
+            'confusionMatrix': confusion.tolist(),
+            'margin': {
+                'threshold': self.marginThreshold,
+                'confusedFraction': confused / total if total else None,
+                'p10': self._marginquantile(0.1),
+                'p50': self._marginquantile(0.5),
+                'p90': self._marginquantile(0.9),
+            },
+            'confusedPairs': [
+                {'top1': self._label(a), 'top2': self._label(b), 'count': count}
+                for (a, b), count in self._confusedpairs.most_common(20)
+            ],
+            'confusedExamples': [entry for _, _, entry in sorted(self._examples, reverse=True)],
+        }
+
+
+def iter_tokenized_batches(
+        dataset, batchSize: int, padId: int, paddingSide: str = 'right', groupByLength: bool = False,
+    ) -> Iterator[Tuple[Dict[str, np.ndarray], np.ndarray]]:
+    """Yield (padded inputs, labels) from a tokenized Dataset or IterableDataset, one batch at a time.
+    With `groupByLength`, a Dataset with a `length` column is read in `LengthGroupedBatchSampler`
+    evaluation batches (longest first) to limit padding; otherwise rows come in dataset order"""
+    dataset = dataset.with_format(None)
+    # An IterableDataset has no column names (None); its rows are read whole
+    names = dataset.column_names or []
+    if names:
+        dataset = dataset.select_columns([c for c in ('input_ids', 'attention_mask', 'label', 'length') if c in names])
+    if groupByLength and isinstance(dataset, Dataset) and 'length' in names:
+        sampler = LengthGroupedBatchSampler(dataset['length'], batchSize, shuffle=False)
+        batches = (dataset[[int(i) for i in indices]] for indices in sampler.batches())
+    else:
+        batches = dataset.iter(batch_size=batchSize)
+    for rows in batches:
+        inputs = pad_ids(rows['input_ids'], padId, paddingSide)
+        if 'attention_mask' in rows:
+            inputs['attention_mask'] = pad_ids(rows['attention_mask'], 0, paddingSide)['input_ids']
+        yield inputs, np.asarray(rows['label'], dtype=np.int64)
+
+
+def evaluate_dataset(model, tokenizer, dataset, batchSize: int = 64, **kwargs) -> dict:
+    """Stream a tokenized split through a torch model, in length-grouped batches when the split
+    has a `length` column, and return `StreamingEvaluator` metrics"""
+    import torch
+
+    evaluator = StreamingEvaluator(numLabels=model.config.num_labels, id2label=model.config.id2label, **kwargs)
+    device = next(model.parameters()).device
+    training = model.training
+    model.eval()
+    try:
+        with torch.inference_mode():
+            for inputs, labels in iter_tokenized_batches(dataset, batchSize, tokenizer.pad_token_id, tokenizer.padding_side, groupByLength=True):
+                logits = model(**{name: torch.from_numpy(array).to(device) for name, array in inputs.items()}).logits
+                evaluator.update(logits.float().cpu().numpy(), labels)
+    finally:
+        model.train(training)
+    return evaluator.compute()
+
+
+def evaluate_texts(backend, examples: Iterable[Tuple[str, int]], batchSize: int = 64, **kwargs) -> dict:
+    """Stream (text, label id) pairs, e.g. logged utterances, through an inference backend"""
+    evaluator = StreamingEvaluator(numLabels=len(backend.id2label), id2label=backend.id2label, **kwargs)
+    for chunk in iter_chunks(examples, batchSize):
+        texts, labels = zip(*chunk)
+        evaluator.update(backend.predict_logits(list(texts), batchSize=batchSize), labels, texts=list(texts))
+    return evaluator.compute()
@@ -0,0 +1,69 @@
+#  ------------------------------------------------------------------------------------------
+#  ONNX export of fine-tuned sequence classification models
+#  LoRA adapters are merged into the base weights first, so the exported graph is a plain
+#  RoBERTa classifier with dynamic batch and sequence axes
+#  ------------------------------------------------------------------------------------------
+from pathlib import Path
+from typing import Optional
+
+import copy
+import logging
+
+import peft
+import torch
+
+logger = logging.getLogger(__name__)
+
+ONNX_FILENAME = 'model.onnx'
+DEFAULT_OPSET = 17
+
+
+def merged_model(model):
+    """Return a plain transformers model; PEFT models are copied and their adapters merged"""
+    if isinstance(model, peft.PeftModel):
+        # merge_and_unload rewrites the wrapped modules, keep the trainable model untouched
+        return copy.deepcopy(model).merge_and_unload()
+    return model
+
+
+def export_onnx(model, tokenizer, output_dir: str, opset: int = DEFAULT_OPSET, filename: str = ONNX_FILENAME) -> str:
+    """Export `model` to `output_dir`/`filename` along with its config and tokenizer, and return
+    the ONNX file path. Inputs are `input_ids` and `attention_mask`, the output is `logits`"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model = merged_model(model)
+
+    training = model.training
+    device = next(model.parameters()).device
+    model.eval().to('cpu')
+    sample = tokenizer(['a sample input', 'another'], padding=True, return_tensors='pt')
+    path = output_dir / filename
+    try:
+        with torch.inference_mode():
+            torch.onnx.export(
+                model,
+                (sample['input_ids'], sample['attention_mask']),
+                str(path),
+                input_names=['input_ids', 'attention_mask'],
+                output_names=['logits'],
+                dynamic_axes={
+                    'input_ids': {0: 'batch', 1: 'sequence'},
+                    'attention_mask': {0: 'batch', 1: 'sequence'},
+                    'logits': {0: 'batch'},
+                },
+                opset_version=opset,
+                do_constant_folding=True,
+                dynamo=False,
+            )
+    finally:
+        model.to(device).train(training)
+
+    # The config carries id2label and the tokenizer is needed to serve the graph
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"Exported ONNX model to {path}")
+    return str(path)
+
+
+def has_onnx(model_dir: str, filename: Optional[str] = None) -> bool:
+    return (Path(model_dir) / (filename or ONNX_FILENAME)).is_file()
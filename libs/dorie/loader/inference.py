@@ -0,0 +1,100 @@
+#  ------------------------------------------------------------------------------------------
+#  Batched inference shared by ModelTrainer and Intent
+#  Texts are tokenized in chunks with dynamic padding and scored under torch.inference_mode
+#  ------------------------------------------------------------------------------------------
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+def iter_chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Yield lists of at most `size` texts from any iterable"""
+    iterator = iter(texts)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def pad_ids(ids: List[List[int]], padId: int, paddingSide: str = 'right') -> Dict[str, np.ndarray]:
+    """Pad pre-tokenized ids to the longest row; returns int64 `input_ids` and `attention_mask`"""
+    width = max((len(row) for row in ids), default=0)
+    inputIds = np.full((len(ids), width), padId, dtype=np.int64)
+    attentionMask = np.zeros((len(ids), width), dtype=np.int64)
+    for i, row in enumerate(ids):
+        span = slice(width - len(row), width) if paddingSide == 'left' else slice(0, len(row))
+        inputIds[i, span] = row
+        attentionMask[i, span] = 1
+    return {'input_ids': inputIds, 'attention_mask': attentionMask}
+
+
+def predict_logits(model, tokenizer, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+    """Return float32 logits of shape (n, num_labels). Each chunk is padded to its longest text"""
+    if isinstance(texts, str):
+        texts = [texts]
+    device = next(model.parameters()).device
+    training = model.training
+    model.eval()
+    outputs = []
+    try:
+        with torch.inference_mode():
+            for chunk in iter_chunks(texts, batchSize):
+                inputs = tokenizer(chunk, padding=True, truncation=True, max_length=maxLength, return_tensors='pt').to(device)
+                outputs.append(model(**inputs).logits.float().cpu().numpy())
+    finally:
+        model.train(training)
+
+    if not outputs:
+        return np.zeros((0, model.config.num_labels), dtype=np.float32)
+    return np.concatenate(outputs)
+
+
+def score_ids(model, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    """Return float32 logits of a torch model for padded `input_ids`/`attention_mask` arrays"""
+    device = next(model.parameters()).device
+    training = model.training
+    model.eval()
+    try:
+        with torch.inference_mode():
+            return model(**{name: torch.from_numpy(array).to(device) for name, array in inputs.items()}).logits.float().cpu().numpy()
+    finally:
+        model.train(training)
+
+
+def window_ids(tokenizer, texts: List[str], windowLength: int, stride: int) -> Tuple[List[List[int]], np.ndarray]:
+    """Split each text into windows of at most `windowLength` tokens, consecutive windows sharing
+    `stride` tokens. Returns the windows' ids and the index of the text each window belongs to"""
+    if not getattr(tokenizer, 'is_fast', False):
+        raise ValueError("Windowed inference requires a fast tokenizer")
+    encoded = tokenizer(texts, truncation=True, max_length=windowLength, stride=stride, return_overflowing_tokens=True)
+    return encoded['input_ids'], np.asarray(encoded['overflow_to_sample_mapping'], dtype=np.int64)
+
+
+def aggregate_windows(logits: np.ndarray, mapping: np.ndarray, n: int, aggregation: str = 'mean', decay: float = 0.5) -> np.ndarray:
+    """Combine window logits into one row per text. `max` takes the strongest evidence per class,
+    `mean` averages the windows, `last` weights window i of k by decay ** (k - 1 - i) so the
+    latest turns of a conversation count most"""
+    counts = np.bincount(mapping, minlength=n)
+    # Windows of a text are contiguous and in order
+    groups = np.split(logits[np.argsort(mapping, kind='stable')], np.cumsum(counts)[:-1])
+    if aggregation == 'max':
+        return np.stack([group.max(0) for group in groups]).astype(np.float32)
+    if aggregation == 'mean':
+        return np.stack([group.mean(0) for group in groups]).astype(np.float32)
+    if aggregation == 'last':
+        weights = [decay ** np.arange(len(group) - 1, -1, -1, dtype=np.float64) for group in groups]
+        return np.stack([(w[:, None] * group).sum(0) / w.sum() for w, group in zip(weights, groups)]).astype(np.float32)
+    raise ValueError(f"Unknown aggregation {aggregation}, expected max, mean or last")
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+def topk(probs: np.ndarray, id2label: Dict[int, str], k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (labels, probabilities), both of shape (n, k) and sorted by decreasing probability"""
+    k = min(k, probs.shape[-1])
+    indices = np.argsort(-probs, axis=-1, kind='stable')[:, :k]
+    names = np.array([id2label.get(i, str(i)) for i in range(probs.shape[-1])], dtype=object)
+    return names[indices], np.take_along_axis(probs, indices, axis=-1)
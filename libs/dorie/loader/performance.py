@@ -0,0 +1,182 @@
+#  ------------------------------------------------------------------------------------------
+#  Training throughput presets for CPU (and CUDA) boxes
+#  A PerformanceProfile turns on bf16 autocast where the hardware supports it natively,
+#  torch.compile, gradient checkpointing and accumulation, and probes the largest per-device
+#  batch size whose forward/backward pass fits a memory budget (each CPU probe in a fresh process)
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import copy
+import gc
+import logging
+import multiprocessing
+
+import psutil
+import torch
+
+from .telemetry import peak_rss
+
+logger = logging.getLogger(__name__)
+
+
+def bf16_supported(device: str = 'cpu') -> bool:
+    """Native bf16 math: CUDA bf16 support, or AVX512-BF16/AMX on CPU (emulated bf16 is slower than fp32)"""
+    if device == 'cuda':
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    cpu = getattr(torch, 'cpu', None)
+    return any(getattr(cpu, check, lambda: False)() for check in ('_is_avx512_bf16_supported', '_is_amx_tile_supported'))
+
+
+def _probeinputs(model, batchSize: int, seqLength: int, device: str) -> dict:
+    return {
+        'input_ids': torch.randint(5, model.config.vocab_size, (batchSize, seqLength), device=device),
+        'attention_mask': torch.ones(batchSize, seqLength, dtype=torch.long, device=device),
+        'labels': torch.zeros(batchSize, dtype=torch.long, device=device),
+    }
+
+
+def _step(model, inputs: dict, bf16: bool, device: str) -> None:
+    with torch.autocast(device_type=device, dtype=torch.bfloat16, enabled=bf16):
+        loss = model(**inputs).loss
+    loss.backward()
+
+
+def _cudapeakmb(model, batchSize: int, seqLength: int, bf16: bool) -> float:
+    """Peak CUDA memory of one step in MB above the memory allocated before it; the peak counter
+    is reset first, so earlier probes do not leak into this one"""
+    inputs = _probeinputs(model, batchSize, seqLength, 'cuda')
+    try:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        before = torch.cuda.memory_allocated()
+        _step(model, inputs, bf16, 'cuda')
+        torch.cuda.synchronize()
+        return (torch.cuda.max_memory_allocated() - before) / 2 ** 20
+    finally:
+        model.zero_grad(set_to_none=True)
+        del inputs
+        gc.collect()
+        torch.cuda.empty_cache()
+
+
+def _cpupeakmb(model, batchSize: int, seqLength: int, bf16: bool) -> float:
+    """Peak RSS of one step in MB above the RSS before it. Runs in a fresh process per probe: the
+    allocator keeps memory freed by earlier steps, which would hide part of a later step's usage"""
+    model.train()
+    inputs = _probeinputs(model, batchSize, seqLength, 'cpu')
+    gc.collect()
+    before = psutil.Process().memory_info().rss / 2 ** 20
+    with peak_rss(interval=0.002) as memory:
+        _step(model, inputs, bf16, 'cpu')
+    return memory['peakRssMB'] - before
+
+
+def _peakmb(model, batchSize: int, seqLength: int, bf16: bool, device: str) -> float:
+    if device == 'cuda':
+        return _cudapeakmb(model, batchSize, seqLength, bf16)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_cpupeakmb, model, batchSize, seqLength, bf16).result()
+
+
+def probe_batch_size(
+        model,
+        seqLength: int,
+        budgetMB: float,
+        maxBatchSize: int = 256,
+        bf16: bool = False,
+        device: str = 'cpu',
+    ) -> int:
+    """Largest power-of-two batch size, up to `maxBatchSize`, whose forward and backward pass on
+    `seqLength`-token inputs stays within `budgetMB`. The model's weights are left unchanged"""
+    training = model.training
+    model.train()
+    best = 0
+    batchSize = 1
+    try:
+        while batchSize <= maxBatchSize:
+            try:
+                used = _peakmb(model, batchSize, seqLength, bf16, device)
+            except (RuntimeError, MemoryError, BrokenProcessPool) as e:
+                logger.info(f"Batch size {batchSize} failed: {e}")
+                break
+            logger.info(f"Batch size {batchSize}: {used:.0f}MB of {budgetMB:.0f}MB")
+            if used > budgetMB:
+                break
+            best = batchSize
+            batchSize *= 2
+    finally:
+        model.train(training)
+    return max(best, 1)
+
+
+class PerformanceProfile(BaseModel):
+    """Throughput settings applied on top of `ModelTrainer.modelArgs`"""
+    # None enables bf16 autocast only where the hardware supports bf16 natively
+    bf16: Optional[bool] = None
+    torchCompile: bool = False
+    gradientCheckpointing: bool = False
+    gradientAccumulationSteps: int = 1
+    autoBatchSize: bool = False
+    # Memory budget of one training step for the batch size probe; defaults to half the available RAM
+    memoryBudgetMB: Optional[float] = None
+    maxBatchSize: int = 256
+    # Sequence length probed; defaults to the dataset's maxLength
+    probeLength: Optional[int] = None
+
+    def usebf16(self, device: str = 'cpu') -> bool:
+        return bf16_supported(device) if self.bf16 is None else self.bf16
+
+    def budget(self, device: str = 'cpu') -> float:
+        if self.memoryBudgetMB is not None:
+            return self.memoryBudgetMB
+        if device == 'cuda':
+            return torch.cuda.mem_get_info()[0] / 2 ** 20 * 0.9
+        return psutil.virtual_memory().available / 2 ** 20 * 0.5
+
+    def training_arguments(self, modelArgs: dict, model=None, seqLength: int = 128, device: str = 'cpu') -> dict:
+        """Return `modelArgs` with this profile's TrainingArguments applied, probing the batch size if enabled"""
+        device = 'cuda' if device == 'cuda' and torch.cuda.is_available() else 'cpu'
+        bf16 = self.usebf16(device)
+        args = {
+            **modelArgs,
+            'bf16': bf16,
+            'torch_compile': self.torchCompile,
+            'gradient_checkpointing': self.gradientCheckpointing,
+            'gradient_accumulation_steps': self.gradientAccumulationSteps,
+        }
+        if device == 'cpu':
+            args['use_cpu'] = True
+        if self.autoBatchSize and model is not None:
+            probe = copy.deepcopy(model)
+            if self.gradientCheckpointing:
+                probe.gradient_checkpointing_enable()
+            args['per_device_train_batch_size'] = probe_batch_size(
+                probe, self.probeLength or seqLength, self.budget(device), self.maxBatchSize, bf16=bf16, device=device
+            )
+            del probe
+            gc.collect()
+        logger.info(f"Performance profile: bf16={bf16}, torch_compile={self.torchCompile}, gradient_checkpointing={self.gradientCheckpointing}, "
+                    f"gradient_accumulation_steps={self.gradientAccumulationSteps}, per_device_train_batch_size={args.get('per_device_train_batch_size')}")
+        return args
+
+
+def compare_throughput(trainer, profile: PerformanceProfile, steps: int = 20) -> dict:
+    """Train copies of `trainer`'s model for `steps` optimizer steps with the baseline modelArgs and
+    with `profile`, and return samples/sec of each (from the telemetry) and the speedup"""
+    overrides = {'max_steps': steps, 'save_strategy': 'no', 'eval_strategy': 'no', 'report_to': 'none', 'disable_tqdm': True}
+    results = {}
+    for name, performance in (('baseline', None), ('profile', profile)):
+        run = trainer.model_copy(update={'model': copy.deepcopy(trainer.model), 'modelArgs': {**trainer.modelArgs, **overrides}, 'performance': performance})
+        metrics = run.train().metrics
+        results[name] = {
+            'samplesPerSec': metrics['telemetry_samples_per_second'],
+            'tokensPerSec': metrics['telemetry_tokens_per_second'],
+            'stepP50Ms': metrics['telemetry_step_p50_ms'],
+        }
+    results['speedup'] = results['profile']['samplesPerSec'] / results['baseline']['samplesPerSec']
+    logger.info(f"Throughput with the performance profile: {results}")
+    return results
@@ -0,0 +1,143 @@
+#  ------------------------------------------------------------------------------------------
+#  Post-training int8 quantization of exported ONNX classifiers
+#  Dynamic mode quantizes the weights of the MatMul (Linear) layers and activations at run time;
+#  static mode calibrates activation ranges on a sample of a MyDataset split
+#  ------------------------------------------------------------------------------------------
+from pathlib import Path
+from typing import Dict, Iterable, Literal, Optional
+
+import json
+import logging
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .export import ONNX_FILENAME, export_onnx, has_onnx
+from .inference import iter_chunks, pad_ids
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_FILENAME = 'quantization.json'
+
+
+def _calibrationreader(dataset, tokenizer, numSamples: int = 128, batchSize: int = 8):
+    """CalibrationDataReader over the first `numSamples` tokenized rows of a dataset split.
+    Rows stored padded to max_length are stripped to their attention mask and re-padded per batch,
+    so activation ranges come from real tokens rather than pad positions"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            sample = dataset.with_format(None).select(range(min(numSamples, dataset.num_rows)))
+            rows = sample['input_ids']
+            if 'attention_mask' in sample.column_names:
+                rows = [[token for token, keep in zip(ids, mask) if keep] for ids, mask in zip(rows, sample['attention_mask'])]
+            self._batches = (pad_ids(batch, tokenizer.pad_token_id, tokenizer.padding_side) for batch in iter_chunks(rows, batchSize))
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    return _Reader()
+
+
+def quantize(
+        modelDir: str,
+        outputDir: str,
+        mode: Literal['dynamic', 'static'] = 'dynamic',
+        calibration=None,
+        tokenizer=None,
+        numSamples: int = 128,
+        perChannel: bool = False,
+    ) -> str:
+    """Write an int8 copy of the ONNX model in `modelDir` to `outputDir`, with its config,
+    tokenizer and a quantization.json marker, so `Intent(trainer=outputDir, backend='onnx')`
+    serves it directly. `calibration` is a tokenized dataset split, required in static mode."""
+    from onnxruntime.quantization import QuantFormat, QuantType, quant_pre_process, quantize_dynamic, quantize_static
+
+    modelDir, outputDir = Path(modelDir), Path(outputDir)
+    if not has_onnx(modelDir):
+        raise FileNotFoundError(f"No ONNX model in {modelDir}, export one with `ModelTrainer.save(..., onnx=True)`")
+    outputDir.mkdir(parents=True, exist_ok=True)
+    source, target = modelDir / ONNX_FILENAME, outputDir / ONNX_FILENAME
+
+    if mode == 'dynamic':
+        quantize_dynamic(str(source), str(target), weight_type=QuantType.QInt8, per_channel=perChannel, op_types_to_quantize=['MatMul'])
+    elif mode == 'static':
+        assert calibration is not None and tokenizer is not None, "Static quantization needs a calibration split and its tokenizer"
+        with tempfile.TemporaryDirectory() as tmp:
+            # Shape inference and graph cleanup give the calibrator named, typed activations
+            prepared = Path(tmp) / ONNX_FILENAME
+            quant_pre_process(str(source), str(prepared), skip_symbolic_shape=True)
+            quantize_static(
+                str(prepared), str(target), _calibrationreader(calibration, tokenizer, numSamples=numSamples),
+                quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                per_channel=perChannel, op_types_to_quantize=['MatMul'],
+            )
+    else:
+        raise ValueError(f"Unknown quantization mode {mode}")
+
+    for path in modelDir.iterdir():
+        if path.is_file() and path.suffix not in ('.onnx', '.data', '.safetensors', '.bin'):
+            shutil.copy2(path, outputDir / path.name)
+    with open(outputDir / QUANTIZATION_FILENAME, 'w') as f:
+        json.dump({'mode': mode, 'source': str(modelDir), 'perChannel': perChannel, 'calibrationSamples': numSamples if mode == 'static' else 0}, f, indent=4)
+    logger.info(f"Saved {mode} int8 model to {target}")
+    return str(target)
+
+
+def quantize_trainer(trainer, outputDir: str, mode: Literal['dynamic', 'static'] = 'dynamic', numSamples: int = 128, perChannel: bool = False) -> str:
+    """Export a `ModelTrainer`'s model and quantize it, calibrating on its training split"""
+    with tempfile.TemporaryDirectory() as tmp:
+        export_onnx(trainer.model, trainer.tokenizer, tmp)
+        return quantize(
+            tmp, outputDir, mode=mode, calibration=trainer.data['train'] if mode == 'static' else None,
+            tokenizer=trainer.tokenizer, numSamples=numSamples, perChannel=perChannel,
+        )
+
+
+def _latency(backend, texts: list, batchSize: int) -> Dict[str, float]:
+    backend.predict_logits(texts[:batchSize], batchSize=batchSize)  # warm up
+    latencies = []
+    for chunk in iter_chunks(texts, batchSize):
+        start = time.perf_counter()
+        backend.predict_logits(chunk, batchSize=batchSize)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.asarray(latencies) * 1000
+    return {'p50Ms': float(np.percentile(latencies, 50)), 'p99Ms': float(np.percentile(latencies, 99)), 'textsPerSec': len(texts) / (latencies.sum() / 1000)}
+
+
+def _sizemb(path: str) -> float:
+    path = Path(path)
+    files = [path] if path.is_file() else [p for p in path.iterdir() if p.suffix in ('.onnx', '.safetensors', '.bin', '.data')]
+    return sum(p.stat().st_size for p in files) / 2 ** 20
+
+
+def quantization_report(
+        backends: Dict[str, object],
+        texts: Iterable[str],
+        labels: Iterable[int],
+        id2label: Dict[int, str],
+        sizes: Optional[Dict[str, str]] = None,
+        batchSize: int = 32,
+    ) -> dict:
+    """Compare backends, e.g. {'fp32': ..., 'int8': ...}, on labelled texts: overall and
+    per-intent accuracy, agreement with the first backend, latency and on-disk size"""
+    texts, labels = list(texts), np.asarray(list(labels))
+    report, reference = {}, None
+    for name, backend in backends.items():
+        predictions = backend.predict_logits(texts, batchSize=batchSize).argmax(-1)
+        reference = predictions if reference is None else reference
+        report[name] = {
+            'accuracy': float((predictions == labels).mean()),
+            'agreement': float((predictions == reference).mean()),
+            'perIntent': {
+                id2label.get(int(code), str(code)): {'accuracy': float((predictions[labels == code] == code).mean()), 'support': int((labels == code).sum())}
+                for code in np.unique(labels)
+            },
+            **_latency(backend, texts, batchSize),
+        }
+        if sizes and name in sizes:
+            report[name]['sizeMB'] = _sizemb(sizes[name])
+    return report
@@ -0,0 +1,173 @@
+#  ------------------------------------------------------------------------------------------
+#  Process-wide registry of Hugging Face artifacts (tokenizers, configs, models)
+#  Artifacts are loaded once per process and evicted LRU-style under a memory budget
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel, Field, PrivateAttr
+
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry footprint of a tokenizer vocabulary (token string, id and merges)
+_BYTES_PER_VOCAB_ENTRY = 128
+
+
+def _sizeof(artifact: Any) -> int:
+    """Approximate resident size of an artifact in bytes"""
+    if hasattr(artifact, 'parameters') and hasattr(artifact, 'buffers'):
+        return sum(t.numel() * t.element_size() for t in chain(artifact.parameters(), artifact.buffers()))
+    if hasattr(artifact, 'get_vocab'):
+        return len(artifact) * _BYTES_PER_VOCAB_ENTRY
+    return sys.getsizeof(artifact)
+
+
+def _normalize(name_or_path: str, revision: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
+    """Return (location, key revision, hub revision). Local artifacts are versioned by their mtime"""
+    name_or_path = str(name_or_path)
+    if os.path.exists(name_or_path):
+        path = os.path.abspath(name_or_path)
+        return path, revision or str(os.stat(path).st_mtime_ns), None
+    return name_or_path, revision, revision
+
+
+class ArtifactRegistry(BaseModel):
+    """Bounded, thread-safe LRU cache of loaded artifacts keyed by (kind, name/path, padding side, revision)"""
+    maxBytes: int = Field(default_factory=lambda: int(os.environ.get('DORIE_REGISTRY_MAX_BYTES', 4 * 1024 ** 3)))
+    maxEntries: int = Field(default_factory=lambda: int(os.environ.get('DORIE_REGISTRY_MAX_ENTRIES', 32)))
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _sizes: dict = PrivateAttr(default_factory=dict)
+    _loading: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, artifact) and refresh the recency of a hit"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            return False, None
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Return the cached artifact for `key`, calling `load` once on a miss"""
+        found, artifact = self._lookup(key)
+        if found:
+            return artifact
+
+        # Per-key lock: concurrent misses on the same key load once, other keys load in parallel
+        with self._lock:
+            keylock = self._loading.setdefault(key, threading.Lock())
+        with keylock:
+            found, artifact = self._lookup(key)
+            if found:
+                return artifact
+
+            try:
+                artifact = load()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = artifact
+                self._sizes[key] = _sizeof(artifact)
+                self._evict()
+            logger.debug(f"Registry miss for {key}; {len(self._entries)} entries, {self.nbytes} bytes")
+        return artifact
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the budget is met, always keeping the newest entry"""
+        while len(self._entries) > 1 and (self.nbytes > self.maxBytes or len(self._entries) > self.maxEntries):
+            key, _ = self._entries.popitem(last=False)
+            self._sizes.pop(key, None)
+            self.evictions += 1
+            logger.debug(f"Registry evicted {key}")
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or every entry when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._sizes.clear()
+            else:
+                self._entries.pop(key, None)
+                self._sizes.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'maxBytes': self.maxBytes,
+            }
+
+    def get_tokenizer(self, name_or_path: str, padding_side: str = 'right', revision: Optional[str] = None):
+        """Load (once) the tokenizer for a model name or path"""
+        name_or_path, revision, hub_revision = _normalize(name_or_path, revision)
+
+        def load():
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(name_or_path, padding_side=padding_side, revision=hub_revision)
+            if getattr(tokenizer, "pad_token_id") is None:
+                tokenizer.pad_token_id = tokenizer.eos_token_id
+            return tokenizer
+
+        return self.get(('tokenizer', name_or_path, padding_side, revision), load)
+
+    def get_config(self, name_or_path: str, revision: Optional[str] = None, **kwargs):
+        """Load (once) the model config for a model name or path"""
+        name_or_path, revision, hub_revision = _normalize(name_or_path, revision)
+
+        def load():
+            from transformers import AutoConfig
+
+            return AutoConfig.from_pretrained(name_or_path, revision=hub_revision, **kwargs)
+
+        return self.get(('config', name_or_path, None, revision, tuple(sorted(kwargs.items()))), load)
+
+    def get_model(self, name_or_path: str, revision: Optional[str] = None, **kwargs):
+        """Load (once) a sequence classification model in eval mode. The instance is shared, do not train it"""
+        name_or_path, revision, hub_revision = _normalize(name_or_path, revision)
+
+        def load():
+            from transformers import AutoModelForSequenceClassification
+
+            config = self.get_config(name_or_path, revision=hub_revision, **kwargs)
+            model = AutoModelForSequenceClassification.from_pretrained(
+                name_or_path, config=config, revision=hub_revision
+            )
+            return model.eval()
+
+        return self.get(('model', name_or_path, None, revision, tuple(sorted(kwargs.items()))), load)
+
+
+default_registry = ArtifactRegistry()
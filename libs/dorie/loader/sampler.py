@@ -0,0 +1,104 @@
+#  ------------------------------------------------------------------------------------------
+#  Length-grouped batching for dynamically padded datasets
+#  Examples of similar token length are batched together so that DataCollatorWithPadding
+#  pads each batch to a short maximum instead of the tokenizer `max_length`
+#  ------------------------------------------------------------------------------------------
+from typing import Iterator, List, Optional, Sequence
+
+import math
+import numpy as np
+
+
+class LengthGroupedBatchSampler:
+    """Batch sampler that buckets indices by length.
+
+    Training (`shuffle=True`) draws a seeded permutation, cuts it into megabatches of
+    `batch_size * megabatchMult` indices, sorts every megabatch by length and shuffles the
+    resulting batches; the randomness of the epoch is preserved while padding stays low.
+    Evaluation (`shuffle=False`) sorts all indices by length, which is deterministic.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        shuffle: bool = True,
+        seed: int = 42,
+        megabatchMult: int = 50,
+        drop_last: bool = False,
+    ):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.megabatchMult = megabatchMult
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def batches(self, epoch: Optional[int] = None) -> List[List[int]]:
+        """Return the batches of indices for an epoch"""
+        epoch = self.epoch if epoch is None else epoch
+        if not self.shuffle:
+            # Stable sort keeps equal-length examples in dataset order
+            order = np.argsort(-self.lengths, kind='stable')
+            batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        else:
+            rng = np.random.default_rng(self.seed + epoch)
+            order = rng.permutation(len(self.lengths))
+            megabatch = self.batch_size * self.megabatchMult
+            batches = []
+            for start in range(0, len(order), megabatch):
+                chunk = order[start:start + megabatch]
+                chunk = chunk[np.argsort(-self.lengths[chunk], kind='stable')]
+                batches.extend(chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size))
+            # Longest batch first surfaces out-of-memory errors at the first step
+            longest = int(np.argmax([self.lengths[b].max() for b in batches])) if batches else 0
+            rest = [b for i, b in enumerate(batches) if i != longest]
+            batches = batches[longest:longest + 1] + [rest[i] for i in rng.permutation(len(rest))]
+            # Megabatches are whole batches, so at most one batch is short; keep it last, where
+            # distributed batch sharding (and drop_last) expect it
+            short = [b for b in batches if len(b) < self.batch_size]
+            batches = [b for b in batches if len(b) == self.batch_size] + short
+
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches = [b for b in batches if len(b) == self.batch_size]
+        return [b.tolist() for b in batches]
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self.batches()
+        # Advance so the next pass reshuffles even when nobody calls `set_epoch`
+        self.epoch += 1
+        yield from batches
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return math.ceil(len(self.lengths) / self.batch_size)
+
+
+def padding_efficiency(lengths: Sequence[int], batches: Sequence[Sequence[int]], max_length: Optional[int] = None) -> float:
+    """Fraction of the tokens in the padded batches that are real tokens.
+    With `max_length` every batch is padded to that length, as with `padding='max_length'`"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    real = padded = 0
+    for batch in batches:
+        batch_lengths = lengths[np.asarray(batch, dtype=np.int64)]
+        real += int(batch_lengths.sum())
+        padded += len(batch_lengths) * (max_length or int(batch_lengths.max()))
+    return real / padded if padded else 1.0
+
+
+def batching_report(lengths: Sequence[int], batch_size: int, max_length: int, seed: int = 42) -> dict:
+    """Compare tokens-per-batch efficiency of fixed padding, dynamic padding and length grouping"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    sequential = [list(range(i, min(i + batch_size, len(lengths)))) for i in range(0, len(lengths), batch_size)]
+    grouped = LengthGroupedBatchSampler(lengths, batch_size, shuffle=True, seed=seed).batches()
+    return {
+        'meanLength': float(lengths.mean()) if len(lengths) else 0.0,
+        'maxLengthPadding': padding_efficiency(lengths, sequential, max_length=max_length),
+        'dynamicPadding': padding_efficiency(lengths, sequential),
+        'lengthGrouped': padding_efficiency(lengths, grouped),
+    }
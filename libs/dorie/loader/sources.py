@@ -0,0 +1,86 @@
+#  ------------------------------------------------------------------------------------------
+#  Dataset source resolution: local path, local Hub cache snapshot or remote Hub
+#  Resolution is explicit and memoized, so local loads never pay a network attempt and
+#  air-gapped nodes never wait on a Hub timeout
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel
+
+from functools import lru_cache
+from typing import Literal, Optional
+from urllib.parse import urlparse
+
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+_TRUTHY = {'1', 'true', 'yes', 'on'}
+_PROBE_TIMEOUT = float(os.environ.get('DORIE_HUB_PROBE_TIMEOUT', 1.0))
+
+
+class DataSource(BaseModel):
+    """Where a dataset is loaded from"""
+    kind: Literal['local', 'hub-cache', 'hub']
+    location: str
+    revision: Optional[str] = None
+
+
+@lru_cache(maxsize=1)
+def _hubreachable() -> bool:
+    """One short TCP probe of the Hub endpoint per process"""
+    from huggingface_hub import constants
+
+    endpoint = urlparse(constants.ENDPOINT)
+    try:
+        socket.create_connection((endpoint.hostname, endpoint.port or 443), timeout=_PROBE_TIMEOUT).close()
+        return True
+    except OSError:
+        logger.info(f"{constants.ENDPOINT} is unreachable, using offline mode")
+        return False
+
+
+def is_offline() -> bool:
+    """Offline when HF_HUB_OFFLINE/HF_DATASETS_OFFLINE is set or the Hub endpoint is unreachable"""
+    if any(os.environ.get(var, '').lower() in _TRUTHY for var in ('HF_HUB_OFFLINE', 'HF_DATASETS_OFFLINE')):
+        return True
+    return not _hubreachable()
+
+
+def _cachedsnapshot(repo_id: str, revision: Optional[str]) -> Optional[str]:
+    """Return the local snapshot directory of a cached Hub dataset, without network access"""
+    from huggingface_hub import snapshot_download
+    from huggingface_hub.utils import HFValidationError, LocalEntryNotFoundError
+
+    try:
+        return snapshot_download(repo_id, repo_type='dataset', revision=revision, local_files_only=True)
+    except (LocalEntryNotFoundError, HFValidationError):
+        return None
+
+
+@lru_cache(maxsize=128)
+def _resolve(path: str, revision: Optional[str], offline: bool) -> DataSource:
+    # A pinned revision is immutable, so its cached snapshot is as good as the remote
+    pinned = revision is not None and len(revision) == 40
+    if offline or pinned:
+        snapshot = _cachedsnapshot(path, revision)
+        if snapshot:
+            return DataSource(kind='hub-cache', location=snapshot, revision=os.path.basename(snapshot))
+        if offline:
+            raise FileNotFoundError(f"Dataset {path} is neither a local path nor in the Hub cache, and the Hub is offline")
+
+    return DataSource(kind='hub', location=path, revision=revision)
+
+
+def resolve_source(path: str, revision: Optional[str] = None) -> DataSource:
+    """Resolve a dataset path or Hub id to a local path, a cached Hub snapshot or the remote Hub"""
+    path = str(path)
+    if os.path.exists(path):
+        return DataSource(kind='local', location=os.path.abspath(path))
+    return _resolve(path, revision, is_offline())
+
+
+def clear_cache() -> None:
+    """Forget memoized resolutions and the Hub reachability probe"""
+    _resolve.cache_clear()
+    _hubreachable.cache_clear()
@@ -0,0 +1,84 @@
+#  ------------------------------------------------------------------------------------------
+#  Columnar label encoding and seeded, stratified train/test/validation splits
+#  Labels are encoded once over the whole Arrow column and split indices are computed with
+#  NumPy, so both stay vectorized for multi-million row datasets
+#  ------------------------------------------------------------------------------------------
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+Labels = Union[pa.Array, pa.ChunkedArray, Sequence, np.ndarray]
+
+
+def _stringarray(labels: Labels) -> pa.Array:
+    if isinstance(labels, pa.ChunkedArray):
+        labels = labels.combine_chunks()
+    elif not isinstance(labels, pa.Array):
+        labels = pa.array(np.asarray(labels).tolist() if isinstance(labels, np.ndarray) else list(labels))
+    return labels if pa.types.is_string(labels.type) else pc.cast(labels, pa.string())
+
+
+def encode_labels(labels: Labels, labelMap: Optional[Dict[str, int]] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Return (int64 codes, label map). Labels are compared as strings; a derived label map
+    numbers labels in order of first appearance"""
+    labels = _stringarray(labels)
+    if not labelMap:
+        encoded = pc.dictionary_encode(labels)
+        labelMap = {label: i for i, label in enumerate(encoded.dictionary.to_pylist())}
+        return encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64), labelMap
+
+    keys = pa.array(list(labelMap), type=pa.string())
+    positions = pc.index_in(labels, value_set=keys)
+    if positions.null_count:
+        unknown = pc.unique(pc.filter(labels, pc.is_null(positions))).to_pylist()
+        raise KeyError(f"Labels {unknown} are not in the label map")
+    values = np.fromiter(labelMap.values(), dtype=np.int64, count=len(labelMap))
+    return values[positions.to_numpy(zero_copy_only=False)], dict(labelMap)
+
+
+def split_indices(
+        codes: np.ndarray,
+        train: float = 0.8,
+        validation: float = 0.0,
+        seed: int = 42,
+        stratify: bool = True,
+    ) -> Dict[str, np.ndarray]:
+    """Return sorted row indices per split. `train` and `validation` are fractions and the
+    remainder is the test split. Stratified splits keep every class's proportions (rounded per
+    class); otherwise rows are split contiguously in file order."""
+    codes = np.asarray(codes)
+    n = len(codes)
+    test = 1.0 - train - validation
+    assert test >= 0, f"train ({train}) and validation ({validation}) fractions exceed 1"
+
+    if not stratify:
+        train_end = int(train * n)
+        validation_end = train_end + int(validation * n)
+        splits = {'train': np.arange(train_end), 'test': np.arange(validation_end, n)}
+        if validation:
+            splits['validation'] = np.arange(train_end, validation_end)
+        return splits
+
+    # Random order within each class: shuffle, then a stable sort groups rows by class
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n)
+    order = order[np.argsort(codes[order], kind='stable')]
+    grouped = codes[order]
+
+    counts = np.bincount(grouped, minlength=int(grouped.max()) + 1 if n else 0)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n) - starts[grouped]
+    n_test = np.floor(counts * test + 0.5).astype(np.int64)
+    n_validation = np.floor(counts * validation + 0.5).astype(np.int64)
+
+    in_test = rank < n_test[grouped]
+    in_validation = ~in_test & (rank < (n_test + n_validation)[grouped])
+    splits = {
+        'train': np.sort(order[~in_test & ~in_validation]),
+        'test': np.sort(order[in_test]),
+    }
+    if validation:
+        splits['validation'] = np.sort(order[in_validation])
+    return splits
@@ -0,0 +1,174 @@
+#  ------------------------------------------------------------------------------------------
+#  Streaming, chunked readers for CSV and JSONL datasets larger than memory
+#  Files are read in blocks with pyarrow's multi-threaded columnar readers; only one record
+#  batch is resident at a time, so peak memory does not grow with the file size
+#  Splits are assigned row by row in a single pass: contiguous splits seek to their first row,
+#  stratified splits place the k-th row of each label with a seeded low-discrepancy sequence
+#  ------------------------------------------------------------------------------------------
+from datasets import Features, IterableDataset, IterableDatasetDict, Value
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+
+from typing import Dict, Iterator, Sequence, Tuple
+
+import csv
+import io
+import logging
+
+from .splits import encode_labels
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+ENCODED_FEATURES = Features({'text': Value('string'), 'label': Value('int64')})
+_SCHEMA = pa.schema([('text', pa.string()), ('label', pa.string())])
+# Fractional part of the golden ratio, the step of the stratified assignment sequence
+_GOLDEN = (5 ** 0.5 - 1) / 2
+
+
+def iter_csv_batches(path: str, blockSize: int = DEFAULT_BLOCK_SIZE, columns: Sequence[str] = ('text', 'label'), offset: int = 0) -> Iterator[pa.RecordBatch]:
+    """Yield record batches of the requested columns, labels read as strings. A non-zero `offset`
+    is the byte offset of the first data row to read, see `row_offset`"""
+    with open(path, 'rb') as f:
+        read_options = pa_csv.ReadOptions(use_threads=True, block_size=blockSize)
+        if offset:
+            read_options.column_names = next(csv.reader([f.readline().decode('utf-8-sig')]))
+            f.seek(offset)
+        reader = pa_csv.open_csv(
+            f,
+            read_options=read_options,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(columns),
+                column_types={name: _SCHEMA.field(name).type for name in columns},
+            ),
+        )
+        yield from reader
+
+
+def iter_jsonl_batches(path: str, blockSize: int = DEFAULT_BLOCK_SIZE, columns: Sequence[str] = ('text', 'label'), offset: int = 0) -> Iterator[pa.RecordBatch]:
+    """Yield record batches from a JSON lines file, parsing one block of whole lines at a time,
+    from the byte `offset` of a row on"""
+    parse_options = pa_json.ParseOptions(explicit_schema=pa.schema([_SCHEMA.field(name) for name in columns]), unexpected_field_behavior='ignore')
+    read_options = pa_json.ReadOptions(use_threads=True, block_size=blockSize)
+    remainder = b''
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            block = f.read(blockSize)
+            data = remainder + block
+            if not block:
+                remainder, complete = b'', data
+            else:
+                # Carry the trailing partial line over to the next block
+                cut = data.rfind(b'\n') + 1
+                remainder, complete = data[cut:], data[:cut]
+            if complete.strip():
+                yield from pa_json.read_json(io.BytesIO(complete), read_options=read_options, parse_options=parse_options).to_batches()
+            if not block:
+                break
+
+
+READERS = {'csv': iter_csv_batches, 'jsonl': iter_jsonl_batches}
+
+
+def scan(path: str, format: str, blockSize: int = DEFAULT_BLOCK_SIZE) -> Tuple[int, list]:
+    """First streaming pass: return the row count and the labels in order of first appearance"""
+    rows, labels, seen = 0, [], set()
+    for batch in READERS[format](path, blockSize=blockSize, columns=('label',)):
+        rows += batch.num_rows
+        for label in pc.unique(batch.column('label')).to_pylist():
+            if label not in seen:
+                seen.add(label)
+                labels.append(label)
+    logger.info(f"Scanned {rows} rows and {len(labels)} labels from {path}")
+    return rows, labels
+
+
+def row_offset(path: str, format: str, row: int) -> int:
+    """Byte offset of data row `row`. Lines are counted, not parsed: the readers do not allow
+    newlines inside values, so every non-blank line after the CSV header is one row"""
+    with open(path, 'rb') as f:
+        if format == 'csv':
+            f.readline()
+        seen = 0
+        while seen < row:
+            line = f.readline()
+            if not line:
+                break
+            seen += bool(line.strip())
+        return f.tell()
+
+
+def _rows(path: str, format: str, start: int, stop: int, labelMap: dict, blockSize: int):
+    """Yield the examples with row index in [start, stop), reading from the byte offset of `start`"""
+    remaining = stop - start
+    offset = row_offset(path, format, start) if start else 0
+    for batch in READERS[format](path, blockSize=blockSize, offset=offset):
+        if remaining <= 0:
+            break
+        rows = batch.slice(0, remaining)
+        remaining -= rows.num_rows
+        codes, _ = encode_labels(rows.column('label'), labelMap)
+        yield from pa.RecordBatch.from_arrays([rows.column('text'), pa.array(codes)], names=['text', 'label']).to_pylist()
+
+
+def _stratifiedrows(path: str, format: str, name: str, fractions: Dict[str, float], labelMap: dict, seed: int, blockSize: int):
+    """Yield the examples of split `name`. The k-th row of each label is placed by
+    frac(phase + k * golden ratio), with a seeded phase per label: an equidistributed sequence, so
+    every label's split proportions hold to within a few rows at any prefix of the file"""
+    phases = np.random.default_rng(seed).random(len(labelMap))
+    counts = np.zeros(len(labelMap), dtype=np.int64)
+    # Same order of the sides as `split_indices`: test, then validation, then train
+    bounds = np.cumsum([fractions.get('test', 0.0), fractions.get('validation', 0.0)])
+    side = {'test': 0, 'validation': 1, 'train': 2}[name]
+    for batch in READERS[format](path, blockSize=blockSize):
+        codes, _ = encode_labels(batch.column('label'), labelMap)
+        position = np.empty(len(codes), dtype=np.float64)
+        for code in np.unique(codes):
+            rows = np.flatnonzero(codes == code)
+            position[rows] = (phases[code] + (counts[code] + np.arange(len(rows))) * _GOLDEN) % 1.0
+            counts[code] += len(rows)
+        selected = np.flatnonzero(np.searchsorted(bounds, position, side='right') == side)
+        if len(selected):
+            text = batch.column('text').take(pa.array(selected))
+            yield from pa.RecordBatch.from_arrays([text, pa.array(codes[selected])], names=['text', 'label']).to_pylist()
+
+
+def streaming_datasetdict(
+        path: str,
+        format: str,
+        numRows: int,
+        labelMap: dict,
+        split: float = 0.8,
+        validationSplit: float = 0.0,
+        stratify: bool = True,
+        seed: int = 42,
+        blockSize: int = DEFAULT_BLOCK_SIZE,
+    ) -> IterableDatasetDict:
+    """Return lazily read train/test (and validation) splits with encoded labels, split like
+    `split_indices`: seeded per-label proportions, or with `stratify=False` contiguous row ranges"""
+    test = 1.0 - split - validationSplit
+    assert test >= 0, f"train ({split}) and validation ({validationSplit}) fractions exceed 1"
+    names = ['train', 'test'] + (['validation'] if validationSplit else [])
+    if stratify:
+        fractions = {'train': split, 'validation': validationSplit, 'test': test}
+        generator = _stratifiedrows
+        gen_kwargs = {name: {'name': name, 'fractions': fractions, 'seed': seed} for name in names}
+    else:
+        train_end = int(split * numRows)
+        validation_end = train_end + int(validationSplit * numRows)
+        bounds = {'train': (0, train_end), 'validation': (train_end, validation_end), 'test': (validation_end, numRows)}
+        generator = _rows
+        gen_kwargs = {name: {'start': bounds[name][0], 'stop': bounds[name][1]} for name in names}
+    return IterableDatasetDict({
+        name: IterableDataset.from_generator(
+            generator,
+            features=ENCODED_FEATURES,
+            gen_kwargs={'path': str(path), 'format': format, 'labelMap': labelMap, 'blockSize': blockSize, **gen_kwargs[name]},
+        )
+        for name in names
+    })
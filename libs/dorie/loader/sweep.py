@@ -0,0 +1,236 @@
+#  ------------------------------------------------------------------------------------------
+#  Parallel LoRA hyperparameter sweep
+#  The dataset is tokenized once and written as memory-mapped Arrow files that every trial
+#  reopens read-only; trials train in a process pool and report intermediate evaluations to a
+#  shared store, where a median pruner stops trials that fall behind the others
+#  ------------------------------------------------------------------------------------------
+from transformers import TrainerCallback
+from peft import TaskType
+from pydantic import BaseModel
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_DATASET_KEY = 'tokenized'
+
+
+def lora_grid(**space) -> List[dict]:
+    """Every combination of LoRA settings, e.g. `lora_grid(r=[4, 8], lora_alpha=[16, 32])`"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in product(*(space[name] for name in names))]
+
+
+class MedianPruner(BaseModel):
+    """Prune a trial whose evaluation at a step is worse than the median of the other trials'
+    evaluations at that step, once `nStartupTrials` of them have reported it"""
+    nStartupTrials: int = 2
+    # Evaluations before this optimizer step are never pruned
+    nWarmupSteps: int = 0
+
+    def prune(self, reports: Dict[tuple, float], trialId: int, step: int, value: float, greaterIsBetter: bool = True) -> bool:
+        if step < self.nWarmupSteps:
+            return False
+        others = [v for (trial, s), v in reports.items() if s == step and trial != trialId]
+        if len(others) < self.nStartupTrials:
+            return False
+        median = float(np.median(others))
+        return value < median if greaterIsBetter else value > median
+
+
+class PruningCallback(TrainerCallback):
+    """Report each evaluation of `metric` to the shared `reports` and stop training when pruned"""
+
+    def __init__(self, trialId: int, reports, pruner: Optional[MedianPruner], metric: str, greaterIsBetter: bool = True):
+        self.trialId = trialId
+        self.reports = reports
+        self.pruner = pruner
+        self.metric = metric
+        self.greaterIsBetter = greaterIsBetter
+        self.history = []
+        self.pruned = False
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        value = (metrics or {}).get(self.metric)
+        if value is None:
+            return
+        value = float(value)
+        self.history.append((state.global_step, value))
+        self.reports[(self.trialId, state.global_step)] = value
+        if self.pruner is not None and self.pruner.prune(dict(self.reports), self.trialId, state.global_step, value, self.greaterIsBetter):
+            logger.info(f"Pruning trial {self.trialId} at step {state.global_step}: {self.metric}={value:.4f}")
+            self.pruned = True
+            control.should_training_stop = True
+
+    def best(self) -> Optional[float]:
+        values = [value for _, value in self.history]
+        if not values:
+            return None
+        return max(values) if self.greaterIsBetter else min(values)
+
+
+def _runtrial(sweep: 'LoraSweep', trialId: int, loraConfig: dict, dataDir: str, reports) -> dict:
+    """Train one LoRA configuration on the shared tokenized dataset"""
+    import torch
+
+    from .adaptation import return_peft_model
+    from .cache import DatasetCache
+    from .datatokenizer import MyDataset
+    from .transformer import ModelTrainer
+
+    torch.set_num_threads(sweep.threads())
+    trialDir = Path(sweep.outputDir) / f'trial-{trialId:03d}'
+    result = {'trial': trialId, 'params': loraConfig, 'status': 'failed', 'value': None, 'path': None}
+    start = time.perf_counter()
+    try:
+        # Memory-mapped: the trials share the page cache of one copy of the data
+        dataset, meta = DatasetCache(cacheDir=dataDir).load(_DATASET_KEY)
+        dataClass = MyDataset(
+            path=sweep.path, pretrained_model_name=sweep.baseModel, labelMap=meta['labelMap'], numLabels=meta['numLabels'], **sweep.datasetArgs
+        )
+        model = return_peft_model(
+            sweep.baseModel, lora_config={'task_type': TaskType.SEQ_CLS, 'inference_mode': False, **loraConfig}, num_labels=meta['numLabels']
+        )
+        modelArgs = {
+            **sweep.modelArgs,
+            'output_dir': str(trialDir),
+            'eval_strategy': 'steps',
+            'eval_steps': sweep.evalSteps,
+            'save_strategy': 'no',
+            'report_to': 'none',
+            'disable_tqdm': True,
+        }
+        trainer = ModelTrainer(baseModel=sweep.baseModel, modelArgs=modelArgs, device=sweep.device, dataClass=dataClass, data=dataset, model=model)
+        callback = PruningCallback(trialId, reports, sweep.pruner, sweep.metric, sweep.greaterIsBetter)
+        output = trainer.train(callbacks=[callback])
+
+        result.update({'step': output.global_step, 'history': callback.history, 'trainRuntime': output.metrics['train_runtime']})
+        if callback.pruned:
+            result.update({'status': 'pruned', 'value': callback.best()})
+        else:
+            # Completed trials are ranked on a full evaluation of the final weights
+            evaluation = trainer.evaluate()
+            metrics = {f'eval_{name}': evaluation[name] for name in ('loss', 'accuracy', 'macroF1', 'weightedF1')}
+            result.update({'status': 'complete', 'value': metrics.get(sweep.metric, callback.best()), 'metrics': metrics})
+            if sweep.saveAdapters:
+                trainer.save(str(trialDir))
+                result['path'] = str(trialDir)
+    except Exception as e:
+        logger.exception(f"Trial {trialId} with {loraConfig} failed")
+        result['error'] = repr(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+class LoraSweep(BaseModel):
+    """Train `trials` LoRA configurations (see `lora_grid`) of `baseModel` on the data at `path`.
+    `modelArgs` are shared TrainingArguments; every trial evaluates `metric` each `evalSteps`"""
+    baseModel: str
+    path: str
+    trials: List[dict]
+    modelArgs: dict = {}
+    datasetArgs: dict = {}
+    outputDir: str = './sweep'
+    device: str = 'cpu'
+    metric: str = 'eval_accuracy'
+    greaterIsBetter: bool = True
+    evalSteps: int = 50
+    # None disables pruning
+    pruner: Optional[MedianPruner] = MedianPruner()
+    # Parallel trials and intra-op threads per trial; by default the cores are shared evenly
+    maxWorkers: Optional[int] = None
+    threadsPerTrial: Optional[int] = None
+    saveAdapters: bool = True
+
+    def workers(self) -> int:
+        cores = os.cpu_count() or 1
+        return self.maxWorkers or max(1, min(len(self.trials), cores // (self.threadsPerTrial or 1)))
+
+    def threads(self) -> int:
+        return self.threadsPerTrial or max(1, (os.cpu_count() or 1) // self.workers())
+
+    def prepare(self) -> str:
+        """Tokenize the dataset once and return the directory the trials read it from"""
+        from .cache import DatasetCache
+        from .datatokenizer import MyDataset
+
+        dataClass = MyDataset(path=self.path, pretrained_model_name=self.baseModel, **self.datasetArgs)
+        dataset = dataClass.loader()
+        dataDir = str(Path(self.outputDir) / 'data')
+        DatasetCache(cacheDir=dataDir).save(_DATASET_KEY, dataset, meta={'numLabels': dataClass.numLabels, 'labelMap': dataClass.labelMap})
+        return dataDir
+
+    def rank(self, results: List[dict]) -> List[dict]:
+        """Completed trials by value, then pruned trials by their best intermediate value, then failures"""
+        order = {'complete': 0, 'pruned': 1, 'failed': 2}
+        sign = -1 if self.greaterIsBetter else 1
+        ranked = sorted(results, key=lambda r: (order[r['status']], r['value'] is None, sign * (r['value'] or 0.0), r['trial']))
+        return [{'rank': i + 1, **result} for i, result in enumerate(ranked)]
+
+    def run(self) -> dict:
+        """Run every trial and return (and write to `outputDir`/summary.json) the ranked summary"""
+        start = time.perf_counter()
+        Path(self.outputDir).mkdir(parents=True, exist_ok=True)
+        dataDir = self.prepare()
+        logger.info(f"Sweeping {len(self.trials)} LoRA configurations on {self.workers()} workers with {self.threads()} threads each")
+
+        # Spawned workers do not inherit the parent's torch and tokenizer thread pools
+        context = multiprocessing.get_context('spawn')
+        with context.Manager() as manager:
+            reports = manager.dict()
+            with ProcessPoolExecutor(max_workers=self.workers(), mp_context=context) as pool:
+                futures = [pool.submit(_runtrial, self, i, config, dataDir, reports) for i, config in enumerate(self.trials)]
+                results = [future.result() for future in futures]
+
+        wallClock = time.perf_counter() - start
+        trialSeconds = sum(result['seconds'] for result in results)
+        summary = {
+            'metric': self.metric,
+            'greaterIsBetter': self.greaterIsBetter,
+            'wallClockSeconds': wallClock,
+            'trialSeconds': trialSeconds,
+            # Against running the trials one after another, preprocessing included once
+            'parallelSpeedup': trialSeconds / wallClock if wallClock else None,
+            'pruned': sum(result['status'] == 'pruned' for result in results),
+            'trials': self.rank(results),
+        }
+        with open(Path(self.outputDir) / 'summary.json', 'w') as f:
+            json.dump(summary, f, indent=4, default=str)
+        for result in summary['trials']:
+            logger.info(f"#{result['rank']} trial {result['trial']} {result['status']}: {self.metric}={result['value']} {result['params']}")
+        return summary
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Parallel LoRA sweep with median pruning')
+    parser.add_argument('--model', required=True, help='Base model name or path')
+    parser.add_argument('--path', required=True, help='Training data')
+    parser.add_argument('--output', default='./sweep')
+    parser.add_argument('--r', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--alpha', type=int, nargs='+', default=[16, 32])
+    parser.add_argument('--dropout', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--model-args', default='{}', help='JSON TrainingArguments shared by every trial')
+    parser.add_argument('--eval-steps', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-prune', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = LoraSweep(
+        baseModel=args.model, path=args.path, outputDir=args.output, modelArgs=json.loads(args.model_args),
+        trials=lora_grid(r=args.r, lora_alpha=args.alpha, lora_dropout=args.dropout),
+        evalSteps=args.eval_steps, maxWorkers=args.workers, pruner=None if args.no_prune else MedianPruner(),
+    ).run()
+    print(json.dumps({key: value for key, value in summary.items() if key != 'trials'}, indent=4))
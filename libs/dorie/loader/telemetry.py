@@ -0,0 +1,177 @@
+#  ------------------------------------------------------------------------------------------
+#  Training telemetry and a local experiment store
+#  TelemetryCallback records samples/sec, non-padding tokens/sec, data-loader wait against
+#  compute time, step-time percentiles and peak memory, with an optional torch profiler window.
+#  ExperimentStore writes {metrics, params, tags} runs in the layout of docs/mlflow/experiments.json
+#  ------------------------------------------------------------------------------------------
+from transformers import TrainerCallback
+from pydantic import BaseModel
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import getpass
+import json
+import logging
+import subprocess
+import threading
+import time
+import uuid
+
+import numpy as np
+import psutil
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def peak_rss(interval: float = 0.01):
+    """Sample the process RSS on a background thread; yields a dict whose `peakRssMB` is set on exit"""
+    process, result, done = psutil.Process(), {}, threading.Event()
+    peak = [process.memory_info().rss]
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        done.set()
+        thread.join()
+        result['peakRssMB'] = max(peak[0], process.memory_info().rss) / 2 ** 20
+
+
+class TelemetryCallback(TrainerCallback):
+    """Per-step throughput, timing and memory. Batches are reported by `LengthGroupedTrainer`,
+    which times how long each optimizer step waits on the data loader"""
+
+    def __init__(self, profileSteps: Optional[Tuple[int, int]] = None, profileDir: str = './profile'):
+        # Profile optimizer steps in [start, stop) and write a Chrome trace to profileDir
+        self.profileSteps = profileSteps
+        self.profileDir = profileDir
+        self.stepTimes, self.dataWait = [], []
+        self.samples = self.tokens = self.paddedTokens = 0
+        self.peakRss = 0
+        self.profileTable = None
+        self._stepstart = self._trainstart = None
+        self._profiler = None
+
+    def record_batches(self, batches: list, wait: float) -> None:
+        """Count the samples and tokens of one optimizer step's batches and its data-loader wait"""
+        self.dataWait.append(wait)
+        for batch in batches:
+            mask = batch.get('attention_mask')
+            ids = batch['input_ids']
+            self.samples += len(ids)
+            self.paddedTokens += ids.numel()
+            self.tokens += int(mask.sum()) if mask is not None else ids.numel()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._trainstart = time.perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        if self.profileSteps and state.global_step == self.profileSteps[0]:
+            activities = [torch.profiler.ProfilerActivity.CPU] + ([torch.profiler.ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+            self._profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+            self._profiler.__enter__()
+        self._stepstart = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.stepTimes.append(time.perf_counter() - self._stepstart)
+        self.peakRss = max(self.peakRss, psutil.Process().memory_info().rss)
+        if self._profiler is not None and state.global_step >= self.profileSteps[1]:
+            self._stopprofiler()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self._profiler is not None:
+            self._stopprofiler()
+        logger.info(f"Training telemetry: {self.summary()}")
+
+    def _stopprofiler(self) -> None:
+        self._profiler.__exit__(None, None, None)
+        Path(self.profileDir).mkdir(parents=True, exist_ok=True)
+        trace = Path(self.profileDir) / f'trace-steps-{self.profileSteps[0]}-{self.profileSteps[1]}.json'
+        self._profiler.export_chrome_trace(str(trace))
+        self.profileTable = self._profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=20)
+        logger.info(f"Profiled steps {self.profileSteps}, Chrome trace at {trace}:\n{self.profileTable}")
+        self._profiler = None
+
+    def summary(self) -> Dict[str, float]:
+        """Flat metrics, named like the Trainer's, for the experiment store"""
+        if not self.stepTimes:
+            return {}
+        steps = np.asarray(self.stepTimes)
+        wait = float(np.sum(self.dataWait))
+        compute = float(steps.sum())
+        elapsed = wait + compute
+        metrics = {
+            'telemetry_steps': len(steps),
+            'telemetry_samples_per_second': self.samples / elapsed if elapsed else 0.0,
+            'telemetry_tokens_per_second': self.tokens / elapsed if elapsed else 0.0,
+            'telemetry_padding_fraction': 1 - self.tokens / self.paddedTokens if self.paddedTokens else 0.0,
+            'telemetry_data_wait_seconds': wait,
+            'telemetry_compute_seconds': compute,
+            'telemetry_data_wait_fraction': wait / elapsed if elapsed else 0.0,
+            'telemetry_step_p50_ms': float(np.percentile(steps, 50) * 1000),
+            'telemetry_step_p90_ms': float(np.percentile(steps, 90) * 1000),
+            'telemetry_step_p99_ms': float(np.percentile(steps, 99) * 1000),
+            'telemetry_peak_rss_mb': self.peakRss / 2 ** 20,
+        }
+        if torch.cuda.is_available():
+            metrics['telemetry_peak_cuda_mb'] = torch.cuda.max_memory_allocated() / 2 ** 20
+        return metrics
+
+
+def _gitcommit() -> Optional[str]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=Path(__file__).parent, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return commit or None
+
+
+class ExperimentStore(BaseModel):
+    """Local experiment log: one `<root>/<runName>/experiments.json` per run holding metrics,
+    string-valued params and mlflow-style tags, like docs/mlflow/experiments.json"""
+    root: str = './experiments'
+
+    def log_run(self, metrics: dict, params: dict, tags: Optional[dict] = None, runName: Optional[str] = None) -> str:
+        runName = runName or f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        run = {
+            'metrics': {key: float(value) for key, value in metrics.items() if isinstance(value, (int, float))},
+            # mlflow logs every parameter as a string
+            'params': {key: str(value) for key, value in params.items()},
+            'tags': {
+                'mlflow.user': getpass.getuser(),
+                'mlflow.source.git.commit': _gitcommit(),
+                'mlflow.runName': runName,
+                'mlflow.source.name': 'dorie',
+                'mlflow.source.type': 'LOCAL',
+                **(tags or {}),
+            },
+        }
+        path = Path(self.root) / runName / 'experiments.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(run, f, indent=4)
+        logger.info(f"Logged run {runName} to {path}")
+        return str(path)
+
+    def runs(self) -> list:
+        """Run names, oldest first"""
+        root = Path(self.root)
+        if not root.is_dir():
+            return []
+        return sorted((p.parent.name for p in root.glob('*/experiments.json')), key=lambda name: (root / name / 'experiments.json').stat().st_mtime)
+
+    def load(self, runName: str) -> dict:
+        with open(Path(self.root) / runName / 'experiments.json') as f:
+            return json.load(f)
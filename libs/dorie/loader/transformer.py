@@ -1,29 +1,79 @@
 # Loader of hugging face transformer from /config.json
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments, DataCollatorWithPadding
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments, DataCollatorWithPadding, PreTrainedModel
 import peft 
 
-import sys
-import os
+import copy
 import logging
+import time
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-from typing import Any, Optional, Union
+from typing import Any, Callable, Iterable, Optional, Tuple, Union
 from pydantic import BaseModel
 from .datatokenizer import MyDataset, tokenizer as datatokenizer
-from datasets import DatasetDict
+from .registry import default_registry
+from .inference import predict_logits, softmax, topk
+from .export import export_onnx
+from .sampler import LengthGroupedBatchSampler, batching_report
+from .telemetry import ExperimentStore, TelemetryCallback
+from .evaluation import evaluate_dataset
+from .performance import PerformanceProfile
+from .distributed import is_main_process
+from datasets import Dataset, DatasetDict, IterableDatasetDict
 
 import numpy as np
 
 try:
     import torch
+    from torch.utils.data import DataLoader
     TORCH_AVAILABLE = True
 except ImportError:
     import warnings
     warnings.warn("torch not found, please install torch to use this module")
     TORCH_AVAILABLE = False
-filedir = os.path.dirname(__file__)
-sys.path.append(filedir)
+
+
+def _haslengths(dataset) -> bool:
+    return isinstance(dataset, Dataset) and 'length' in dataset.column_names
+
+
+class LengthGroupedTrainer(Trainer):
+    """Trainer that batches dynamically padded examples of similar length together.
+    Datasets without a `length` column fall back to the default Trainer samplers."""
+
+    def _lengthgroupeddataloader(self, dataset: Dataset, batch_size: int, shuffle: bool, description: str) -> DataLoader:
+        batch_sampler = LengthGroupedBatchSampler(
+            np.asarray(dataset['length']), batch_size, shuffle=shuffle, seed=self.args.seed, drop_last=self.args.dataloader_drop_last and shuffle
+        )
+        dataset = self._remove_unused_columns(dataset, description=description)
+        return self.accelerator.prepare(DataLoader(
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        ))
+
+    def get_train_dataloader(self) -> DataLoader:
+        if not _haslengths(self.train_dataset):
+            return super().get_train_dataloader()
+        return self._lengthgroupeddataloader(self.train_dataset, self._train_batch_size, shuffle=True, description='training')
+
+    def get_batch_samples(self, epoch_iterator, num_batches):
+        # Report each optimizer step's batches and data-loader wait to the telemetry callback
+        start = time.perf_counter()
+        batch_samples, num_items_in_batch = super().get_batch_samples(epoch_iterator, num_batches)
+        wait = time.perf_counter() - start
+        for callback in self.callback_handler.callbacks:
+            if isinstance(callback, TelemetryCallback):
+                callback.record_batches(batch_samples, wait)
+        return batch_samples, num_items_in_batch
+
+    def get_eval_dataloader(self, eval_dataset: Optional[Union[str, Dataset]] = None) -> DataLoader:
+        dataset = self.eval_dataset[eval_dataset] if isinstance(eval_dataset, str) else (eval_dataset if eval_dataset is not None else self.eval_dataset)
+        if not _haslengths(dataset):
+            return super().get_eval_dataloader(eval_dataset)
+        return self._lengthgroupeddataloader(dataset, self.args.eval_batch_size, shuffle=False, description='evaluation')
 
 
 class ModelTrainer(BaseModel):
@@ -33,8 +83,10 @@ class ModelTrainer(BaseModel):
     dataClass: MyDataset
     # TODO: Issue with validation of Optional[MyDataset] when an instantiated MyDataset is passed
     data: Optional[Any] = None
-    model: Optional[Union[AutoModelForSequenceClassification,peft.peft_model.PeftModelForSequenceClassification]] = None
+    model: Optional[Union[AutoModelForSequenceClassification,PreTrainedModel,peft.peft_model.PeftModelForSequenceClassification]] = None
     tokenizer: Optional[AutoTokenizer] = None
+    # bf16, torch.compile, gradient checkpointing/accumulation and batch size probing for training
+    performance: Optional[PerformanceProfile] = None
     model_config: Optional[dict] = {'arbitrary_types_allowed': 'true'}
 
     def __init__(
@@ -44,10 +96,11 @@ class ModelTrainer(BaseModel):
         device: str, 
         dataClass: MyDataset, 
         data: DatasetDict = None, 
-        model: Optional[Union[AutoModelForSequenceClassification,peft.peft_model.PeftModelForSequenceClassification]] = None, 
-        tokenizer: Optional[AutoTokenizer] = None
+        model: Optional[Union[AutoModelForSequenceClassification,PreTrainedModel,peft.peft_model.PeftModelForSequenceClassification]] = None, 
+        tokenizer: Optional[AutoTokenizer] = None,
+        performance: Optional[PerformanceProfile] = None,
     ):
-        super().__init__(baseModel=baseModel, modelArgs=modelArgs, device=device, dataClass=dataClass, data=data, model=model, tokenizer=tokenizer)
+        super().__init__(baseModel=baseModel, modelArgs=modelArgs, device=device, dataClass=dataClass, data=data, model=model, tokenizer=tokenizer, performance=performance)
         self.baseModel = baseModel
         self.modelArgs = modelArgs
         self.device = device
@@ -57,17 +110,37 @@ class ModelTrainer(BaseModel):
         if isinstance(model, peft.peft_model.PeftModelForSequenceClassification):
             logger.info("Using PEFT model")
             logger.info(f"Model: {model}")
-        self.model = model or AutoModelForSequenceClassification.from_pretrained(self.baseModel, num_labels=self.dataClass.numLabels)
+        # The registry shares the config; the trained model gets its own copy and its own weights
+        self.model = model or AutoModelForSequenceClassification.from_pretrained(
+            self.baseModel, config=copy.deepcopy(default_registry.get_config(self.baseModel, num_labels=self.dataClass.numLabels))
+        )
         self.tokenizer = tokenizer or datatokenizer(self.baseModel)
 
         # Model configuration
         self._setdevice()
         self._setlabelmap()
 
-    def train(self):
-        training_args = TrainingArguments(**self.modelArgs)
-
-        trainer = Trainer(
+    def train(
+            self,
+            experimentStore: Optional[ExperimentStore] = None,
+            profileSteps: Optional[Tuple[int, int]] = None,
+            profileDir: str = './profile',
+            callbacks: Optional[list] = None,
+            trainerClass: Callable[..., Trainer] = LengthGroupedTrainer,
+        ):
+        """Train and return the TrainOutput, its metrics extended with throughput/memory telemetry.
+        With `experimentStore` the run is logged; `profileSteps=(start, stop)` profiles those steps.
+        `callbacks` are extra TrainerCallbacks, e.g. sweep pruning; `trainerClass` builds the
+        Trainer, e.g. a partial of the distillation trainer"""
+        training_args = TrainingArguments(**self._trainingarguments())
+        if _haslengths(self.data['train']):
+            report = batching_report(
+                np.asarray(self.data['train']['length']), training_args.per_device_train_batch_size, self.dataClass.maxLength, seed=training_args.seed
+            )
+            logger.info(f"Tokens-per-batch efficiency: {report}")
+
+        telemetry = TelemetryCallback(profileSteps=profileSteps, profileDir=profileDir)
+        trainer = trainerClass(
             model=self.model,
             args=training_args,
             train_dataset=self.data['train'],
@@ -75,11 +148,25 @@ class ModelTrainer(BaseModel):
             compute_metrics=lambda pred: {'accuracy': (pred.predictions.argmax(-1) == pred.label_ids).mean()},
             # data collator is used for padding the data to the maximum length of the batch 
             # recommended for performance and memory optimization 
-            data_collator=DataCollatorWithPadding(tokenizer=self.tokenizer, return_tensors='pt')
+            data_collator=DataCollatorWithPadding(tokenizer=self.tokenizer, return_tensors='pt'),
+            callbacks=[telemetry, *(callbacks or [])],
         )
 
-        trainer.train()
+        output = trainer.train()
+        output.metrics.update(telemetry.summary())
+        # The latest evaluation, when the training arguments evaluate during training
+        evaluation = next((log for log in reversed(trainer.state.log_history) if 'eval_loss' in log), {})
+        output.metrics.update({key: value for key, value in evaluation.items() if key.startswith('eval_')})
+        if experimentStore is not None:
+            params = {**self.model.config.to_dict(), **training_args.to_dict()}
+            experimentStore.log_run(output.metrics, params, tags={'dorie.baseModel': self.baseModel})
+        return output
     
+    def _trainingarguments(self) -> dict:
+        if self.performance is None:
+            return self.modelArgs
+        return self.performance.training_arguments(self.modelArgs, model=self.model, seqLength=self.dataClass.maxLength, device=self.device)
+
     def _setlabelmap(self):
         if hasattr(self.dataClass, 'labelMap'):
             self.model.config.label2id = self.dataClass.labelMap
@@ -95,30 +182,44 @@ class ModelTrainer(BaseModel):
 
         self.model.to(set_device)
 
-    def save(self, output_dir):
+    def save(self, output_dir, onnx: bool = False):
+        # In data-parallel training every rank holds the same weights; rank 0 writes them
+        if not is_main_process():
+            return
         self.model.save_pretrained(output_dir)
         self.tokenizer.save_pretrained(output_dir)
+        if isinstance(self.model, peft.PeftModel):
+            # Adapter directories keep the label names of the fine-tuned head
+            self.model.config.save_pretrained(output_dir)
+        if onnx:
+            self.export_onnx(output_dir)
 
-    def predict(self, text):
-        inputs = self.tokenizer(text, return_tensors='pt')
-        if TORCH_AVAILABLE:
-            with torch.no_grad():
-                logits = self.model(**inputs).logits
+    def export_onnx(self, output_dir, opset: int = 17) -> str:
+        """Export the model, with LoRA adapters merged, to `output_dir`/model.onnx"""
+        return export_onnx(self.model, self.tokenizer, output_dir, opset=opset)
 
-            predicted_class = torch.argmax(logits)
-        else:
+    def predict(self, text):
+        """Return the predicted class id; a tensor of ids, one per row, for a list of texts"""
+        inputs = self.tokenizer(text, padding=True, truncation=True, return_tensors='pt').to(self.model.device)
+        with torch.inference_mode():
             logits = self.model(**inputs).logits
-            predicted_class = np.argmax(logits)
-        return predicted_class
-
-    def evaluate(self, data: DatasetDict):
-        trainer = Trainer(
-            model=self.model,
-            args=TrainingArguments(
-                per_device_eval_batch_size=self.batchSize
-            ),
-            eval_dataset=data,
-            compute_metrics=lambda pred: {'accuracy': (pred.predictions.argmax(-1) == pred.label_ids).mean()}
-        )
 
-        return trainer.evaluate()
+        predicted_class = torch.argmax(logits, dim=-1)
+        return predicted_class[0] if isinstance(text, str) else predicted_class
+
+    def predict_proba(self, texts: Iterable[str], batchSize: int = 32, maxLength: Optional[int] = None) -> np.ndarray:
+        """Return class probabilities of shape (n, num_labels) for a list or iterator of texts"""
+        return softmax(predict_logits(self.model, self.tokenizer, texts, batchSize=batchSize, maxLength=maxLength))
+
+    def predict_batch(self, texts: Iterable[str], k: int = 1, batchSize: int = 32, maxLength: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the top-k (labels, probabilities) per text, each of shape (n, k)"""
+        return topk(self.predict_proba(texts, batchSize=batchSize, maxLength=maxLength), self.model.config.id2label, k=k)
+
+    def evaluate(self, data: Optional[Union[Dataset, DatasetDict]] = None, batchSize: Optional[int] = None, **kwargs) -> dict:
+        """Single-pass streaming evaluation of a tokenized split (the test split of a DatasetDict,
+        by default this trainer's) with per-intent metrics, a confusion matrix and top-2 margins.
+        Keyword arguments configure the `StreamingEvaluator`, e.g. marginThreshold"""
+        data = self.data if data is None else data
+        dataset = data['test'] if isinstance(data, (DatasetDict, IterableDatasetDict)) else data
+        batchSize = batchSize or self.modelArgs.get('per_device_eval_batch_size', 64)
+        return evaluate_dataset(self.model, self.tokenizer, dataset, batchSize=batchSize, **kwargs)
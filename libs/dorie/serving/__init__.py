@@ -0,0 +1,12 @@
+"""HTTP serving of DORIE intent models. Run from `libs/` with `python -m dorie.serving.app --model <path>`."""
+from .batcher import BatchMetrics, MicroBatcher
+
+__all__ = ['BatchMetrics', 'MicroBatcher', 'create_app']
+
+
+def __getattr__(name: str):
+    # FastAPI is only imported when the app is requested
+    if name == 'create_app':
+        from .app import create_app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,143 @@
+"""
+FastAPI service around an `Intent` model. Concurrent requests are micro-batched by `MicroBatcher`
+and scored with `Intent.predict_batch` on a worker thread.
+
+    python -m dorie.serving.app --model ./results --max-batch-size 32 --max-wait-ms 5
+    python -m dorie.serving.app --adapter voice=./adapters/voice --adapter chat=./adapters/chat
+"""
+try:
+    from fastapi import FastAPI, HTTPException
+except ImportError as e:
+    raise ImportError("Serving requires FastAPI, install it with `pip install fastapi uvicorn`") from e
+
+from .batcher import MicroBatcher
+from ..intent.cache import PredictionCache
+from ..intent.finetune import Intent
+
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from itertools import groupby
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, model_validator
+
+import asyncio
+
+
+class PredictRequest(BaseModel):
+    """Either a single `text` or a list of `texts`, scored by the served model or a named `adapter`"""
+    text: Optional[str] = None
+    texts: Optional[List[str]] = None
+    adapter: Optional[str] = None
+
+    @model_validator(mode='after')
+    def _onefield(self):
+        if (self.text is None) == (self.texts is None):
+            raise ValueError("Provide exactly one of `text` or `texts`")
+        return self
+
+
+class Prediction(BaseModel):
+    text: str
+    labels: List[str]
+    scores: List[float]
+
+
+class PredictResponse(BaseModel):
+    predictions: List[Prediction]
+
+
+def create_app(
+        intent: Optional[Intent] = None,
+        modelPath: Optional[str] = None,
+        maxBatchSize: int = 32,
+        maxWaitMs: float = 5.0,
+        k: int = 1,
+        cacheSize: int = 0,
+        adapters: Optional[Dict[str, str]] = None,
+    ) -> FastAPI:
+    """Build the service from a loaded `Intent` or a local model directory. A positive
+    `cacheSize` caches predictions of up to that many normalized texts. `adapters` maps names to
+    LoRA adapter directories served over one shared base model, chosen per request"""
+    if intent is None:
+        assert modelPath or adapters, "Provide an Intent, a model path or adapters"
+        intent = Intent(datapath='', trainer=modelPath, inference_text='warmup')
+    for name, path in (adapters or {}).items():
+        intent.add_adapter(name, path)
+    if cacheSize > 0 and intent.cache is None:
+        intent.cache = PredictionCache(maxEntries=cacheSize)
+
+    def predict(items: List[tuple]) -> List[Prediction]:
+        """Score (text, adapter) items, one `predict_batch` call per adapter in the micro-batch"""
+        predictions = [None] * len(items)
+        order = sorted(range(len(items)), key=lambda i: items[i][1] or '')
+        for adapter, rows in groupby(order, key=lambda i: items[i][1]):
+            rows = list(rows)
+            texts = [items[i][0] for i in rows]
+            labels, scores = intent.predict_batch(texts, k=k, batchSize=maxBatchSize, adapter=adapter)
+            for i, text, label_row, score_row in zip(rows, texts, labels, scores):
+                predictions[i] = Prediction(text=text, labels=list(label_row), scores=score_row.tolist())
+        return predictions
+
+    batcher = MicroBatcher(predict=predict, maxBatchSize=maxBatchSize, maxWaitMs=maxWaitMs)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await batcher.start()
+        yield
+        await batcher.stop()
+
+    app = FastAPI(title='DORIE intent classification', lifespan=lifespan)
+    app.state.batcher = batcher
+
+    @app.post('/predict', response_model=PredictResponse)
+    async def predict_endpoint(request: PredictRequest) -> PredictResponse:
+        texts = [request.text] if request.text is not None else request.texts
+        if request.adapter is not None and request.adapter not in intent.adapters:
+            raise HTTPException(status_code=404, detail=f"Unknown adapter {request.adapter}")
+        # Each text is queued on its own, so texts of one request can share batches with others
+        try:
+            predictions = await asyncio.gather(*(batcher.submit((text, request.adapter)) for text in texts))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+        return PredictResponse(predictions=predictions)
+
+    @app.get('/metrics')
+    async def metrics() -> dict:
+        snapshot = {'maxBatchSize': maxBatchSize, 'maxWaitMs': maxWaitMs, **batcher.metrics.snapshot()}
+        if intent.adapters:
+            snapshot['adapters'] = list(intent.adapters)
+        if intent.cache is not None:
+            snapshot['cache'] = intent.cache.stats()
+        return snapshot
+
+    @app.get('/health')
+    async def health() -> dict:
+        return {'status': 'ok'}
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', help='Local model directory')
+    parser.add_argument('--adapter', action='append', default=[], metavar='NAME=PATH', help='LoRA adapter directory served under NAME, repeatable')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--top-k', type=int, default=1)
+    parser.add_argument('--cache-size', type=int, default=0, help='Cache predictions of this many distinct normalized texts')
+    args = parser.parse_args()
+    if not args.model and not args.adapter:
+        parser.error('Provide --model, --adapter or both')
+    adapters = dict(adapter.split('=', 1) for adapter in args.adapter)
+
+    app = create_app(
+        modelPath=args.model, maxBatchSize=args.max_batch_size, maxWaitMs=args.max_wait_ms, k=args.top_k,
+        cacheSize=args.cache_size, adapters=adapters,
+    )
+    # One process: the micro-batcher coalesces requests across all connections of this worker
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
@@ -0,0 +1,148 @@
+#  ------------------------------------------------------------------------------------------
+#  Asynchronous micro-batching of inference requests
+#  Concurrent requests are queued and coalesced into batches of at most `maxBatchSize`, waiting
+#  at most `maxWaitMs` for a batch to fill; the forward pass runs off the event loop
+#  ------------------------------------------------------------------------------------------
+from pydantic import BaseModel, Field, PrivateAttr
+
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class BatchMetrics(BaseModel):
+    """Rolling request latency and batch size statistics"""
+    window: int = 10000
+    requests: int = 0
+    batches: int = 0
+    errors: int = 0
+
+    _latencies: deque = PrivateAttr()
+    _batchsizes: Counter = PrivateAttr(default_factory=Counter)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latencies = deque(maxlen=self.window)
+
+    def record(self, batchsize: int, latencies: List[float]) -> None:
+        self.batches += 1
+        self.requests += batchsize
+        self._batchsizes[batchsize] += 1
+        self._latencies.extend(latencies)
+
+    def snapshot(self) -> dict:
+        latencies = np.asarray(self._latencies, dtype=np.float64) * 1000
+        sizes = np.repeat(list(self._batchsizes), list(self._batchsizes.values())) if self._batchsizes else np.zeros(0)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'errors': self.errors,
+            'latencyMs': {
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'mean': float(latencies.mean()) if len(latencies) else None,
+            },
+            'batchSize': {
+                'mean': float(sizes.mean()) if len(sizes) else None,
+                'max': int(sizes.max()) if len(sizes) else None,
+                'histogram': {str(size): count for size, count in sorted(self._batchsizes.items())},
+            },
+        }
+
+
+class MicroBatcher(BaseModel):
+    """Queue single-item requests and run `predict` on micro-batches of them.
+    `predict` maps a list of inputs to a list of results of the same length."""
+    predict: Callable[[List[Any]], List[Any]]
+    maxBatchSize: int = 32
+    maxWaitMs: float = 5.0
+    metrics: BatchMetrics = Field(default_factory=BatchMetrics)
+
+    _queue: Optional[asyncio.Queue] = PrivateAttr(default=None)
+    _worker: Optional[asyncio.Task] = PrivateAttr(default=None)
+    # One inference thread: batches run back to back and each uses all intra-op threads
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    # The batch whose forward pass is running, failed by `stop` if it never completes
+    _inflight: list = PrivateAttr(default_factory=list)
+
+    async def start(self) -> None:
+        if self._worker is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dorie-batcher')
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            self._executor.shutdown(wait=True)
+            # Nobody will serve the queued or interrupted requests; fail them instead of leaving callers waiting
+            pending = self._inflight
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._fail(pending, RuntimeError("MicroBatcher stopped before the request was served"))
+            self._inflight = []
+
+    async def submit(self, item: Any) -> Any:
+        """Enqueue one input and wait for its result"""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for a first request, then fill the batch until it is full or `maxWaitMs` elapses"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.maxWaitMs / 1000
+        while len(batch) < self.maxBatchSize:
+            # Requests that are already queued join without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _fail(self, batch: list, error: BaseException) -> None:
+        self.metrics.errors += len(batch)
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._inflight = await self._collect()
+            items = [item for item, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.predict, items)
+                if len(results) != len(batch):
+                    raise ValueError(f"predict returned {len(results)} results for a batch of {len(batch)}")
+            except Exception as e:
+                logger.exception(f"Batch of {len(batch)} failed")
+                self._fail(batch, e)
+                self._inflight = []
+                continue
+
+            done = time.perf_counter()
+            for (_, future, enqueued), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._inflight = []
+            self.metrics.record(len(batch), [done - enqueued for _, _, enqueued in batch])
@@ -1,10 +1,6 @@
 """Module defines common test data."""
 
-from pathlib import Path
+# The example data and tiny model are shared with the benchmarks, which must not import tests
+from dorie.benchmarks.fixtures import SENTIMATE_CSV, tiny_roberta
 
-_THIS_DIR = Path(__file__).parent
-
-_EXAMPLES_DIR = _THIS_DIR / "unit_tests" / "examples"
-
-# Paths to test csv files
-SENTIMATE_CSV = _EXAMPLES_DIR / "sentimate-data.csv"
\ No newline at end of file
+__all__ = ['SENTIMATE_CSV', 'tiny_roberta']
@@ -0,0 +1,28 @@
+from dorie.benchmarks.suite import compare, run_suite
+
+import copy
+import json
+
+
+def test_run_suite_writes_json(tmp_path):
+    report = run_suite(rows=(50,), batchSizes=(1, 4), steps=2, output=str(tmp_path))
+    with open(report['path']) as f:
+        saved = json.load(f)
+
+    results = saved['results']['50']
+    assert results['loader']['rows'] == 50 and results['loader']['rowsPerSec'] > 0
+    assert results['tokenization']['examplesPerSec'] > 0
+    assert results['train']['stepMs'] > 0
+    assert set(results['predict']['batchSizes']) == {'1', '4'}
+    assert all(stage['peakRssMB'] > 0 for stage in results.values())
+
+
+def test_compare_flags_regressions():
+    previous = {'results': {'1000': {'loader': {'rows': 1000, 'rowsPerSec': 100.0}, 'train': {'stepMs': 10.0}}}}
+    current = copy.deepcopy(previous)
+    current['results']['1000']['loader']['rowsPerSec'] = 50.0
+    current['results']['1000']['train']['stepMs'] = 10.5
+
+    result = compare(previous, current, tolerance=0.1)
+    assert result['regressions'] == ['1000.loader.rowsPerSec']
+    assert round(result['changes']['1000.train.stepMs'], 2) == 0.05
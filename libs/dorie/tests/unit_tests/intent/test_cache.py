@@ -0,0 +1,58 @@
+from dorie.tests import data
+from dorie.intent import cache as cache_module
+from dorie.intent.cache import PredictionCache, normalize
+from dorie.intent.finetune import Intent
+
+import numpy as np
+
+
+def test_normalize():
+    assert normalize('  Pay my BILL!! ') == normalize('pay my bill') == 'pay my bill'
+    assert normalize("I need\ta quote.") == 'i need a quote'
+    assert normalize('pay my bill') != normalize('pay my bills')
+
+
+def test_cache_lru_ttl_and_versions(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: clock[0])
+    cache = PredictionCache(maxEntries=2, ttlSeconds=10)
+
+    cache.put('Pay my bill', 1, 'billing')
+    cache.put('I need a quote', 1, 'quote')
+    assert cache.get('pay my bill!', 1) == 'billing'
+    assert cache.get('pay my bill', 2) is None  # another model version
+    cache.put('hello', 1, 'greeting')  # evicts the least recently used quote
+    assert cache.get('I need a quote', 1) is None
+    assert cache.evictions == 1
+
+    clock[0] = 11.0
+    assert cache.get('hello', 1) is None
+    assert cache.expirations == 1
+    assert cache.stats()['hitRate'] == cache.hits / (cache.hits + cache.misses) == 0.25
+
+
+def test_intent_cache(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    texts = ['Pay my bill', 'pay my bill!', 'I need a quote', 'PAY MY BILL']
+    uncached = Intent(datapath='', trainer=model_path, inference_text='hi')
+    intent = Intent(datapath='', trainer=model_path, inference_text='hi', cache=PredictionCache())
+
+    backend = intent._inferencebackend()
+    scored = []
+    predict_logits = backend.predict_logits
+    object.__setattr__(backend, 'predict_logits', lambda texts, **kwargs: scored.append(list(texts)) or predict_logits(texts, **kwargs))
+
+    probs = intent.predict_proba(texts)
+    assert scored == [['Pay my bill', 'I need a quote']]
+    np.testing.assert_allclose(probs[[0, 2]], uncached.predict_proba(['Pay my bill', 'I need a quote']), atol=1e-6)
+    assert (probs[1] == probs[0]).all() and (probs[3] == probs[0]).all()
+
+    labels, _ = intent.predict_batch(['pay my bill', 'i need a quote'])
+    assert len(scored) == 1 and labels.shape == (2, 1)
+    assert intent.cache.hits == 2
+
+    # Loading a model drops its cached predictions
+    intent.load(data.tiny_roberta(tmp_path / 'other'))
+    assert len(intent.cache) == 0
+    intent.predict_proba(['Pay my bill'])
+    assert intent.cache.misses == 6
@@ -0,0 +1,52 @@
+"""Cold-start guard: importing the packages must not load the heavy ML dependencies."""
+from pathlib import Path
+
+import subprocess
+import sys
+
+_LIBS_DIR = Path(__file__).parents[4]
+
+HEAVY_MODULES = ('torch', 'transformers', 'datasets', 'peft')
+# Cumulative `python -X importtime` budget per package, in microseconds
+BUDGET_US = {'dorie.loader': 200_000, 'dorie.intent': 500_000}
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=_LIBS_DIR, capture_output=True, text=True, check=True)
+
+
+def test_import_time_budget():
+    result = _run('import dorie.loader, dorie.intent')
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, total, name = line.split('|')
+            if total.strip().isdigit():
+                cumulative[name.strip()] = int(total)
+
+    for module, budget in BUDGET_US.items():
+        assert cumulative[module] < budget, f"{module} took {cumulative[module]}us to import, budget is {budget}us"
+
+
+def test_heavy_modules_are_lazy():
+    result = _run(f'import sys, dorie.loader, dorie.intent; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])')
+    assert result.stdout.strip() == '[]'
+
+
+def test_config_lookup_is_cached_and_isolated():
+    from dorie.intent import config
+
+    first, second = config(), config()
+    assert first == second and first is not second
+    first['baseModel'] = 'changed'
+    assert config()['baseModel'] == 'roberta-base'
+
+
+def test_config_path_override(tmp_path, monkeypatch):
+    from dorie.intent import Config
+
+    path = tmp_path / 'config.json'
+    path.write_text('{"baseModel": "distilroberta-base"}')
+    monkeypatch.setenv('DORIE_CONFIG', str(path))
+    assert Config()()['baseModel'] == 'distilroberta-base'
+    assert Config(configPath=str(path))()['baseModel'] == 'distilroberta-base'
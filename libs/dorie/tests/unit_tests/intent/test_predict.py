@@ -0,0 +1,15 @@
+from dorie.tests import data
+from dorie.intent.finetune import Intent
+
+import pandas
+
+
+def test_intent_predict_batch(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    intent = Intent(datapath=str(data.SENTIMATE_CSV), trainer=model_path, inference_text='Love this product!')
+    texts = pandas.read_csv(data.SENTIMATE_CSV)['text'].tolist()
+
+    labels, probs = intent.predict_batch(texts, k=3)
+    assert labels.shape == probs.shape == (len(texts), 3)
+    assert intent._inference_call(texts[0]) == (texts[0], labels[0, 0])
+    assert intent.predict_proba(texts).shape == (len(texts), 3)
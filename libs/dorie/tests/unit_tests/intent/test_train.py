@@ -0,0 +1,20 @@
+from dorie.tests import data
+from dorie.intent.finetune import Intent
+from dorie.loader import ModelTrainer
+
+
+def test_intent_train_and_save(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    config = {
+        'baseModel': model_path,
+        'device': 'cpu',
+        'modelArgs': {'output_dir': str(tmp_path / 'results'), 'max_steps': 1, 'save_strategy': 'no', 'report_to': 'none'},
+    }
+    intent = Intent(datapath=str(data.SENTIMATE_CSV), config=config)
+    intent.train()
+    assert isinstance(intent.trainer, ModelTrainer)
+    assert intent.predict_batch(['Love this product!'])[0].shape == (1, 1)
+
+    intent.save(tmp_path / 'saved')
+    loaded = Intent(datapath='', trainer=str(tmp_path / 'saved'), inference_text='Love this product!')
+    assert loaded.config['model'].config.label2id == intent.trainer.model.config.label2id
@@ -0,0 +1,30 @@
+from dorie.tests import data
+from dorie.loader import MyDataset, ModelTrainer
+
+import pytest
+
+
+@pytest.fixture
+def make_trainer(tmp_path):
+    """Build a CPU `ModelTrainer` over a tiny random RoBERTa and the sentiment CSV. `modelArgs`
+    extend the training arguments, `dataArgs` the `MyDataset` options, `model` maps the model
+    path to a model, e.g. a LoRA wrapper, and other keywords go to `ModelTrainer`"""
+    model_path = data.tiny_roberta(tmp_path / 'model')
+
+    def make(modelArgs: dict = None, dataArgs: dict = None, model=None, **kwargs) -> ModelTrainer:
+        if model is not None:
+            kwargs['model'] = model(model_path)
+        return ModelTrainer(
+            baseModel=model_path,
+            modelArgs={'output_dir': str(tmp_path / 'results'), **(modelArgs or {})},
+            device='cpu',
+            dataClass=MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, **(dataArgs or {})),
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture
+def trainer(make_trainer):
+    return make_trainer()
@@ -0,0 +1,141 @@
+from dorie.tests import data
+from dorie.loader import MyDataset, ModelTrainer, tokenizer as _tokenizer
+from dorie.loader.adaptation import AdapterPool, is_adapter, load_adapter_model, return_peft_model
+from dorie.loader.inference import predict_logits
+
+import numpy as np
+import pandas
+import peft
+import pytest
+import torch
+
+TEXTS = pandas.read_csv(data.SENTIMATE_CSV)['text'].tolist()
+
+
+def _adapter(base, output_dir, seed):
+    model = return_peft_model(base, num_labels=3)
+    # Non-zero adapter weights, so every adapter changes the logits differently
+    generator = torch.Generator().manual_seed(seed)
+    for name, parameter in model.named_parameters():
+        if 'lora_B' in name or 'classifier' in name:
+            parameter.data = torch.randn(parameter.shape, generator=generator) * 0.5
+    trainer = ModelTrainer(
+        baseModel=base, modelArgs={'output_dir': str(output_dir)}, device='cpu',
+        dataClass=MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=base), model=model,
+    )
+    trainer.save(output_dir)
+    return str(output_dir)
+
+
+@pytest.fixture
+def adapters(tmp_path):
+    base = data.tiny_roberta(tmp_path / 'base')
+    return base, {channel: _adapter(base, tmp_path / channel, seed) for seed, channel in enumerate(('voice', 'chat', 'email'))}
+
+
+def test_merged_adapter_matches_unmerged(adapters):
+    base, paths = adapters
+    assert is_adapter(paths['voice']) and not is_adapter(base)
+    merged = load_adapter_model(paths['voice'], merge=True)
+    unmerged = load_adapter_model(paths['voice'], merge=False)
+    assert not isinstance(merged, peft.PeftModel) and isinstance(unmerged, peft.PeftModel)
+
+    tokenizer = _tokenizer(base)
+    np.testing.assert_allclose(predict_logits(merged, tokenizer, TEXTS), predict_logits(unmerged, tokenizer, TEXTS), atol=1e-5)
+    assert merged.config.id2label[0] == 'Positive'
+
+
+def test_adapter_pool_switches_and_evicts(adapters):
+    base, paths = adapters
+    tokenizer = _tokenizer(base)
+    expected = {channel: predict_logits(load_adapter_model(path), tokenizer, TEXTS) for channel, path in paths.items()}
+
+    pool = AdapterPool(baseModel=base, tokenizer=tokenizer, maxAdapters=2)
+    for channel, path in paths.items():
+        pool.register(channel, path)
+
+    for channel in ('voice', 'chat', 'voice', 'email', 'chat'):
+        np.testing.assert_allclose(pool.backend(channel).predict_logits(TEXTS, batchSize=4), expected[channel], atol=1e-5)
+        assert len(pool.loaded) <= 2
+    # voice and chat, then email evicts chat and chat evicts voice
+    assert pool.loaded == ['email', 'chat']
+    assert pool.version == 4
+    assert pool.id2label('voice')[0] == 'Positive'
+    assert pool.loaded == ['chat', 'voice']
+
+    single = AdapterPool(baseModel=base, tokenizer=tokenizer, maxAdapters=1)
+    for channel in ('voice', 'chat'):
+        single.register(channel, paths[channel])
+        np.testing.assert_allclose(single.predict_logits(channel, TEXTS), expected[channel], atol=1e-5)
+    assert single.loaded == ['chat']
+
+    with pytest.raises(KeyError):
+        pool.predict_logits('sms', TEXTS)
+
+
+def test_intent_loads_merged_adapter(adapters):
+    from dorie.intent.finetune import Intent
+
+    _, paths = adapters
+    intent = Intent(datapath='', trainer=paths['chat'], inference_text='Love this product!')
+    assert not isinstance(intent.config['model'], peft.PeftModel)
+    labels, _ = intent.predict_batch(TEXTS, k=1)
+    assert set(labels[:, 0]) <= {'Positive', 'Negative', 'Neutral'}
+
+
+def test_intent_serves_adapter_pool(adapters):
+    from dorie.intent.finetune import Intent
+    from dorie.loader.inference import softmax
+
+    base, paths = adapters
+    tokenizer = _tokenizer(base)
+    intent = Intent(datapath='', adapters={'voice': paths['voice']}, max_adapters=1)
+    intent.add_adapter('chat', paths['chat'])
+    assert intent.adapters == {'voice': paths['voice'], 'chat': paths['chat']}
+
+    for channel in ('voice', 'chat', 'voice'):
+        expected = softmax(predict_logits(load_adapter_model(paths[channel]), tokenizer, TEXTS))
+        np.testing.assert_allclose(intent.predict_proba(TEXTS, adapter=channel), expected, atol=1e-5)
+    assert intent._pool.loaded == ['voice']
+    labels, _ = intent.predict_batch(TEXTS, adapter='chat')
+    assert set(labels[:, 0]) <= {'Positive', 'Negative', 'Neutral'}
+
+    with pytest.raises(KeyError):
+        intent.predict_proba(TEXTS, adapter='sms')
+
+
+def test_app_routes_requests_to_adapters(adapters):
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+    from dorie.serving.app import create_app
+
+    base, paths = adapters
+    app = create_app(modelPath=base, adapters=paths, maxBatchSize=8, maxWaitMs=5)
+    with TestClient(app) as client:
+        default = client.post('/predict', json={'texts': TEXTS[:4]}).json()['predictions']
+        voice = client.post('/predict', json={'texts': TEXTS[:4], 'adapter': 'voice'}).json()['predictions']
+        email = client.post('/predict', json={'texts': TEXTS[:4], 'adapter': 'email'}).json()['predictions']
+        assert [p['text'] for p in voice] == TEXTS[:4]
+        assert default != voice != email
+        assert client.post('/predict', json={'text': TEXTS[0], 'adapter': 'sms'}).status_code == 404
+        assert client.get('/metrics').json()['adapters'] == ['voice', 'chat', 'email']
+
+
+def test_cache_misses_after_adapter_swap(adapters):
+    from dorie.intent.cache import PredictionCache
+    from dorie.intent.finetune import Intent
+    from dorie.loader.inference import softmax
+
+    base, paths = adapters
+    tokenizer = _tokenizer(base)
+    intent = Intent(datapath='', adapters={'voice': paths['voice']}, cache=PredictionCache(maxEntries=64))
+    first = intent.predict_proba(TEXTS, adapter='voice')
+    np.testing.assert_array_equal(intent.predict_proba(TEXTS, adapter='voice'), first)
+    assert intent.cache.stats()['hits'] == len(TEXTS)
+
+    # Same name, different weights: the answers come from the new adapter, not the cache
+    intent.add_adapter('voice', paths['email'])
+    swapped = intent.predict_proba(TEXTS, adapter='voice')
+    assert intent.cache.stats()['hits'] == len(TEXTS)
+    np.testing.assert_allclose(swapped, softmax(predict_logits(load_adapter_model(paths['email']), tokenizer, TEXTS)), atol=1e-5)
+    assert not np.allclose(swapped, first)
@@ -0,0 +1,58 @@
+from dorie.tests import data
+from dorie.loader import MyDataset
+from dorie.loader.cache import DatasetCache
+
+import shutil
+
+
+def _dataclass(model_path, cache_dir, **kwargs):
+    return MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, cacheDir=str(cache_dir), **kwargs)
+
+
+def test_cache_hit_reopens_arrow_tables(tmp_path, monkeypatch):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    first = _dataclass(model_path, tmp_path / 'cache').loader()
+
+    dataClass = _dataclass(model_path, tmp_path / 'cache')
+    monkeypatch.setattr(MyDataset, '_csvconverter', lambda *_: (_ for _ in ()).throw(AssertionError("cache miss")))
+    second = dataClass.loader()
+
+    assert second['train'].cache_files[0]['filename'].startswith(str(tmp_path / 'cache'))
+    assert second['train']['input_ids'].tolist() == first['train']['input_ids'].tolist()
+    assert dataClass.labelMap and dataClass.numLabels == 3
+    assert dataClass.source.kind == 'local'
+    # The derived label map does not change the key of a repeated call
+    assert dataClass.loader()['test'].num_rows == first['test'].num_rows
+
+
+def test_cache_key_changes_with_settings(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    keys = {
+        _dataclass(model_path, tmp_path / 'cache')._cachekey(),
+        _dataclass(model_path, tmp_path / 'cache', maxLength=64)._cachekey(),
+        _dataclass(model_path, tmp_path / 'cache', split=0.5)._cachekey(),
+        _dataclass(model_path, tmp_path / 'cache', dynamicPadding=True)._cachekey(),
+    }
+    assert len(keys) == 4
+
+    csv = tmp_path / 'data.csv'
+    shutil.copy(data.SENTIMATE_CSV, csv)
+    before = MyDataset(path=str(csv), pretrained_model_name=model_path, cacheDir=str(tmp_path / 'cache'))._cachekey()
+    csv.write_text(csv.read_text() + '"Awful","Negative"\n')
+    after = MyDataset(path=str(csv), pretrained_model_name=model_path, cacheDir=str(tmp_path / 'cache'))._cachekey()
+    assert before != after
+
+
+def test_cache_invalidation_and_eviction(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataset = _dataclass(model_path, tmp_path / 'cache').loader()
+    cache = DatasetCache(cacheDir=str(tmp_path / 'cache'), maxBytes=1)
+
+    cache.save('a', dataset)
+    cache.save('b', dataset)
+    assert [entry.name for _, _, entry in cache.entries()] == ['b']
+
+    cache.invalidate('b')
+    assert cache.load('b') is None
+    cache.invalidate()
+    assert cache.entries() == []
@@ -0,0 +1,78 @@
+from dorie.tests import data
+from dorie.loader.backends import TorchBackend
+from dorie.loader.cascade import CascadeBackend, EmbeddingStage, build_cascade, calibrate, early_encoder
+from dorie.loader.registry import default_registry
+from dorie.intent.finetune import Intent
+
+import math
+
+import numpy as np
+import pandas
+import pytest
+import torch
+
+FRAME = pandas.read_csv(data.SENTIMATE_CSV)
+LABELS = {'Positive': 0, 'Negative': 1, 'Neutral': 2}
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    return data.tiny_roberta(tmp_path / 'model')
+
+
+def test_early_encoder_matches_hidden_states(model_path):
+    model = default_registry.get_model(model_path)
+    tokenizer = default_registry.get_tokenizer(model_path)
+    inputs = tokenizer(FRAME['text'].tolist()[:3], padding=True, return_tensors='pt')
+    with torch.inference_mode():
+        expected = model(**inputs, output_hidden_states=True).hidden_states[1]
+        hidden = early_encoder(model, 1)(**inputs).last_hidden_state
+    assert torch.allclose(hidden, expected, atol=1e-5)
+
+
+def test_calibrate_keeps_accuracy():
+    labels = np.array([0, 1, 2, 0])
+    stageProbs = np.array([[0.9, 0.05, 0.05], [0.2, 0.7, 0.1], [0.5, 0.3, 0.2], [0.4, 0.35, 0.25]])
+    full = np.array([0, 1, 2, 0])
+    threshold, curve = calibrate(stageProbs, full, labels, stageMs=1.0, fullMs=10.0, maxAccuracyDrop=0.0)
+    # The confident first two are right, the third would be wrong: escalate below 0.7
+    assert 0.5 < threshold <= 0.7
+    assert curve[-1]['threshold'] == math.inf and curve[-1]['escalationRate'] == 1.0
+    chosen = next(point for point in curve if point['threshold'] == threshold)
+    assert chosen['accuracy'] == 1.0 and chosen['escalationRate'] == 0.5 and chosen['latencyMsPerText'] == 6.0
+
+
+@pytest.mark.parametrize('head', ['centroid', 'linear'])
+def test_cascade_escalates_uncertain_inputs(model_path, head, tmp_path):
+    model, tokenizer = default_registry.get_model(model_path), default_registry.get_tokenizer(model_path)
+    full = TorchBackend(model=model, tokenizer=tokenizer)
+    texts, labels = FRAME['text'].tolist(), FRAME['label'].map(LABELS).tolist()
+    cascade, report = build_cascade(model, tokenizer, full, (texts, labels), (texts, labels), numLayers=1, head=head)
+
+    assert report['accuracy'] >= report['fullAccuracy'] - 0.01
+    assert [point['escalationRate'] for point in report['curve']] == sorted(point['escalationRate'] for point in report['curve'])
+    logits = cascade.predict_logits(texts)
+    assert logits.shape == (len(texts), 3)
+    assert cascade.escalationRate == pytest.approx(report['escalationRate'])
+
+    cascade.stage.save(tmp_path / 'stage')
+    loaded = EmbeddingStage.load(tmp_path / 'stage', model, tokenizer)
+    assert loaded.threshold == cascade.stage.threshold
+    assert np.allclose(loaded.predict_proba(texts), cascade.stage.predict_proba(texts))
+
+
+def test_intent_cascade(model_path, tmp_path):
+    config = {
+        'baseModel': model_path,
+        'device': 'cpu',
+        'modelArgs': {'output_dir': str(tmp_path / 'results'), 'max_steps': 1, 'save_strategy': 'no', 'report_to': 'none'},
+    }
+    intent = Intent(datapath=str(data.SENTIMATE_CSV), config=config)
+    intent.train()
+    intent.save(tmp_path / 'saved')
+    report = intent.build_cascade(numLayers=1, output_dir=str(tmp_path / 'saved'))
+    assert 0.0 <= report['escalationRate'] <= 1.0
+    assert intent.predict_batch(['Love this product!'])[0].shape == (1, 1)
+
+    loaded = Intent(datapath='', trainer=str(tmp_path / 'saved'), inference_text='Love this product!')
+    assert isinstance(loaded._inferencebackend(), CascadeBackend)
@@ -0,0 +1,69 @@
+from dorie.tests import data
+from dorie.loader import MyDataset, ModelTrainer
+from dorie.loader.distillation import Distiller, distillation_report, soft_labels, student_model, TEACHER_COLUMN
+from dorie.loader.registry import default_registry
+from dorie.intent.finetune import Intent
+
+import numpy as np
+import torch
+
+
+def _teacher(tmp_path) -> str:
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=str(data.SENTIMATE_CSV), pretrained_model_name=model_path)
+    trainer = ModelTrainer(
+        baseModel=model_path, modelArgs={'output_dir': str(tmp_path / 'results'), 'max_steps': 1, 'report_to': 'none'},
+        device='cpu', dataClass=dataClass,
+    )
+    trainer.train()
+    trainer.save(tmp_path / 'teacher')
+    return str(tmp_path / 'teacher')
+
+
+def test_student_model_copies_teacher_layers(tmp_path):
+    teacher = default_registry.get_model(data.tiny_roberta(tmp_path / 'model'))
+    student = student_model(teacher, numLayers=1)
+    assert student.config.num_hidden_layers == 1
+    assert student.config.id2label == teacher.config.id2label
+    # One student layer takes the teacher's last layer
+    assert torch.equal(
+        student.roberta.encoder.layer[0].attention.self.query.weight, teacher.roberta.encoder.layer[1].attention.self.query.weight
+    )
+    assert torch.equal(student.roberta.embeddings.word_embeddings.weight, teacher.roberta.embeddings.word_embeddings.weight)
+
+
+def test_soft_labels_are_cached(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataset = MyDataset(path=str(data.SENTIMATE_CSV), pretrained_model_name=model_path).loader()
+    teacher = default_registry.get_model(model_path)
+    tokenizer = default_registry.get_tokenizer(model_path)
+
+    labelled = soft_labels(dataset, teacher, tokenizer, model_path, cacheDir=str(tmp_path / 'cache'))
+    assert labelled['train'][TEACHER_COLUMN].shape == (dataset['train'].num_rows, 3)
+    with torch.inference_mode():
+        expected = teacher(**tokenizer(dataset['test'].with_format(None)['text'], padding=True, return_tensors='pt')).logits
+    assert np.allclose(labelled['test'][TEACHER_COLUMN].numpy(), expected.numpy(), atol=1e-5)
+
+    cached = soft_labels(dataset, None, tokenizer, model_path, cacheDir=str(tmp_path / 'cache'))
+    assert torch.equal(cached['train'][TEACHER_COLUMN], labelled['train'][TEACHER_COLUMN])
+
+
+def test_distill_to_loadable_student(tmp_path):
+    teacher = _teacher(tmp_path)
+    distiller = Distiller(
+        teacher=teacher, dataClass=MyDataset(path=str(data.SENTIMATE_CSV), dynamicPadding=True),
+        modelArgs={'output_dir': str(tmp_path / 'student-results'), 'max_steps': 2, 'per_device_train_batch_size': 2, 'report_to': 'none'},
+        numLayers=1, cacheDir=str(tmp_path / 'cache'),
+    )
+    student = distiller.distill(str(tmp_path / 'student'))
+    assert student.model.config.num_hidden_layers == 1
+    assert student.model.config.label2id == default_registry.get_model(teacher).config.label2id
+
+    intent = Intent(datapath='', trainer=str(tmp_path / 'student'), inference_text='Love this product!')
+    assert intent.predict_batch(['Love this product!'])[0].shape == (1, 1)
+
+    dataset = MyDataset(path=str(data.SENTIMATE_CSV), pretrained_model_name=teacher).loader(format=None)['test']
+    report = distillation_report(teacher, str(tmp_path / 'student'), dataset['text'], dataset['label'])
+    assert report['speedup'] > 0
+    assert set(report['perIntentDelta']) <= {'Positive', 'Negative', 'Neutral'}
+    assert report['student']['sizeMB'] < report['teacher']['sizeMB']
@@ -0,0 +1,50 @@
+from dorie.tests import data
+from dorie.loader.distributed import DistributedLauncher, build_trainer, is_main_process
+from dorie.loader.registry import default_registry
+
+from functools import partial
+
+import json
+import socket
+
+
+def _freeport() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_is_main_process(monkeypatch):
+    monkeypatch.setenv('RANK', '1')
+    assert not is_main_process()
+    monkeypatch.setenv('RANK', '0')
+    assert is_main_process()
+
+
+def test_launcher_reads_rendezvous_environment_per_instance(monkeypatch):
+    monkeypatch.setenv('NNODES', '2')
+    monkeypatch.setenv('NODE_RANK', '1')
+    monkeypatch.setenv('MASTER_ADDR', '10.0.0.1')
+    monkeypatch.setenv('MASTER_PORT', '29600')
+    launcher = DistributedLauncher()
+    assert (launcher.nnodes, launcher.nodeRank, launcher.masterAddr, launcher.masterPort) == (2, 1, '10.0.0.1', 29600)
+    assert DistributedLauncher(masterPort=29700).masterPort == 29700
+
+
+def test_gloo_data_parallel_training(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    output_dir = str(tmp_path / 'trained')
+    build = partial(
+        build_trainer, baseModel=model_path, path=str(data.SENTIMATE_CSV), datasetArgs={'dynamicPadding': True},
+        modelArgs={'output_dir': output_dir, 'max_steps': 2, 'per_device_train_batch_size': 2, 'save_strategy': 'no', 'report_to': 'none'},
+    )
+    DistributedLauncher(nprocPerNode=2, masterPort=_freeport(), threadsPerProcess=1).launch(build, output_dir)
+
+    with open(tmp_path / 'trained' / 'train_metrics.json') as f:
+        metrics = json.load(f)
+    assert metrics['world_size'] == 2
+    assert metrics['telemetry_steps'] == 2
+    # Same artifacts as single-process training, written once by rank 0
+    model = default_registry.get_model(output_dir)
+    assert model.config.id2label == {0: 'Positive', 1: 'Negative', 2: 'Neutral'}
+    assert (tmp_path / 'trained' / 'tokenizer.json').is_file()
@@ -0,0 +1,95 @@
+from dorie.tests import data
+from dorie.loader import MyDataset, ModelTrainer
+from dorie.loader.backends import TorchBackend
+from dorie.loader.evaluation import StreamingEvaluator, evaluate_texts, iter_tokenized_batches
+
+import numpy as np
+import pytest
+
+
+def test_streaming_metrics_match_batch_metrics():
+    rng = np.random.default_rng(0)
+    logits = rng.normal(size=(1000, 4)) * 2
+    labels = rng.integers(0, 4, size=1000)
+
+    streamed = StreamingEvaluator(numLabels=4, maxExamples=5)
+    for start in range(0, 1000, 64):
+        streamed.update(logits[start:start + 64], labels[start:start + 64])
+    whole = StreamingEvaluator(numLabels=4, maxExamples=5)
+    whole.update(logits, labels)
+    result = streamed.compute()
+    assert result == whole.compute()
+
+    sklearn = pytest.importorskip('sklearn.metrics')
+    predictions = logits.argmax(-1)
+    precision, recall, f1, support = sklearn.precision_recall_fscore_support(labels, predictions, zero_division=0)
+    assert result['confusionMatrix'] == sklearn.confusion_matrix(labels, predictions).tolist()
+    np.testing.assert_allclose([result['perIntent'][str(i)]['f1'] for i in range(4)], f1)
+    np.testing.assert_allclose([result['perIntent'][str(i)]['precision'] for i in range(4)], precision)
+    assert result['macroF1'] == pytest.approx(f1.mean())
+    assert result['accuracy'] == pytest.approx((predictions == labels).mean())
+    assert result['loss'] == pytest.approx(sklearn.log_loss(labels, np.exp(logits) / np.exp(logits).sum(-1, keepdims=True)))
+
+    # Confused predictions: top-2 probability margin under the threshold
+    probs = np.sort(np.exp(logits) / np.exp(logits).sum(-1, keepdims=True), axis=-1)
+    margins = probs[:, -1] - probs[:, -2]
+    assert result['margin']['confusedFraction'] == pytest.approx((margins < 0.1).mean())
+    assert sum(pair['count'] for pair in result['confusedPairs']) == (margins < 0.1).sum()
+    examples = result['confusedExamples']
+    assert len(examples) == 5
+    np.testing.assert_allclose([e['margin'] for e in examples], np.sort(margins)[:5])
+
+
+def test_model_trainer_evaluate(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path)
+    trainer = ModelTrainer(baseModel=model_path, modelArgs={'output_dir': str(tmp_path / 'results')}, device='cpu', dataClass=dataClass)
+
+    result = trainer.evaluate(batchSize=1, marginThreshold=1.0)
+    test = trainer.data['test']
+    assert result['count'] == test.num_rows
+    assert set(result['perIntent']) == set(dataClass.labelMap)
+    # Every prediction is below a threshold of 1.0
+    assert result['margin']['confusedFraction'] == 1.0
+
+    texts = test['text']
+    expected = trainer.predict_proba(texts).argmax(-1)
+    assert result['accuracy'] == pytest.approx((expected == np.asarray(test['label'])).mean())
+
+    backend = TorchBackend(model=trainer.model, tokenizer=trainer.tokenizer)
+    streamed = evaluate_texts(backend, iter(zip(texts, test['label'].tolist())), batchSize=1)
+    assert streamed['confusionMatrix'] == result['confusionMatrix']
+    assert streamed['confusedExamples'][0]['text'] in texts
+
+
+def test_evaluation_batches_are_length_grouped(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, dynamicPadding=True)
+    trainer = ModelTrainer(baseModel=model_path, modelArgs={'output_dir': str(tmp_path / 'results')}, device='cpu', dataClass=dataClass)
+    train = trainer.data['train']
+    padId = trainer.tokenizer.pad_token_id
+
+    ordered = list(iter_tokenized_batches(train, 2, padId))
+    grouped = list(iter_tokenized_batches(train, 2, padId, groupByLength=True))
+    widths = [inputs['input_ids'].shape[1] for inputs, _ in grouped]
+    assert widths == sorted(widths, reverse=True)
+    padding = lambda batches: sum(int((inputs['attention_mask'] == 0).sum()) for inputs, _ in batches)
+    assert padding(grouped) <= padding(ordered)
+    assert sorted(np.concatenate([labels for _, labels in grouped])) == sorted(train['label'].tolist())
+
+    result = trainer.evaluate(data=train, batchSize=2)
+    expected = trainer.predict_proba(train['text']).argmax(-1)
+    assert result['accuracy'] == pytest.approx((expected == np.asarray(train['label'])).mean())
+
+
+def test_model_trainer_evaluate_streaming(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, streaming=True, blockSize=64)
+    trainer = ModelTrainer(baseModel=model_path, modelArgs={'output_dir': str(tmp_path / 'results')}, device='cpu', dataClass=dataClass)
+
+    result = trainer.evaluate(batchSize=1)
+    texts = [row['text'] for row in trainer.data['test']]
+    labels = np.asarray([int(row['label']) for row in trainer.data['test']])
+    assert result['count'] == len(texts) > 0
+    expected = trainer.predict_proba(texts).argmax(-1)
+    assert result['accuracy'] == pytest.approx((expected == labels).mean())
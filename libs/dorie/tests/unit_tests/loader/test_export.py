@@ -0,0 +1,54 @@
+from dorie.tests import data
+from dorie.loader.adaptation import return_peft_model
+
+import numpy as np
+import peft
+import pandas
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('onnx')
+from dorie.loader.backends import OnnxBackend, TorchBackend
+
+TEXTS = pandas.read_csv(data.SENTIMATE_CSV)['text'].tolist()
+
+
+@pytest.mark.parametrize('lora', [False, True])
+def test_onnx_logits_match_torch(tmp_path, make_trainer, lora):
+    model = (lambda path: return_peft_model(path, num_labels=3)) if lora else None
+    trainer = make_trainer(model=model)
+    if lora:
+        # Non-zero adapter weights, so merging changes the logits
+        for name, parameter in trainer.model.named_parameters():
+            if 'lora_B' in name:
+                parameter.data.normal_(std=0.5)
+
+    trainer.save(tmp_path / 'export', onnx=True)
+    onnx = OnnxBackend(modelDir=str(tmp_path / 'export'), tokenizer=trainer.tokenizer, intraOpThreads=1)
+    torch_ = TorchBackend(model=trainer.model, tokenizer=trainer.tokenizer)
+
+    # Batches of different sizes and padded lengths exercise the dynamic axes
+    for batchSize in (1, 4):
+        expected = torch_.predict_logits(TEXTS, batchSize=batchSize)
+        np.testing.assert_allclose(onnx.predict_logits(TEXTS, batchSize=batchSize), expected, atol=1e-4)
+    assert onnx.id2label == trainer.model.config.id2label
+    # Export merges a copy, the trainable adapters are left in place
+    assert isinstance(trainer.model, peft.PeftModel) == lora
+
+
+def test_intent_onnx_backend(tmp_path):
+    from dorie.intent.finetune import Intent
+
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    intent = Intent(datapath=str(data.SENTIMATE_CSV), trainer=model_path, inference_text='Love this product!')
+    intent.export_onnx(model_path)
+
+    onnx_intent = Intent(
+        datapath=str(data.SENTIMATE_CSV), trainer=model_path, inference_text='Love this product!',
+        backend='onnx', backend_options={'graphOptimization': 'basic'},
+    )
+    np.testing.assert_allclose(onnx_intent.predict_proba(TEXTS), intent.predict_proba(TEXTS), atol=1e-5)
+    assert onnx_intent.predict_batch(TEXTS, k=2)[0].tolist() == intent.predict_batch(TEXTS, k=2)[0].tolist()
+
+    with pytest.raises(FileNotFoundError):
+        Intent(datapath='', trainer=str(data.tiny_roberta(tmp_path / 'other')), inference_text='hi', backend='onnx')
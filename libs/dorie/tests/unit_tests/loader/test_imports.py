@@ -3,8 +3,10 @@ from dorie import loader
 EXPECTED_ALL = [
     "MyDataset",
     "ModelTrainer",
-    "tokenizer"
+    "tokenizer",
+    "ArtifactRegistry",
+    "default_registry"
 ]
 
 def test_imports() -> None:
-    assert sorted(loader.__all__) == sorted(EXPECTED_ALL)
\ No newline at end of file
+    assert sorted(loader.__all__) == sorted(EXPECTED_ALL)
@@ -0,0 +1,37 @@
+from dorie.tests import data
+from dorie.loader.inference import iter_chunks, softmax, topk
+
+import numpy as np
+import pandas
+TEXTS = pandas.read_csv(data.SENTIMATE_CSV)['text'].tolist()
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_topk():
+    probs = softmax(np.array([[0.0, 2.0, 1.0], [3.0, 0.0, 1.0]]))
+    labels, top = topk(probs, {0: 'a', 1: 'b', 2: 'c'}, k=2)
+    assert labels.tolist() == [['b', 'c'], ['a', 'c']]
+    assert np.all(top[:, 0] >= top[:, 1])
+
+
+def test_predict_batch_matches_single_predictions(trainer):
+    probs = trainer.predict_proba(iter(TEXTS), batchSize=4)
+    assert probs.shape == (len(TEXTS), 3)
+    assert np.allclose(probs.sum(axis=1), 1.0, atol=1e-5)
+
+    single = [trainer.predict(text).item() for text in TEXTS]
+    assert probs.argmax(axis=1).tolist() == single
+    assert trainer.predict(TEXTS).tolist() == single
+
+    labels, top = trainer.predict_batch(TEXTS, k=2, batchSize=3)
+    id2label = trainer.model.config.id2label
+    assert labels[:, 0].tolist() == [id2label[i] for i in single]
+    assert top.shape == (len(TEXTS), 2)
+
+
+def test_predict_batch_empty(trainer):
+    labels, top = trainer.predict_batch([])
+    assert labels.shape == (0, 1) and top.shape == (0, 1)
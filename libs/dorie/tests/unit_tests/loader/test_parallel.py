@@ -0,0 +1,42 @@
+from dorie.tests import data
+from dorie.loader import MyDataset
+from dorie.benchmarks.tokenization import benchmark_tokenization, scaled_frame
+
+import os
+
+
+def test_parallel_tokenization_matches_serial(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    serial = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path)
+    parallel = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, numProc=2, batchSize=2)
+
+    frame = scaled_frame(data.SENTIMATE_CSV, rows=200)
+    expected = serial.tokenize(serial._frameconverter(frame))
+    actual = parallel.tokenize(parallel._frameconverter(frame))
+    for split in ('train', 'test'):
+        assert actual[split].to_dict() == expected[split].to_dict()
+
+
+def test_benchmark_reports_examples_per_sec(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    results = benchmark_tokenization(data.SENTIMATE_CSV, model_path, workers=(1, 2), rows=50, repeat=1)
+    assert [r['workers'] for r in results] == [1, 2]
+    assert all(r['examples'] == 50 and r['examplesPerSec'] > 0 for r in results)
+
+
+def test_parallelism_env_is_restored(tmp_path, monkeypatch):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    frame = scaled_frame(data.SENTIMATE_CSV, rows=20)
+    parallel = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, numProc=2)
+
+    monkeypatch.delenv('TOKENIZERS_PARALLELISM', raising=False)
+    with parallel._parallelism():
+        assert os.environ['TOKENIZERS_PARALLELISM'] == 'false'
+    parallel.tokenize(parallel._frameconverter(frame))
+    assert 'TOKENIZERS_PARALLELISM' not in os.environ
+
+    # A value set by the user is left alone
+    monkeypatch.setenv('TOKENIZERS_PARALLELISM', 'true')
+    with parallel._parallelism():
+        assert os.environ['TOKENIZERS_PARALLELISM'] == 'true'
+    assert os.environ['TOKENIZERS_PARALLELISM'] == 'true'
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('onnx')
+from dorie.loader.backends import OnnxBackend, TorchBackend
+from dorie.loader.quantization import QUANTIZATION_FILENAME, quantization_report, quantize_trainer
+
+
+@pytest.fixture
+def trainer(make_trainer):
+    return make_trainer(dataArgs={'dynamicPadding': True})
+
+
+@pytest.mark.parametrize('mode', ['dynamic', 'static'])
+def test_quantize_and_report(tmp_path, trainer, mode):
+    output_dir = tmp_path / mode
+    quantize_trainer(trainer, output_dir, mode=mode, numSamples=4)
+    assert json.loads((output_dir / QUANTIZATION_FILENAME).read_text())['mode'] == mode
+
+    test = trainer.data['test']
+    report = quantization_report(
+        {'fp32': TorchBackend(model=trainer.model, tokenizer=trainer.tokenizer), 'int8': OnnxBackend(modelDir=str(output_dir), tokenizer=trainer.tokenizer)},
+        test['text'], test['label'], trainer.model.config.id2label,
+        sizes={'fp32': trainer.baseModel, 'int8': str(output_dir)},
+    )
+    assert set(report) == {'fp32', 'int8'}
+    assert report['fp32']['agreement'] == 1.0
+    assert 0.0 <= report['int8']['agreement'] <= 1.0
+    assert set(report['int8']['perIntent']) <= set(trainer.model.config.id2label.values())
+    assert sum(intent['support'] for intent in report['int8']['perIntent'].values()) == test.num_rows
+    # The tiny test model is embedding-dominated, so only a real checkpoint shrinks ~4x
+    assert report['int8']['sizeMB'] > 0 and report['fp32']['sizeMB'] > 0
+
+
+def test_intent_loads_quantized_model(tmp_path, trainer):
+    from dorie.intent.finetune import Intent
+
+    quantize_trainer(trainer, tmp_path / 'int8')
+    intent = Intent(datapath='', trainer=str(tmp_path / 'int8'), inference_text='Love this product!', backend='onnx')
+    labels, probs = intent.predict_batch(['Love this product!', 'Terrible service.'], k=2)
+    assert labels.shape == probs.shape == (2, 2)
+
+
+def test_calibration_ignores_max_length_padding(make_trainer):
+    from dorie.loader.quantization import _calibrationreader
+
+    padded = make_trainer()
+    train = padded.data['train']
+    reader = _calibrationreader(train, padded.tokenizer, numSamples=4, batchSize=4)
+    feed = reader.get_next()
+    lengths = [sum(mask) for mask in train.with_format(None)['attention_mask'][:4]]
+    assert feed['input_ids'].shape == (4, max(lengths))
+    assert feed['attention_mask'].sum(1).tolist() == lengths
+    assert reader.get_next() is None
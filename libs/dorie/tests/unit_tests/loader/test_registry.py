@@ -0,0 +1,72 @@
+from dorie.tests import data
+from dorie.loader.registry import ArtifactRegistry
+
+import threading
+
+
+def test_registry_hit_miss():
+    registry = ArtifactRegistry()
+    calls = []
+    load = lambda: calls.append(1) or object()
+
+    first = registry.get(('tokenizer', 'a', 'right', None), load)
+    second = registry.get(('tokenizer', 'a', 'right', None), load)
+    assert first is second
+    assert len(calls) == 1
+    assert registry.stats()['hits'] == 1 and registry.stats()['misses'] == 1
+
+
+def test_registry_lru_eviction():
+    registry = ArtifactRegistry(maxEntries=2)
+    for key in ('a', 'b'):
+        registry.get(key, object)
+    registry.get('a', object)  # refresh 'a', 'b' is now least recently used
+    registry.get('c', object)
+    assert 'a' in registry and 'c' in registry
+    assert 'b' not in registry
+    assert registry.evictions == 1
+
+
+def test_registry_limits_read_environment_per_instance(monkeypatch):
+    monkeypatch.setenv('DORIE_REGISTRY_MAX_ENTRIES', '3')
+    monkeypatch.setenv('DORIE_REGISTRY_MAX_BYTES', '1024')
+    registry = ArtifactRegistry()
+    assert registry.maxEntries == 3 and registry.maxBytes == 1024
+    assert ArtifactRegistry(maxEntries=5).maxEntries == 5
+
+
+def test_registry_memory_budget():
+    registry = ArtifactRegistry(maxBytes=1)
+    registry.get('a', lambda: 'x' * 100)
+    registry.get('b', lambda: 'y' * 100)
+    # The newest entry is always kept even when it alone exceeds the budget
+    assert len(registry) == 1 and 'b' in registry
+
+
+def test_registry_concurrent_load_once():
+    registry = ArtifactRegistry()
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def load():
+        calls.append(1)
+        return object()
+
+    def worker():
+        barrier.wait()
+        registry.get('shared', load)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert len(calls) == 1
+
+
+def test_registry_tokenizer_and_model(tmp_path):
+    path = data.tiny_roberta(tmp_path)
+    registry = ArtifactRegistry()
+
+    assert registry.get_tokenizer(path) is registry.get_tokenizer(path)
+    assert registry.get_model(path) is registry.get_model(path)
+    assert not registry.get_model(path).training
+    assert registry.stats()['hits'] >= 2
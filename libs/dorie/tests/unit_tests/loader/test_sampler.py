@@ -0,0 +1,55 @@
+from dorie.tests import data
+from dorie.loader import MyDataset, ModelTrainer
+from dorie.loader.sampler import LengthGroupedBatchSampler, batching_report
+
+
+LENGTHS = [5, 30, 6, 28, 7, 29, 5, 31, 8, 27]
+
+
+def test_batches_cover_every_index_once():
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=3, seed=0)
+    indices = sorted(i for batch in sampler for i in batch)
+    assert indices == list(range(len(LENGTHS)))
+    assert len(sampler) == 4
+
+
+def test_short_batch_is_last():
+    # Batch sharders split full batches across ranks and expect a remainder only at the end
+    for seed in range(5):
+        batches = LengthGroupedBatchSampler(LENGTHS, batch_size=3, seed=seed, megabatchMult=2).batches()
+        assert [len(b) for b in batches] == [3, 3, 3, 1]
+
+
+def test_batches_are_seeded_and_reshuffled():
+    first = LengthGroupedBatchSampler(LENGTHS, batch_size=2, seed=0)
+    second = LengthGroupedBatchSampler(LENGTHS, batch_size=2, seed=0)
+    assert list(first) == list(second)
+    assert first.batches(epoch=0) != first.batches(epoch=1)
+
+
+def test_eval_batches_are_sorted_by_length():
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=5, shuffle=False)
+    assert list(sampler) == [[7, 1, 5, 3, 9], [8, 4, 2, 0, 6]]
+
+
+def test_batching_report():
+    report = batching_report(LENGTHS, batch_size=2, max_length=128)
+    assert report['maxLengthPadding'] < report['dynamicPadding'] < report['lengthGrouped'] <= 1.0
+
+
+def test_dynamic_padding_train(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, dynamicPadding=True)
+    dataset = dataClass.loader()
+    assert 'length' in dataset['train'].column_names
+    assert len(set(len(ids) for ids in dataset['train']['input_ids'])) > 1
+
+    trainer = ModelTrainer(
+        baseModel=model_path,
+        modelArgs={'output_dir': str(tmp_path / 'results'), 'per_device_train_batch_size': 2, 'num_train_epochs': 1, 'report_to': []},
+        device='cpu',
+        dataClass=dataClass,
+        data=dataset
+    )
+    trainer.train()
+    assert trainer.evaluate(dataset['test'])['count'] == dataset['test'].num_rows
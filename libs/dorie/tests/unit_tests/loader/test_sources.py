@@ -0,0 +1,62 @@
+from dorie.tests import data
+from dorie.loader import MyDataset
+from dorie.loader import sources
+
+import huggingface_hub
+import pandas
+import pytest
+
+SHA = 'a' * 40
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setenv('HF_HUB_OFFLINE', '1')
+    sources.clear_cache()
+    yield
+    sources.clear_cache()
+
+
+@pytest.fixture
+def hub_cache(tmp_path, monkeypatch):
+    """A Hub cache holding one dataset snapshot with train/test csv files"""
+    repo = tmp_path / 'hub' / 'datasets--dorie--sentimate'
+    snapshot = repo / 'snapshots' / SHA
+    snapshot.mkdir(parents=True)
+    (repo / 'refs').mkdir()
+    (repo / 'refs' / 'main').write_text(SHA)
+    frame = pandas.read_csv(data.SENTIMATE_CSV)
+    frame.iloc[:7].to_csv(snapshot / 'train.csv', index=False)
+    frame.iloc[7:].to_csv(snapshot / 'test.csv', index=False)
+    monkeypatch.setattr(huggingface_hub.constants, 'HF_HUB_CACHE', str(tmp_path / 'hub'))
+    return snapshot
+
+
+def test_local_path_skips_hub(monkeypatch):
+    monkeypatch.setattr(sources, 'is_offline', lambda: pytest.fail("local paths must not probe the Hub"))
+    source = sources.resolve_source(data.SENTIMATE_CSV)
+    assert source.kind == 'local' and source.location == str(data.SENTIMATE_CSV)
+
+
+def test_offline_uses_cached_snapshot(offline, hub_cache):
+    source = sources.resolve_source('dorie/sentimate')
+    assert source.kind == 'hub-cache'
+    assert source.location == str(hub_cache) and source.revision == SHA
+    assert sources.resolve_source('dorie/sentimate') is source
+
+
+def test_offline_missing_dataset_fails_fast(offline, hub_cache):
+    with pytest.raises(FileNotFoundError):
+        sources.resolve_source('dorie/missing')
+
+
+def test_loader_reports_source(offline, hub_cache, tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path='dorie/sentimate', pretrained_model_name=model_path)
+    dataset = dataClass.loader()
+    assert dataClass.source.kind == 'hub-cache'
+    assert dataset['train'].num_rows == 7 and dataset['test'].num_rows == 2
+
+    local = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path)
+    local.loader()
+    assert local.source.kind == 'local'
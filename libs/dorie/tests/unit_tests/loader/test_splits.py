@@ -0,0 +1,48 @@
+from dorie.tests import data
+from dorie.loader import MyDataset
+from dorie.loader.splits import encode_labels, split_indices
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+
+def test_encode_labels_in_order_of_appearance():
+    codes, labelMap = encode_labels(pa.chunked_array([['b', 'a'], ['b', 'c']]))
+    assert labelMap == {'b': 0, 'a': 1, 'c': 2}
+    assert codes.tolist() == [0, 1, 0, 2]
+
+
+def test_encode_labels_with_label_map():
+    codes, _ = encode_labels([1, 0, 1], labelMap={'0': 5, '1': 7})
+    assert codes.tolist() == [7, 5, 7]
+    with pytest.raises(KeyError):
+        encode_labels(['x'], labelMap={'y': 0})
+
+
+def test_stratified_split_is_seeded_and_proportional():
+    codes = np.repeat(np.arange(4), [1000, 500, 300, 200])
+    splits = split_indices(codes, train=0.7, validation=0.1, seed=0)
+    again = split_indices(codes, train=0.7, validation=0.1, seed=0)
+    assert all(np.array_equal(splits[k], again[k]) for k in splits)
+
+    everything = np.concatenate(list(splits.values()))
+    assert np.array_equal(np.sort(everything), np.arange(len(codes)))
+    for name, fraction in (('train', 0.7), ('validation', 0.1), ('test', 0.2)):
+        counts = np.bincount(codes[splits[name]], minlength=4)
+        assert np.allclose(counts / np.bincount(codes), fraction, atol=0.01)
+
+
+def test_contiguous_split():
+    splits = split_indices(np.zeros(10, dtype=np.int64), train=0.8, stratify=False)
+    assert splits['train'].tolist() == list(range(8)) and splits['test'].tolist() == [8, 9]
+
+
+def test_loader_encodes_labels_once(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    dataClass = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, split=0.6, validationSplit=0.2)
+    dataset = dataClass.loader()
+    assert dataClass.labelMap == {'Positive': 0, 'Negative': 1, 'Neutral': 2}
+    assert set(dataset) == {'train', 'validation', 'test'}
+    assert sum(split.num_rows for split in dataset.values()) == 9
+    assert set(dataset['test']['label'].tolist()) == {0, 1}
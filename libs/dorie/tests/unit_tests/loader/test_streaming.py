@@ -0,0 +1,84 @@
+from dorie.tests import data
+from dorie.loader import MyDataset
+from dorie.loader.streaming import iter_csv_batches, iter_jsonl_batches, row_offset, scan, streaming_datasetdict
+
+from datasets import IterableDatasetDict
+
+import json
+import numpy as np
+import pandas
+
+
+def _jsonl(tmp_path):
+    frame = pandas.read_csv(data.SENTIMATE_CSV)
+    path = tmp_path / 'sentimate-data.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in frame.to_dict('records')))
+    return path
+
+
+def test_chunked_readers_match_pandas(tmp_path):
+    frame = pandas.read_csv(data.SENTIMATE_CSV)
+    csv_rows = [row for batch in iter_csv_batches(data.SENTIMATE_CSV, blockSize=64) for row in batch.to_pylist()]
+    jsonl_rows = [row for batch in iter_jsonl_batches(_jsonl(tmp_path), blockSize=64) for row in batch.to_pylist()]
+    assert csv_rows == jsonl_rows == frame.to_dict('records')
+
+
+def test_scan_labels_in_order_of_appearance():
+    rows, labels = scan(data.SENTIMATE_CSV, 'csv', blockSize=64)
+    frame = pandas.read_csv(data.SENTIMATE_CSV)
+    assert rows == len(frame)
+    assert labels == frame['label'].unique().tolist()
+
+
+def test_row_offset_skips_to_row(tmp_path):
+    frame = pandas.read_csv(data.SENTIMATE_CSV)
+    for path, format in ((data.SENTIMATE_CSV, 'csv'), (_jsonl(tmp_path), 'jsonl')):
+        reader = iter_csv_batches if format == 'csv' else iter_jsonl_batches
+        rows = [row for batch in reader(path, blockSize=64, offset=row_offset(path, format, 6)) for row in batch.to_pylist()]
+        assert rows == frame.to_dict('records')[6:]
+
+
+def test_streaming_loader_matches_in_memory_split(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    for path in (_jsonl(tmp_path), data.SENTIMATE_CSV):
+        streamed = MyDataset(path=path, pretrained_model_name=model_path, streaming=True, blockSize=64, stratify=False, split=0.6, validationSplit=0.2)
+        dataset = streamed.loader()
+        assert isinstance(dataset, IterableDatasetDict)
+
+        reference = MyDataset(path=data.SENTIMATE_CSV, pretrained_model_name=model_path, stratify=False, split=0.6, validationSplit=0.2)
+        in_memory = reference.loader()
+        assert streamed.labelMap == reference.labelMap
+        assert streamed.numLabels == reference.numLabels == 3
+        assert set(dataset) == set(in_memory) == {'train', 'validation', 'test'}
+        for split in dataset:
+            labels = [example['label'].item() for example in dataset[split]]
+            assert labels == in_memory[split]['label'].tolist()
+
+
+def _large(tmp_path, rows=3000):
+    rng = np.random.default_rng(0)
+    labels = rng.choice(['payPrem', 'addDriver', 'fileClaim'], size=rows, p=[0.6, 0.3, 0.1])
+    path = tmp_path / 'large.csv'
+    pandas.DataFrame({'text': [f'utterance {i}' for i in range(rows)], 'label': labels}).to_csv(path, index=False)
+    return path, labels
+
+
+def test_streaming_split_is_stratified_and_seeded(tmp_path):
+    path, labels = _large(tmp_path)
+    labelMap = {label: i for i, label in enumerate(('payPrem', 'addDriver', 'fileClaim'))}
+
+    def splits(seed):
+        dataset = streaming_datasetdict(path, 'csv', len(labels), labelMap, split=0.7, validationSplit=0.1, seed=seed, blockSize=4096)
+        return {name: [example['text'] for example in split] for name, split in dataset.items()}
+
+    first = splits(0)
+    assert splits(0) == first
+    assert splits(1) != first
+    texts = [text for split in first.values() for text in split]
+    assert sorted(texts) == sorted(f'utterance {i}' for i in range(len(labels)))
+
+    codes = pandas.Series(labels, index=[f'utterance {i}' for i in range(len(labels))])
+    for name, fraction in (('train', 0.7), ('validation', 0.1), ('test', 0.2)):
+        counts = codes[first[name]].value_counts()
+        for label, total in codes.value_counts().items():
+            assert abs(counts[label] - fraction * total) <= 3
@@ -0,0 +1,48 @@
+from dorie.tests import data
+from dorie.loader.sweep import LoraSweep, MedianPruner, lora_grid
+
+import json
+
+
+def test_lora_grid():
+    grid = lora_grid(r=[4, 8], lora_alpha=[16, 32])
+    assert grid == [
+        {'r': 4, 'lora_alpha': 16}, {'r': 4, 'lora_alpha': 32},
+        {'r': 8, 'lora_alpha': 16}, {'r': 8, 'lora_alpha': 32},
+    ]
+
+
+def test_median_pruner():
+    pruner = MedianPruner(nStartupTrials=2, nWarmupSteps=2)
+    reports = {(0, 2): 0.8, (1, 2): 0.6, (2, 2): 0.4, (0, 1): 0.9, (1, 1): 0.9}
+    assert pruner.prune(reports, trialId=2, step=2, value=0.4)
+    assert not pruner.prune(reports, trialId=0, step=2, value=0.8)
+    # Within the warmup and with too few other trials at the step
+    assert not pruner.prune(reports, trialId=2, step=1, value=0.1)
+    assert not pruner.prune(reports, trialId=2, step=3, value=0.1)
+    # Lower is better for a loss
+    assert pruner.prune(reports, trialId=0, step=2, value=0.8, greaterIsBetter=False)
+
+
+def test_sweep_ranks_trials(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    sweep = LoraSweep(
+        baseModel=model_path,
+        path=str(data.SENTIMATE_CSV),
+        trials=lora_grid(r=[2, 4], lora_alpha=[8]),
+        modelArgs={'max_steps': 2, 'per_device_train_batch_size': 2},
+        datasetArgs={'dynamicPadding': True},
+        outputDir=str(tmp_path / 'sweep'),
+        evalSteps=1,
+        maxWorkers=2,
+        threadsPerTrial=1,
+    )
+    summary = sweep.run()
+
+    assert [trial['rank'] for trial in summary['trials']] == [1, 2]
+    assert {trial['status'] for trial in summary['trials']} <= {'complete', 'pruned'}
+    assert sorted(trial['params']['r'] for trial in summary['trials']) == [2, 4]
+    complete = [trial for trial in summary['trials'] if trial['status'] == 'complete']
+    assert complete and all((tmp_path / 'sweep' / f"trial-{trial['trial']:03d}" / 'adapter_config.json').is_file() for trial in complete)
+    with open(tmp_path / 'sweep' / 'summary.json') as f:
+        assert json.load(f)['metric'] == 'eval_accuracy'
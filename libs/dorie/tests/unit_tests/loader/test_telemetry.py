@@ -0,0 +1,38 @@
+from dorie.tests import data
+from dorie.loader.telemetry import ExperimentStore
+
+import json
+from pathlib import Path
+
+REFERENCE = Path(data.__file__).parents[3] / 'docs' / 'mlflow' / 'experiments.json'
+
+
+def test_train_telemetry_and_experiment_store(tmp_path, make_trainer):
+    trainer = make_trainer(
+        modelArgs={
+            'max_steps': 4, 'per_device_train_batch_size': 2,
+            'eval_strategy': 'steps', 'eval_steps': 2, 'save_strategy': 'no', 'report_to': 'none',
+        },
+        dataArgs={'dynamicPadding': True},
+    )
+    store = ExperimentStore(root=str(tmp_path / 'experiments'))
+    output = trainer.train(experimentStore=store, profileSteps=(1, 2), profileDir=str(tmp_path / 'profile'))
+
+    metrics = output.metrics
+    assert metrics['telemetry_steps'] == 4
+    assert metrics['telemetry_samples_per_second'] > 0 and metrics['telemetry_tokens_per_second'] > 0
+    assert 0 <= metrics['telemetry_padding_fraction'] < 1
+    assert 0 <= metrics['telemetry_data_wait_fraction'] < 1
+    assert metrics['telemetry_step_p50_ms'] <= metrics['telemetry_step_p99_ms']
+    assert metrics['telemetry_peak_rss_mb'] > 0
+    assert 'eval_loss' in metrics
+    assert list((tmp_path / 'profile').glob('trace-steps-1-2.json'))
+
+    [run] = store.runs()
+    logged = store.load(run)
+    with open(REFERENCE) as f:
+        reference = json.load(f)
+    assert logged.keys() == reference.keys()
+    assert set(reference['tags']) <= set(logged['tags'])
+    assert logged['params']['per_device_train_batch_size'] == '2'
+    assert logged['metrics']['telemetry_steps'] == 4.0
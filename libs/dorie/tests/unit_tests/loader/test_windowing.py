@@ -0,0 +1,61 @@
+from dorie.tests import data
+from dorie.loader.backends import TorchBackend, WindowedBackend
+from dorie.loader.inference import aggregate_windows, predict_logits, window_ids
+from dorie.loader.registry import default_registry
+from dorie.intent.finetune import Intent
+
+import numpy as np
+import pandas
+import pytest
+
+TEXTS = pandas.read_csv(data.SENTIMATE_CSV)['text'].tolist()
+
+
+@pytest.fixture
+def backend(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    return TorchBackend(model=default_registry.get_model(model_path), tokenizer=default_registry.get_tokenizer(model_path))
+
+
+def test_aggregate_windows():
+    logits = np.array([[1.0, 0.0], [0.0, 3.0], [2.0, 2.0], [4.0, 0.0]])
+    mapping = np.array([0, 0, 1, 2])
+    assert aggregate_windows(logits, mapping, 3, 'max').tolist() == [[1.0, 3.0], [2.0, 2.0], [4.0, 0.0]]
+    assert aggregate_windows(logits, mapping, 3, 'mean').tolist() == [[0.5, 1.5], [2.0, 2.0], [4.0, 0.0]]
+    # Last window weighted 1, the one before 0.5
+    assert np.allclose(aggregate_windows(logits, mapping, 3, 'last', decay=0.5)[0], [1 / 3, 2.0])
+    with pytest.raises(ValueError):
+        aggregate_windows(logits, mapping, 3, 'median')
+
+
+def test_window_ids_overlap(backend):
+    conversation = ' '.join(TEXTS * 4)
+    ids, mapping = window_ids(backend.tokenizer, [TEXTS[0], conversation], windowLength=32, stride=8)
+    assert mapping[0] == 0 and (mapping[1:] == 1).all() and len(ids) > 3
+    assert all(len(row) <= 32 for row in ids)
+    # Consecutive windows share `stride` content tokens (windows are wrapped in <s> ... </s>)
+    assert ids[1][-9:-1] == ids[2][1:9]
+
+
+def test_short_texts_match_plain_inference(backend):
+    windowed = WindowedBackend(backend=backend, windowLength=128, stride=32)
+    assert np.allclose(windowed.predict_logits(TEXTS, batchSize=4), predict_logits(backend.model, backend.tokenizer, TEXTS, batchSize=4), atol=1e-5)
+
+
+def test_long_conversations_are_windowed(backend):
+    conversation = ' '.join(TEXTS * 6)
+    ids, _ = window_ids(backend.tokenizer, [conversation], windowLength=32, stride=8)
+    windows = backend.tokenizer.batch_decode(ids, skip_special_tokens=True)
+    expected = predict_logits(backend.model, backend.tokenizer, windows, batchSize=len(windows)).mean(0)
+
+    windowed = WindowedBackend(backend=backend, windowLength=32, stride=8, aggregation='mean')
+    logits = windowed.predict_logits([TEXTS[0], conversation, TEXTS[1]], batchSize=2)
+    assert logits.shape == (3, 3)
+    assert np.allclose(logits[1], expected, atol=1e-4)
+
+
+def test_intent_window_options(tmp_path):
+    model_path = data.tiny_roberta(tmp_path / 'model')
+    intent = Intent(datapath='', trainer=model_path, inference_text='Love this product!', window_options={'windowLength': 32, 'stride': 8, 'aggregation': 'last'})
+    labels, probs = intent.predict_batch([' '.join(TEXTS * 6)])
+    assert labels.shape == (1, 1) and 0 < probs[0, 0] <= 1
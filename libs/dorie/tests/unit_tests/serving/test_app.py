@@ -0,0 +1,28 @@
+from dorie.tests import data
+
+import pytest
+
+pytest.importorskip('fastapi')
+from fastapi.testclient import TestClient
+from dorie.serving.app import create_app
+
+
+def test_app_predict_and_metrics(tmp_path):
+    app = create_app(modelPath=data.tiny_roberta(tmp_path / 'model'), maxBatchSize=8, maxWaitMs=5, k=2, cacheSize=16)
+    with TestClient(app) as client:
+        assert client.get('/health').json() == {'status': 'ok'}
+
+        single = client.post('/predict', json={'text': 'Love this product!'}).json()['predictions']
+        assert len(single) == 1 and len(single[0]['labels']) == 2
+
+        texts = ['Love this product!', 'Terrible service.', 'It was fine.']
+        many = client.post('/predict', json={'texts': texts}).json()['predictions']
+        assert [p['text'] for p in many] == texts
+        assert many[0]['labels'] == single[0]['labels']
+
+        assert client.post('/predict', json={}).status_code == 422
+
+        metrics = client.get('/metrics').json()
+        assert metrics['requests'] == 4
+        assert metrics['latencyMs']['p99'] is not None
+        assert metrics['cache']['hits'] == 1
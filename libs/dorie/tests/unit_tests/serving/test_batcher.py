@@ -0,0 +1,92 @@
+from dorie.serving.batcher import MicroBatcher
+
+import asyncio
+import threading
+import time
+
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    def predict(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(predict=predict, maxBatchSize=4, maxWaitMs=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = _run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert [len(call) for call in calls] == [4, 4, 2]
+    assert sum(calls, []) == list(range(10))
+
+    snapshot = batcher.metrics.snapshot()
+    assert snapshot['requests'] == 10 and snapshot['batches'] == 3
+    assert snapshot['batchSize']['max'] == 4
+    assert snapshot['batchSize']['histogram'] == {'2': 1, '4': 2}
+    assert snapshot['latencyMs']['p50'] <= snapshot['latencyMs']['p99']
+
+
+def test_batcher_flushes_partial_batch_after_max_wait():
+    async def main():
+        batcher = MicroBatcher(predict=lambda items: items, maxBatchSize=32, maxWaitMs=1)
+        result = await asyncio.wait_for(batcher.submit('a'), timeout=5)
+        await batcher.stop()
+        return result
+
+    assert _run(main()) == 'a'
+
+
+def test_batcher_propagates_errors():
+    def predict(items):
+        raise ValueError('boom')
+
+    async def main():
+        batcher = MicroBatcher(predict=predict, maxBatchSize=2, maxWaitMs=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = _run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert batcher.metrics.errors == 2
+
+
+def test_batcher_fails_short_results():
+    async def main():
+        batcher = MicroBatcher(predict=lambda items: items[:1], maxBatchSize=2, maxWaitMs=50)
+        results = await asyncio.wait_for(asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True), timeout=5)
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = _run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert batcher.metrics.errors == 2
+
+
+def test_batcher_stop_fails_pending_requests():
+    started = threading.Event()
+
+    def predict(items):
+        started.set()
+        time.sleep(0.2)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(predict=predict, maxBatchSize=1, maxWaitMs=1)
+        tasks = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=5)
+
+    results = _run(main())
+    # The in-flight request and the two still queued all fail rather than hang
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -4,7 +4,7 @@ from openai.types.chat.chat_completion import ChatCompletion
 from pydantic import BaseModel
 from typing import Dict, Any, Union
 
-import random
+import numpy as np
 
 from pathlib import Path
 import sys
@@ -28,6 +28,30 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def json_to_csv(jsondata: Dict) -> str:
+    """ Convert JSON data to CSV format. """
+    csvfile = io.StringIO()
+    csvwriter = csv.writer(csvfile)
+
+    # Write the headers/data
+    csvwriter.writerow(jsondata.keys())
+    csvwriter.writerows(zip(*jsondata.values()))
+
+    csvfile.seek(0)  # Reset the file pointer
+    return csvfile.getvalue()
+
+
+def csvdump(object: dict, outputfile: str) -> None:
+    """ Save CSV data to file; needs no client, unlike a `SyntheticDataGenerator`. """
+    try:
+        csv_content = json_to_csv(object)
+        with open(outputfile, 'w') as f:
+            f.write(csv_content)
+        logger.info(f"Success: Synthetic data completed and dumped to -> {outputfile}")
+    except (AttributeError, BaseException) as e:
+        logger.info(f"Error: Unable to dump content -> {e} \n")
+
+
 class SyntheticDataGenerator(BaseModel):
     """ Class to generate sample finetuning data from LLM to be used for task-specific SLM """
 
@@ -42,7 +66,9 @@ class SyntheticDataGenerator(BaseModel):
 
     def model_post_init(self, __context: Any) -> None:
         """ Override to perform additional initialization after `__init__` and `model_construct`. """
-        self.sessionid = uuid.uuid4()
+        # A caller-provided sessionid (e.g. from GenerationScheduler) is kept so runs can resume
+        if self.sessionid is None:
+            self.sessionid = uuid.uuid4()
         if not self.client:
             logging.debug('Message: initializing client connection')
             self.client = OpenAI()
@@ -68,15 +94,7 @@ class SyntheticDataGenerator(BaseModel):
 
     def _json_to_csv(self, jsondata: Dict) -> str:
         """ Convert JSON data to CSV format. """
-        csvfile = io.StringIO()
-        csvwriter = csv.writer(csvfile)
-
-        # Write the headers/data
-        csvwriter.writerow(jsondata.keys())
-        csvwriter.writerows(zip(*jsondata.values()))
-
-        csvfile.seek(0)  # Reset the file pointer
-        return csvfile.getvalue()
+        return json_to_csv(jsondata)
 
     def save(self, trainingdata: dict, outputfile: str, format: str = 'csv') -> str:
         """ Save the synthetic data to a file. """
@@ -96,13 +114,7 @@ class SyntheticDataGenerator(BaseModel):
 
     def csvdump(self, object: dict, outputfile: str) -> str:
         """ Save CSV data to file. """
-        try:
-            csv_content = self._json_to_csv(object)
-            with open(outputfile, 'w') as f:
-                f.write(csv_content)
-            logger.info(f"Success: Synthetic data completed and dumped to -> {outputfile}")
-        except (AttributeError, BaseException) as e:
-            logger.info(f"Error: Unable to dump content -> {e} \n")
+        return csvdump(object, outputfile)
 
     async def close(self):
         """ Close the client connection. """
@@ -118,50 +130,47 @@ def merge_dicts(dict_list):
             merged_dict[key].extend(value)
     return merged_dict
 
-def dict_split(dict_, split=0.8):
-    train = {'label': [], 'text': []}
-    test = {'label': [], 'text': []}
-    
-    # Combine 'label' and 'text' into a list of tuples for shuffling
-    combined = list(zip(dict_['label'], dict_['text']))
-    
-    # Shuffle the combined list
-    random.shuffle(combined)
-    
-    # Calculate the split index
-    split_index = int(len(combined) * split)
-    
-    # Split the data into train and test
-    train_combined = combined[:split_index]
-    test_combined = combined[split_index:]
-    
-    # Unzip the combined lists back into 'label' and 'text'
-    train['label'], train['text'] = zip(*train_combined)
-    test['label'], test['text'] = zip(*test_combined)
-    
-    # Convert the tuples back to lists
-    train['label'] = list(train['label'])
-    train['text'] = list(train['text'])
-    test['label'] = list(test['label'])
-    test['text'] = list(test['text'])
-    
+def dict_split(dict_, split=0.8, seed=42):
+    """ Seeded split of a {'label', 'text'} dict that keeps each label's proportion in both halves. """
+    labels = np.asarray(dict_['label'])
+    text = np.asarray(dict_['text'], dtype=object)
+    rng = np.random.default_rng(seed)
+
+    # Shuffle, then stable-sort by label: rows are grouped per label in random order
+    _, codes = np.unique(labels, return_inverse=True)
+    order = rng.permutation(len(labels))
+    order = order[np.argsort(codes[order], kind='stable')]
+
+    # Position of each row within its label group decides its side of the split
+    counts = np.bincount(codes[order])
+    rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    is_train = rank < np.floor(counts * split + 0.5).astype(int)[codes[order]]
+
+    train_idx, test_idx = rng.permutation(order[is_train]), rng.permutation(order[~is_train])
+    train = {'label': labels[train_idx].tolist(), 'text': text[train_idx].tolist()}
+    test = {'label': labels[test_idx].tolist(), 'text': text[test_idx].tolist()}
     return train, test
 
 
-async def coroutine_syntheticdata(n: int = 1, outputfile: str = 'syntheticdata'):
-    """ Coroutine to generate synthetic data 
-    Limitation:
-     You may encounter `openai.RateLimitError` if too many concurrent requests are made.
+async def coroutine_syntheticdata(n: int = 1, outputfile: str = 'syntheticdata', concurrency: int = 4, seed: int = 42, **schedulerargs):
+    """ Coroutine to generate synthetic data
+    Requests run through a `GenerationScheduler`: at most `concurrency` in flight on one client,
+    retried with backoff on rate limits, each response saved under `outputdir` as it arrives so
+    an interrupted run resumes where it stopped. Near-duplicates are removed before the split,
+    which is seeded by `seed`.
     """
-    synthdata_instances = [SyntheticDataGenerator() for _ in range(n)]
-    response = await asyncio.gather(*[synthdata.invoke() for synthdata in synthdata_instances])
-    if n == 1:
-        len(response[0]['label'])
-        train_flatten, test_flatten = dict_split(response[0])
-    else:
-        split = int(n * 0.8)
-        train_flatten = merge_dicts(response[:-split])
-        test_flatten = merge_dicts(response[-split:])
+    from dedup import NearDuplicateIndex, dedup_split
+    from scheduler import GenerationScheduler
+
+    scheduler = GenerationScheduler(concurrency=concurrency, **schedulerargs)
+    response = await scheduler.run(n)
+    await scheduler.close()
+    if len(response) < n:
+        raise RuntimeError(f"{n - len(response)} of {n} generation requests failed; rerun to resume")
+    # Drop near-duplicate utterances and keep each duplicate cluster on one side of the split
+    index = NearDuplicateIndex()
+    train_flatten, test_flatten = dedup_split(merge_dicts(response), seed=seed, index=index)
+    logger.info(f"Near-duplicates removed: {index.report(examples=0)['duplicates']} of {len(index)} examples")
 
     logger.info(f"""
                 Corutine returned:
@@ -169,8 +178,8 @@ async def coroutine_syntheticdata(n: int = 1, outputfile: str = 'syntheticdata')
                     Testing Examples: {len(test_flatten['label'])}""
                 """)
     # Save the synthetic data to a file
-    synthdata_instances[0].csvdump(train_flatten, f"{outputfile}_train.csv")
-    synthdata_instances[0].csvdump(test_flatten, f"{outputfile}_test.csv")
+    csvdump(train_flatten, f"{outputfile}_train.csv")
+    csvdump(test_flatten, f"{outputfile}_test.csv")
 
 
     hfupload(
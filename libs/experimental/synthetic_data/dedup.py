@@ -0,0 +1,276 @@
+""" Near-duplicate detection for generated and logged utterances.
+
+Texts are normalized and cut into character shingles, MinHash signatures estimate their Jaccard
+similarity, and locality-sensitive hashing over bands of the signature only compares texts that
+share a band, so indexing n texts costs about O(n) rather than O(n^2) comparisons. Matches above
+the threshold are merged into clusters with union-find. The index grows incrementally as new
+generation batches arrive, and `dedup_split` assigns whole clusters to one side of a train/test
+split so near-duplicates never straddle it.
+"""
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pathlib import Path
+import sys
+current_dir = Path(__file__).resolve()
+sys.path.insert(0, str(current_dir.parent))
+
+from base import dict_split
+
+from collections import defaultdict
+import json
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+# Multiplier of the polynomial rolling hash of shingle bytes
+_BASE = np.uint64(1099511628211)
+
+
+def normalize(text: str) -> str:
+    """ Casefold, replace punctuation by spaces and collapse whitespace; the same rule as the
+    dorie prediction cache (dorie.intent.cache.normalize), so both treat the same texts as equal. """
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+def shingle_hashes(text: str, shinglesize: int = 5) -> np.ndarray:
+    """ Distinct 64-bit hashes of the character `shinglesize`-grams of the normalized text. """
+    data = np.frombuffer(normalize(text).encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    if len(data) <= shinglesize:
+        windows = data[None, :]
+        powers = _BASE ** np.arange(len(data) - 1, -1, -1, dtype=np.uint64)
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(data, shinglesize)
+        powers = _BASE ** np.arange(shinglesize - 1, -1, -1, dtype=np.uint64)
+    # uint64 arithmetic wraps, i.e. the polynomial hash is taken mod 2^64
+    with np.errstate(over='ignore'):
+        return np.unique((windows * powers).sum(axis=1, dtype=np.uint64))
+
+
+def lsh_params(numperm: int, threshold: float, missweight: float = 0.75) -> Tuple[int, int]:
+    """ (bands, rows) with bands * rows <= numperm minimizing the weighted areas under the LSH
+    S-curve 1 - (1 - s ** rows) ** bands that fall on the wrong side of `threshold`. Candidates are
+    verified afterwards, so missed duplicates (`missweight`) cost more than spurious candidates. """
+    below, above = np.linspace(0, threshold, 201), np.linspace(threshold, 1, 201)
+    best, params = np.inf, (numperm, 1)
+    for rows in range(1, numperm + 1):
+        for bands in range(1, numperm // rows + 1):
+            falsepositive = (1 - (1 - below ** rows) ** bands).mean() * threshold
+            falsenegative = ((1 - above ** rows) ** bands).mean() * (1 - threshold)
+            cost = (1 - missweight) * falsepositive + missweight * falsenegative
+            if cost < best:
+                best, params = cost, (bands, rows)
+    return params
+
+
+class NearDuplicateIndex(BaseModel):
+    """ Incremental MinHash/LSH index. Texts whose estimated Jaccard similarity of shingles is at
+    least `threshold` join the same duplicate cluster. """
+
+    numperm: int = 128
+    threshold: float = 0.8
+    shinglesize: int = 5
+    seed: int = 1
+    # Texts signed and inserted together
+    batchsize: int = 1024
+    # Shingles hashed at once; bounds the (numperm x chunksize) uint64 working set whatever the
+    # length of the texts, 8 MiB at the defaults
+    chunksize: int = 8192
+
+    _a: Any = PrivateAttr(default=None)
+    _b: Any = PrivateAttr(default=None)
+    _bands: int = PrivateAttr(default=0)
+    _rows: int = PrivateAttr(default=0)
+    _buckets: List[Dict[bytes, List[int]]] = PrivateAttr(default_factory=list)
+    _signatures: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _parent: List[int] = PrivateAttr(default_factory=list)
+    _texts: List[str] = PrivateAttr(default_factory=list)
+    # Split sides ('train'/'test') assigned to each cluster root by `dedup_split`
+    _sides: Dict[int, set] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        rng = np.random.default_rng(self.seed)
+        # Multiply-shift hashing: odd multipliers, the high 32 bits of a * x + b
+        self._a = rng.integers(1, 2 ** 63, size=self.numperm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=self.numperm, dtype=np.uint64)
+        self._bands, self._rows = lsh_params(self.numperm, self.threshold)
+        self._buckets = [defaultdict(list) for _ in range(self._bands)]
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """ MinHash signatures, shape (len(texts), numperm), uint32. """
+        if not texts:
+            return np.zeros((0, self.numperm), dtype=np.uint32)
+        # Every text has at least one shingle, the empty text hashes to 0
+        shingles = [shingle_hashes(text, self.shinglesize) for text in texts]
+        owners = np.repeat(np.arange(len(texts)), [len(s) for s in shingles])
+        shingles = np.concatenate(shingles)
+        signatures = np.full((len(texts), self.numperm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingles), self.chunksize):
+            chunk, owner = shingles[start:start + self.chunksize], owners[start:start + self.chunksize]
+            with np.errstate(over='ignore'):
+                hashed = (self._a[:, None] * chunk[None, :] + self._b[:, None]) >> np.uint64(32)
+            # Minimum over each text's contiguous run of shingles in the chunk; a text may span chunks
+            runs = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+            ids = owner[runs]
+            signatures[ids] = np.minimum(signatures[ids], np.minimum.reduceat(hashed, runs, axis=1).T)
+        return signatures.astype(np.uint32)
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, i: int, j: int) -> None:
+        ri, rj = self._find(i), self._find(j)
+        if ri != rj:
+            # The earliest text stays the root, i.e. the cluster's representative
+            parent, child = min(ri, rj), max(ri, rj)
+            self._parent[child] = parent
+            if child in self._sides:
+                self._sides.setdefault(parent, set()).update(self._sides.pop(child))
+
+    def add(self, texts: Iterable[str]) -> List[int]:
+        """ Index a batch of texts and return their ids; each is matched against every text indexed
+        before it, including earlier texts of the same batch. """
+        texts = [str(text) for text in texts]
+        ids = []
+        for start in range(0, len(texts), self.batchsize):
+            batch = texts[start:start + self.batchsize]
+            for text, signature in zip(batch, self.signatures(batch)):
+                ids.append(self._insert(text, signature))
+        return ids
+
+    def _keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self._rows:(band + 1) * self._rows].tobytes() for band in range(self._bands)]
+
+    def _file(self, keys: List[bytes], i: int) -> None:
+        """ File text `i` under each band's bucket unless its cluster already has a text there, so
+        a bucket holds about one text per cluster and repeated duplicates are not compared again. """
+        root = self._find(i)
+        for buckets, key in zip(self._buckets, keys):
+            bucket = buckets[key]
+            if not any(self._find(j) == root for j in bucket):
+                bucket.append(i)
+
+    def _insert(self, text: str, signature: np.ndarray) -> int:
+        i = len(self._texts)
+        self._texts.append(text)
+        self._signatures.append(signature)
+        self._parent.append(i)
+        keys = self._keys(signature)
+        candidates = set()
+        for buckets, key in zip(self._buckets, keys):
+            candidates.update(buckets.get(key, ()))
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64)
+            # Verify LSH candidates on the estimated Jaccard similarity
+            similarity = (np.stack([self._signatures[c] for c in candidates]) == signature).mean(axis=1)
+            for c in candidates[similarity >= self.threshold]:
+                self._union(i, int(c))
+        self._file(keys, i)
+        return i
+
+    def clusters(self, minsize: int = 2) -> List[List[int]]:
+        """ Ids of each cluster with at least `minsize` members, largest first. """
+        groups = defaultdict(list)
+        for i in range(len(self._texts)):
+            groups[self._find(i)].append(i)
+        return sorted((g for g in groups.values() if len(g) >= minsize), key=lambda g: (-len(g), g[0]))
+
+    def representatives(self) -> List[int]:
+        """ The first-indexed text of every cluster, singletons included. """
+        return [i for i in range(len(self._texts)) if self._find(i) == i]
+
+    def report(self, examples: int = 10) -> Dict:
+        """ Counts of texts, clusters and redundant duplicates, with the largest clusters' texts. """
+        clusters = self.clusters()
+        report = {
+            'texts': len(self._texts),
+            'duplicateClusters': len(clusters),
+            'duplicates': sum(len(c) - 1 for c in clusters),
+            'bands': self._bands,
+            'rows': self._rows,
+            'largest': [{'size': len(c), 'texts': [self._texts[i] for i in c[:5]]} for c in clusters[:examples]],
+        }
+        report['duplicateRate'] = report['duplicates'] / report['texts'] if report['texts'] else 0.0
+        return report
+
+    def save(self, path: str) -> None:
+        """ Persist the index, e.g. between generation runs. """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / 'signatures.npy', np.stack(self._signatures) if self._signatures else np.zeros((0, self.numperm), dtype=np.uint32))
+        with open(path / 'index.json', 'w') as f:
+            json.dump({
+                'settings': self.model_dump(), 'texts': self._texts, 'parent': self._parent,
+                'sides': {root: sorted(sides) for root, sides in self._sides.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'NearDuplicateIndex':
+        path = Path(path)
+        with open(path / 'index.json') as f:
+            state = json.load(f)
+        index = cls(**state['settings'])
+        index._texts, index._parent = state['texts'], state['parent']
+        index._sides = {int(root): set(sides) for root, sides in state.get('sides', {}).items()}
+        index._signatures = list(np.load(path / 'signatures.npy'))
+        for i, signature in enumerate(index._signatures):
+            index._file(index._keys(signature), i)
+        return index
+
+
+def dedup_split(dict_: Dict, split: float = 0.8, seed: Optional[int] = 42, dropduplicates: bool = True,
+                index: Optional[NearDuplicateIndex] = None) -> Tuple[Dict, Dict]:
+    """ Stratified split of a {'label', 'text'} dict in which every near-duplicate cluster lands
+    on one side. With `dropduplicates` only each cluster's first text is kept; otherwise the whole
+    cluster goes with it. Pass an `index` to deduplicate against earlier batches as well: their
+    clusters keep the side they were given, and texts joining them are dropped or follow them. """
+    index = index if index is not None else NearDuplicateIndex()
+    offset = len(index)
+    ids = index.add(dict_['text'])
+    labels, texts = list(dict_['label']), list(dict_['text'])
+
+    members = defaultdict(list)
+    for row, i in enumerate(ids):
+        members[index._find(i)].append(row)
+
+    pinned, bridging = {'train': [], 'test': []}, 0
+    for root in [root for root in members if root in index._sides or (dropduplicates and root < offset)]:
+        rows, sides = members.pop(root), index._sides.get(root, set())
+        if dropduplicates:
+            # Already in a previous split
+            continue
+        if len(sides) == 1:
+            pinned[next(iter(sides))].extend(rows)
+        else:
+            # The texts joined clusters on both sides; keeping them would leak
+            bridging += len(rows)
+    if dropduplicates:
+        members = {root: rows[:1] for root, rows in members.items()}
+    logger.info(f"Deduplication: {len(ids)} texts in {len(members)} new clusters, {sum(map(len, pinned.values()))} joined earlier clusters, {bridging} dropped")
+
+    # Split clusters, not rows, stratified on the label of each cluster's first text
+    roots = list(members)
+    train, test = dict_split({'label': [labels[members[root][0]] for root in roots], 'text': roots}, split=split, seed=seed)
+    for side, assigned in (('train', train), ('test', test)):
+        for root in assigned['text']:
+            index._sides[root] = {side}
+    expand = lambda side, assigned: {
+        'label': [labels[row] for root in assigned['text'] for row in members[root]] + [labels[row] for row in pinned[side]],
+        'text': [texts[row] for root in assigned['text'] for row in members[root]] + [texts[row] for row in pinned[side]],
+    }
+    return expand('train', train), expand('test', test)
@@ -0,0 +1,196 @@
+""" Bounded-concurrency synthetic data generation.
+
+A semaphore bounds the in-flight requests, all of which share one client; a token bucket keeps
+requests and tokens per minute under the account limits, and retryable errors back off
+exponentially with full jitter. Every response is written to disk as it completes, under a
+sessionid derived from the run id and the request index, so a rerun skips finished requests.
+"""
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pathlib import Path
+import sys
+current_dir = Path(__file__).resolve()
+sys.path.insert(0, str(current_dir.parent))
+sys.path.insert(0, str(current_dir.parents[1]))
+
+from base import SyntheticDataGenerator
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Namespace of the deterministic sessionids, uuid5(NAMESPACE, f"{runid}-{index}")
+SESSION_NAMESPACE = uuid.UUID('9f1c3c2e-5a57-4e2b-9a55-4d1f0b7c2a61')
+
+
+def _retryable() -> Tuple[type, ...]:
+    """ Rate limits, timeouts, dropped connections and 5xx responses are worth retrying. """
+    try:
+        import openai
+    except ImportError:
+        return (asyncio.TimeoutError, ConnectionError)
+    return (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError, asyncio.TimeoutError, ConnectionError)
+
+
+def backoff(attempt: int, basedelay: float = 1.0, maxdelay: float = 60.0) -> float:
+    """ Full-jitter exponential backoff: uniform in [0, min(maxdelay, basedelay * 2 ** attempt)]. """
+    return random.uniform(0, min(maxdelay, basedelay * 2 ** attempt))
+
+
+def _retryafter(error: BaseException) -> float:
+    """ Seconds requested by a `Retry-After` header on the error's response, 0 when absent. """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RateLimiter:
+    """ Token buckets for requests and tokens per minute; `acquire` waits until both have room.
+    Waiters are served in arrival order. """
+
+    def __init__(self, requestsperminute: Optional[float] = None, tokensperminute: Optional[float] = None, clock=time.monotonic):
+        self.limits = {'requests': requestsperminute, 'tokens': tokensperminute}
+        self.available = {name: limit for name, limit in self.limits.items() if limit}
+        self.clock = clock
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed, self._updated = now - self._updated, now
+        for name in self.available:
+            self.available[name] = min(self.limits[name], self.available[name] + elapsed * self.limits[name] / 60)
+
+    def wait(self, tokens: int) -> float:
+        """ Seconds until a request of `tokens` tokens fits in both buckets. """
+        self._refill()
+        needed = {'requests': 1, 'tokens': tokens}
+        return max(
+            [(min(needed[name], self.limits[name]) - available) * 60 / self.limits[name] for name, available in self.available.items()] + [0.0]
+        )
+
+    async def acquire(self, tokens: int = 0) -> None:
+        async with self._lock:
+            while (delay := self.wait(tokens)) > 0:
+                await asyncio.sleep(delay)
+            needed = {'requests': 1, 'tokens': tokens}
+            for name in self.available:
+                self.available[name] -= min(needed[name], self.limits[name])
+
+
+class GenerationScheduler(BaseModel):
+    """ Run `n` synthetic data requests with at most `concurrency` in flight on one shared client.
+    Responses are written to `outputdir`/<sessionid>.json; rerunning with the same `runid` and
+    `outputdir` resumes, skipping the sessions already on disk. """
+
+    client: Any | None = None
+    runid: str = 'synthetic'
+    outputdir: str = './synthetic'
+    concurrency: int = 4
+    requestsperminute: Optional[float] = None
+    tokensperminute: Optional[float] = None
+    maxretries: int = 6
+    basedelay: float = 1.0
+    maxdelay: float = 60.0
+    # Seconds before a single request is abandoned and retried; None waits indefinitely
+    timeout: Optional[float] = None
+    # SyntheticDataGenerator fields shared by every request, e.g. {'modelname': 'gpt-4o-mini'}
+    generatorargs: Dict = {}
+
+    completed: int = 0
+    resumed: int = 0
+    failed: int = 0
+    retries: int = 0
+
+    _limiter: Optional[RateLimiter] = PrivateAttr(default=None)
+    # Only a client created here is closed by `close`; an injected one belongs to the caller
+    _ownsclient: bool = PrivateAttr(default=False)
+
+    def model_post_init(self, __context: Any) -> None:
+        if not self.client:
+            logging.debug('Message: initializing shared client connection')
+            from openai import AsyncOpenAI
+            self.client = AsyncOpenAI()
+            self._ownsclient = True
+
+    def sessionid(self, index: int) -> uuid.UUID:
+        return uuid.uuid5(SESSION_NAMESPACE, f"{self.runid}-{index}")
+
+    def path(self, sessionid: uuid.UUID) -> Path:
+        return Path(self.outputdir) / f"{sessionid}.json"
+
+    def _write(self, sessionid: uuid.UUID, index: int, data: Dict) -> None:
+        """ Write one response atomically, so a crash never leaves a partial file behind. """
+        path = self.path(sessionid)
+        staging = path.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+        with open(staging, 'w') as f:
+            json.dump({'sessionid': str(sessionid), 'index': index, 'runid': self.runid, 'data': data}, f)
+        os.replace(staging, path)
+
+    async def _generate(self, index: int, semaphore: asyncio.Semaphore, retryable: Tuple[type, ...]) -> bool:
+        sessionid = self.sessionid(index)
+        generator = SyntheticDataGenerator(client=self.client, sessionid=sessionid, **self.generatorargs)
+        # Prompt tokens (about 4 characters each) plus the completion budget
+        tokens = (len(generator.systemprompt) + len(generator.userinput)) // 4 + generator.maxtokens
+        async with semaphore:
+            for attempt in range(self.maxretries + 1):
+                await self._limiter.acquire(tokens)
+                try:
+                    data = await asyncio.wait_for(generator.invoke(), self.timeout)
+                except retryable as e:
+                    if attempt == self.maxretries:
+                        logger.error(f"Giving up on sessionId:{sessionid} after {attempt + 1} attempts: {e!r}")
+                        break
+                    delay = max(backoff(attempt, self.basedelay, self.maxdelay), _retryafter(e))
+                    logger.warning(f"Retrying sessionId:{sessionid} in {delay:.2f}s ({attempt + 1}/{self.maxretries}): {e!r}")
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    logger.error(f"Failed sessionId:{sessionid}: {e!r}")
+                    break
+                await asyncio.to_thread(self._write, sessionid, index, data)
+                self.completed += 1
+                return True
+        self.failed += 1
+        return False
+
+    async def run(self, n: int = 1) -> List[Dict]:
+        """ Generate the responses of requests 0..n-1 that are not on disk yet and return all n
+        that completed, in request order. Failed requests are logged and left for a rerun. """
+        Path(self.outputdir).mkdir(parents=True, exist_ok=True)
+        self._limiter = RateLimiter(self.requestsperminute, self.tokensperminute)
+        pending = [i for i in range(n) if not self.path(self.sessionid(i)).is_file()]
+        self.resumed += n - len(pending)
+        if self.resumed:
+            logger.info(f"Resuming run {self.runid}: {n - len(pending)} of {n} responses already in {self.outputdir}")
+
+        semaphore, retryable = asyncio.Semaphore(self.concurrency), _retryable()
+        await asyncio.gather(*[self._generate(i, semaphore, retryable) for i in pending])
+        logger.info(f"Run {self.runid}: {self.completed} completed, {self.resumed} resumed, {self.failed} failed, {self.retries} retries")
+        return list(self.responses(n))
+
+    def responses(self, n: int) -> Iterator[Dict]:
+        """ Yield the responses of requests 0..n-1 found on disk, in request order. """
+        for i in range(n):
+            path = self.path(self.sessionid(i))
+            if path.is_file():
+                with open(path) as f:
+                    yield json.load(f)['data']
+
+    async def close(self):
+        """ Close the shared client connection if the scheduler created it. """
+        if not self._ownsclient:
+            return
+        logger.info(f"Closing shared client connection of run {self.runid}")
+        await self.client.close()
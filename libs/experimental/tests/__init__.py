@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+_THIS_DIR = Path(__file__).parent
+_PARENT_DIR = _THIS_DIR.parent
+
+# synthetic_data modules import their siblings and `storage` as top-level modules
+sys.path.insert(0, str(_PARENT_DIR))
+sys.path.insert(0, str(_PARENT_DIR / 'synthetic_data'))
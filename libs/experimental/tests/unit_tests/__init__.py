@@ -0,0 +1 @@
+"""Test experimental functionality."""
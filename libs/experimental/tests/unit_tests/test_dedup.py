@@ -0,0 +1,154 @@
+from base import dict_split
+from dedup import NearDuplicateIndex, dedup_split, lsh_params, normalize
+
+
+TEXTS = [
+    'I want to add a driver to my policy',
+    'i want to add a driver to my policy!',
+    'Cancel my policy please',
+    'Please cancel my insurance policy effective today',
+    'What is my deductible?',
+    'How do I pay my premium online',
+    'how do i pay my premium online?',
+    'I need to file a claim for my car',
+]
+
+
+def _synthetic(copies: int = 3):
+    """Unique utterances per label, each with `copies` near-verbatim variants"""
+    words = ['premium', 'deductible', 'claim', 'driver', 'vehicle', 'renewal', 'billing', 'coverage', 'discount', 'address']
+    base = {
+        'payPrem': [f'how do I settle the {word} part of my bill' for word in words],
+        'addDriver': [f'my {word} changed so update the auto policy' for word in words],
+    }
+    data = {'label': [], 'text': []}
+    for label, texts in base.items():
+        for text in texts:
+            for variant in [text, text.upper(), text + '!'][:copies]:
+                data['label'].append(label)
+                data['text'].append(variant)
+    return data
+
+
+def test_normalize():
+    assert normalize('  Add A  Driver, please!! ') == 'add a driver please'
+    assert normalize("I'm on the ＢＩＬＬ-PAY plan") == 'i m on the bill pay plan'
+
+
+def test_signatures_do_not_depend_on_chunking():
+    texts = TEXTS + ['x' * 500]
+    expected = NearDuplicateIndex().signatures(texts)
+    for chunksize in (1, 7, 64):
+        assert (NearDuplicateIndex(chunksize=chunksize).signatures(texts) == expected).all()
+
+
+def test_lsh_params_fit_signature():
+    bands, rows = lsh_params(128, 0.8)
+    assert bands * rows <= 128
+    assert 0.7 < (1 / bands) ** (1 / rows) < 0.9
+
+
+def test_clusters_and_report():
+    index = NearDuplicateIndex()
+    assert index.add(TEXTS) == list(range(len(TEXTS)))
+    assert index.clusters() == [[0, 1], [5, 6]]
+    assert index.representatives() == [0, 2, 3, 4, 5, 7]
+
+    report = index.report()
+    assert report['texts'] == len(TEXTS)
+    assert report['duplicateClusters'] == 2
+    assert report['duplicates'] == 2
+    assert report['largest'][0]['texts'] == TEXTS[:2]
+
+
+def test_incremental_batches_match_single_pass():
+    single, incremental = NearDuplicateIndex(), NearDuplicateIndex(batchsize=3)
+    single.add(TEXTS)
+    incremental.add(TEXTS[:3])
+    incremental.add(TEXTS[3:])
+    assert incremental.clusters() == single.clusters()
+    # A later batch is matched against everything indexed before it
+    assert incremental.add(['Cancel my policy, please']) == [len(TEXTS)]
+    assert [2, len(TEXTS)] in incremental.clusters()
+
+
+def test_duplicates_do_not_grow_buckets():
+    """Each bucket keeps about one text per cluster, so comparisons per insert stay bounded however
+    many copies of a text arrive"""
+    texts = _synthetic()['text']
+
+    def filed(copies: int) -> int:
+        index = NearDuplicateIndex()
+        index.add(texts * copies)
+        assert len(index.clusters()) == 20
+        assert max(len(bucket) for buckets in index._buckets for bucket in buckets.values()) <= 2
+        return sum(len(bucket) for buckets in index._buckets for bucket in buckets.values())
+
+    assert filed(1) == filed(50)
+
+
+def test_save_load(tmp_path):
+    index = NearDuplicateIndex()
+    index.add(TEXTS)
+    index.save(tmp_path)
+
+    loaded = NearDuplicateIndex.load(tmp_path)
+    assert len(loaded) == len(TEXTS)
+    assert loaded.clusters() == index.clusters()
+    loaded.add(['what is my deductible'])
+    assert [4, len(TEXTS)] in loaded.clusters()
+
+
+def test_dedup_split_drops_duplicates():
+    data = _synthetic()
+    train, test = dedup_split(data, split=0.8, seed=0)
+    assert len(train['text']) + len(test['text']) == 20
+    assert sorted(set(train['label'])) == sorted(set(test['label'])) == ['addDriver', 'payPrem']
+    assert train['label'].count('payPrem') == 8 and test['label'].count('payPrem') == 2
+
+
+def test_dedup_split_keeps_clusters_on_one_side():
+    data = _synthetic()
+    train, test = dedup_split(data, split=0.8, seed=0, dropduplicates=False)
+    assert len(train['text']) + len(test['text']) == len(data['text'])
+    trainKeys, testKeys = {normalize(t) for t in train['text']}, {normalize(t) for t in test['text']}
+    assert not trainKeys & testKeys
+
+
+def test_dedup_split_against_earlier_batches():
+    data = _synthetic()
+    index = NearDuplicateIndex()
+    dedup_split(data, index=index, seed=0)
+    # Resubmitting the same batch adds nothing new
+    train, test = dedup_split(data, index=index, seed=0)
+    assert train['text'] == test['text'] == []
+
+
+def test_dedup_split_keeps_later_members_on_their_cluster_side():
+    index = NearDuplicateIndex()
+    first = _synthetic(copies=1)
+    firstTrain, firstTest = dedup_split(first, index=index, seed=0, dropduplicates=False)
+    # The second batch repeats every first-batch utterance with a variant
+    second = {'label': first['label'], 'text': [text + '?' for text in first['text']]}
+    secondTrain, secondTest = dedup_split(second, index=index, seed=1, dropduplicates=False)
+
+    assert len(secondTrain['text']) + len(secondTest['text']) == len(second['text'])
+    trainKeys = {normalize(t) for t in firstTrain['text'] + secondTrain['text']}
+    testKeys = {normalize(t) for t in firstTest['text'] + secondTest['text']}
+    assert not trainKeys & testKeys
+    assert {normalize(t) for t in secondTest['text']} == {normalize(t) for t in firstTest['text']}
+
+
+def test_sides_survive_save_load(tmp_path):
+    index = NearDuplicateIndex()
+    _, test = dedup_split(_synthetic(copies=1), index=index, seed=0, dropduplicates=False)
+    index.save(tmp_path)
+    loaded = NearDuplicateIndex.load(tmp_path)
+    train, later = dedup_split({'label': ['payPrem'], 'text': [test['text'][0].upper()]}, index=loaded, dropduplicates=False)
+    assert train['text'] == [] and later['text'] == [test['text'][0].upper()]
+
+
+def test_splits_are_seeded_by_default():
+    data = _synthetic(copies=1)
+    assert dict_split(data) == dict_split(data)
+    assert dedup_split(data) == dedup_split(data)
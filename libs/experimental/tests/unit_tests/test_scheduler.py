@@ -0,0 +1,123 @@
+from scheduler import GenerationScheduler, RateLimiter, backoff
+
+import base
+
+from types import SimpleNamespace
+
+import asyncio
+import json
+
+import httpx
+import openai
+import pytest
+
+
+class FakeClient:
+    """Stands in for AsyncOpenAI: `beta.chat.completions.parse` answers after a short delay,
+    raising the queued errors first"""
+
+    def __init__(self, errors=(), delay: float = 0.01):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.inflight = self.maxinflight = 0
+        self.closed = False
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    async def parse(self, model, max_tokens, response_format, messages):
+        self.calls += 1
+        self.inflight += 1
+        self.maxinflight = max(self.maxinflight, self.inflight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            content = json.dumps({'label': ['payPrem'], 'text': [f'pay my premium {self.calls}']})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            self.inflight -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+def _ratelimit() -> openai.RateLimitError:
+    response = httpx.Response(429, headers={'retry-after': '0'}, request=httpx.Request('POST', 'http://localhost/v1/chat/completions'))
+    return openai.RateLimitError('rate limited', response=response, body=None)
+
+
+def test_bounded_concurrency_on_one_client(tmp_path):
+    client = FakeClient()
+    scheduler = GenerationScheduler(client=client, outputdir=str(tmp_path), concurrency=3)
+    responses = asyncio.run(scheduler.run(10))
+
+    assert len(responses) == 10 and client.calls == 10
+    assert client.maxinflight == 3
+    assert len(list(tmp_path.glob('*.json'))) == 10
+    assert scheduler.completed == 10 and scheduler.failed == 0
+
+
+def test_retries_rate_limits_with_backoff(tmp_path):
+    client = FakeClient(errors=[_ratelimit(), _ratelimit()])
+    scheduler = GenerationScheduler(client=client, outputdir=str(tmp_path), concurrency=1, basedelay=0.001)
+    responses = asyncio.run(scheduler.run(2))
+    assert len(responses) == 2
+    assert scheduler.retries == 2 and client.calls == 4
+
+
+def test_resume_by_sessionid(tmp_path):
+    # A non-retryable error fails one request; the others are already on disk
+    first = GenerationScheduler(client=FakeClient(errors=[ValueError('bad response')]), outputdir=str(tmp_path), concurrency=1, runid='run')
+    assert len(asyncio.run(first.run(4))) == 3
+    assert first.failed == 1
+
+    client = FakeClient()
+    second = GenerationScheduler(client=client, outputdir=str(tmp_path), concurrency=2, runid='run')
+    responses = asyncio.run(second.run(4))
+    assert len(responses) == 4
+    assert client.calls == 1 and second.resumed == 3
+    assert second.sessionid(0) == first.sessionid(0)
+    # Another run id starts over
+    assert GenerationScheduler(client=client, runid='other').sessionid(0) != first.sessionid(0)
+
+
+def test_gives_up_after_max_retries(tmp_path):
+    scheduler = GenerationScheduler(client=FakeClient(errors=[_ratelimit()] * 3), outputdir=str(tmp_path), maxretries=2, basedelay=0.001)
+    assert asyncio.run(scheduler.run(1)) == []
+    assert scheduler.failed == 1 and scheduler.retries == 2
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff(10, basedelay=1.0, maxdelay=5.0) for _ in range(100)]
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_rate_limiter_token_bucket():
+    now = [0.0]
+    limiter = RateLimiter(requestsperminute=60, tokensperminute=600, clock=lambda: now[0])
+    assert limiter.wait(300) == 0
+    asyncio.run(limiter.acquire(300))
+    asyncio.run(limiter.acquire(300))
+    # The token bucket is empty: 300 tokens refill in 30 seconds
+    assert limiter.wait(300) == pytest.approx(30.0)
+    now[0] = 30.0
+    assert limiter.wait(300) == 0
+
+
+def test_coroutine_leaves_injected_client_open(tmp_path, monkeypatch):
+    uploads = []
+    monkeypatch.setattr(base, 'hfupload', lambda **kwargs: uploads.append(kwargs))
+    client = FakeClient()
+    outputfile = str(tmp_path / 'synthetic')
+    asyncio.run(base.coroutine_syntheticdata(3, outputfile, client=client, outputdir=str(tmp_path / 'responses')))
+
+    assert not client.closed
+    assert (tmp_path / 'synthetic_train.csv').read_text().startswith('label,text')
+    assert uploads[0]['data_files']['test'] == f"{outputfile}_test.csv"
+
+
+def test_close_only_owned_client():
+    client = FakeClient()
+    asyncio.run(GenerationScheduler(client=client).close())
+    assert not client.closed